@@ -0,0 +1,188 @@
+"""Background history backfill for every channel and thread the bot can see."""
+
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone, timedelta
+
+import discord
+
+from config import BACKFILL_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_LOG_INTERVAL = 30  # seconds between progress log lines
+
+
+def last_activity(channel):
+    """Return the time of the channel's last message, or None if unknown."""
+    if channel.last_message_id:
+        return discord.utils.snowflake_time(channel.last_message_id)
+    return None
+
+
+async def collect_channels(guild, since):
+    """Return the text channels and threads of a guild worth backfilling.
+
+    Includes active threads and public threads archived after `since`.
+    """
+    channels = list(guild.text_channels) + list(guild.threads)
+    known = {channel.id for channel in channels}
+
+    for channel in guild.text_channels:
+        try:
+            async for thread in channel.archived_threads(limit=None):
+                if thread.archive_timestamp < since:
+                    break  # sorted by decreasing archive time
+                if thread.id not in known:
+                    channels.append(thread)
+                    known.add(thread.id)
+        except discord.Forbidden:
+            continue
+        except discord.HTTPException as e:
+            logger.warning(f"Could not list archived threads of #{channel.name}: {e}")
+
+    return channels
+
+
+async def fetch_history(store, channel, days):
+    """
+    Fetch messages from Discord from the last `days` days or since last fetch known in DB.
+
+    Returns:
+        Number of messages stored
+    """
+    # Get server and channel information
+    server_id = str(channel.guild.id) if channel.guild else None
+    server_name = channel.guild.name if channel.guild else None
+    channel_id = str(channel.id)
+
+    # Get category information
+    category_id = str(channel.category_id) if channel.category else None
+    category_name = channel.category.name if channel.category else None
+
+    last_fetched = (
+        await store.get_last_fetched(channel_id, server_id, channel.name)
+        if server_id
+        else None
+    )
+    after_date = last_fetched or (datetime.now(timezone.utc) - timedelta(days=days))
+
+    # Nothing was posted since the last fetch: skip the API call entirely
+    last_message_at = last_activity(channel)
+    if last_message_at and last_message_at <= after_date:
+        logger.debug(f"Skipping #{channel.name}|{channel_id}: no new messages")
+        return 0
+
+    logger.info(
+        f"Fetching messages|{server_name}|{category_name}|{category_id}|#{channel.name}|{channel_id}|{after_date.isoformat()}"
+    )
+
+    # Pulling message history from Discord
+    count = 0
+    try:
+        async for message in channel.history(limit=None, after=after_date):
+            if not message.author.bot:
+                store.add_message(
+                    str(message.author),
+                    message.content,
+                    channel.name,
+                    message.created_at,
+                    server_id=server_id,
+                    server_name=server_name,
+                    channel_id=channel_id,
+                    message_id=message.id,
+                )
+                count += 1
+
+        # Update last fetched timestamp (including category info for channel metadata)
+        if server_id:
+            await store.update_last_fetched(
+                channel_id,
+                datetime.now(timezone.utc),
+                server_id,
+                server_name,
+                channel.name,
+                category_id,
+                category_name,
+            )
+    except Exception as e:
+        logger.warning(
+            f"Failed fetching  |{server_name}|{category_name}|{category_id}|#{channel.name}|{channel_id}: {e}"
+        )
+    return count
+
+
+class Backfill:
+    """Fetches missed history for all guilds in the background.
+
+    Channels are processed most recently active first by `concurrency`
+    workers. Each channel's history lives in its own Discord rate-limit bucket
+    and discord.py waits on those buckets (and on the global limit) itself, so
+    a few concurrent fetches stay within the limits while using them fully.
+    """
+
+    def __init__(self, store, concurrency=BACKFILL_CONCURRENCY):
+        self.store = store
+        self.concurrency = concurrency
+        self.task = None
+        self.total = 0
+        self.done = 0
+        self.messages = 0
+
+    @property
+    def running(self):
+        return self.task is not None and not self.task.done()
+
+    def progress(self):
+        """Return a short human readable progress description."""
+        return f"{self.done}/{self.total} canaux, {self.messages} messages"
+
+    def start(self, guilds, days):
+        """Start the backfill as a background task, unless one is already running."""
+        if self.running:
+            logger.info(f"Backfill already running ({self.progress()})")
+            return self.task
+        self.task = asyncio.create_task(self.run(list(guilds), days), name="backfill")
+        return self.task
+
+    async def run(self, guilds, days):
+        started = time.monotonic()
+        since = datetime.now(timezone.utc) - timedelta(days=days)
+
+        channels = []
+        for guild in guilds:
+            channels.extend(await collect_channels(guild, since))
+
+        # Most recently active channels first, unknown activity last
+        oldest = datetime.min.replace(tzinfo=timezone.utc)
+        channels.sort(key=lambda c: last_activity(c) or oldest, reverse=True)
+
+        self.total = len(channels)
+        self.done = 0
+        self.messages = 0
+        logger.info(
+            f"Backfilling {self.total} channels and threads from {len(guilds)} servers "
+            f"({self.concurrency} at a time)"
+        )
+
+        pending = iter(channels)
+        last_report = time.monotonic()
+
+        async def worker():
+            nonlocal last_report
+            for channel in pending:
+                try:
+                    count = await fetch_history(self.store, channel, days)
+                    self.messages += count
+                except Exception as e:
+                    logger.warning(f"Could not fetch messages from #{channel.name}: {e}")
+                self.done += 1
+                if time.monotonic() - last_report >= PROGRESS_LOG_INTERVAL:
+                    last_report = time.monotonic()
+                    logger.info(f"Backfill progress: {self.progress()}")
+
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        logger.info(
+            f"Backfill done: {self.progress()} in {time.monotonic() - started:.0f}s"
+        )
@@ -0,0 +1,343 @@
+"""Batch mode for the daily reports (SUMMARY_BATCH=1).
+
+Daily reports can wait, so their model calls don't need the full-price
+synchronous API. In batch mode, the prompts of the daily reports are
+collected for BATCH_COLLECT_SECONDS into one batch file (one JSON request
+per line), submitted through a BatchTransport, and polled every
+BATCH_POLL_SECONDS until the results are ready. Reports starting together
+(the guilds due at the same wake-up) share one batch.
+
+A batch that fails or is not complete after BATCH_DEADLINE_MINUTES is
+cancelled, and its prompts are sent through the direct client instead, so a
+slow batch queue only delays the reports, never loses them.
+
+Transports:
+- "openai": the OpenAI Batch API (/v1/responses, 24h completion window)
+- "local": an offline stand-in completing batches with the simulated
+  backend, for tests and load tests without an API key
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import tempfile
+import time
+from contextlib import nullcontext
+from pathlib import Path
+
+from openai import AsyncOpenAI
+
+import metrics
+from config import (
+    OPENAI_API_KEY,
+    SUMMARY_MODEL,
+    BATCH_TRANSPORT,
+    BATCH_COLLECT_SECONDS,
+    BATCH_POLL_SECONDS,
+    BATCH_DEADLINE_MINUTES,
+)
+from summary_backends import Completion, SimulatedBackend, SummarizerError
+
+logger = logging.getLogger(__name__)
+
+ENDPOINT = "/v1/responses"
+FAILED_STATUSES = ("failed", "expired", "cancelled")
+
+
+def build_batch_file(requests, model=SUMMARY_MODEL):
+    """Return the JSONL batch file of `requests`, a list of (custom_id, prompt, max_output_tokens)."""
+    lines = [
+        json.dumps(
+            {
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": ENDPOINT,
+                "body": {"model": model, "input": prompt, "max_output_tokens": max_output_tokens},
+            },
+            ensure_ascii=False,
+        )
+        for custom_id, prompt, max_output_tokens in requests
+    ]
+    return ("\n".join(lines) + "\n").encode()
+
+
+def parse_batch_output(text):
+    """Parse a batch output file.
+
+    Returns:
+        Dict {custom_id: Completion or SummarizerError}
+    """
+    results = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        response = item.get("response") or {}
+        body = response.get("body") or {}
+        if item.get("error") or response.get("status_code") != 200:
+            error = item.get("error") or body.get("error") or response
+            results[item["custom_id"]] = SummarizerError(f"batch request failed: {error}")
+            continue
+        # The raw Responses API object: concatenate the output_text parts
+        text_parts = [
+            content["text"]
+            for output in body.get("output", [])
+            if output.get("type") == "message"
+            for content in output.get("content", [])
+            if content.get("type") == "output_text"
+        ]
+        usage = body.get("usage") or {}
+        results[item["custom_id"]] = Completion(
+            "".join(text_parts).strip(), usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+        )
+    return results
+
+
+class OpenAIBatchTransport:
+    """Submits batches to the OpenAI Batch API.
+
+    A transport has async `submit(batch_file) -> batch_id`, `poll(batch_id)
+    -> status`, `results(batch_id) -> {custom_id: Completion or
+    SummarizerError}` and `cancel(batch_id)` methods, with OpenAI's batch
+    statuses ("completed", "failed", "expired", "cancelled", or in progress).
+    """
+
+    name = "openai"
+
+    def __init__(self, api_key=OPENAI_API_KEY):
+        self.client = AsyncOpenAI(api_key=api_key)
+
+    async def submit(self, batch_file):
+        uploaded = await self.client.files.create(
+            file=("daily_summaries.jsonl", batch_file), purpose="batch"
+        )
+        batch = await self.client.batches.create(
+            input_file_id=uploaded.id, endpoint=ENDPOINT, completion_window="24h"
+        )
+        return batch.id
+
+    async def poll(self, batch_id):
+        return (await self.client.batches.retrieve(batch_id)).status
+
+    async def results(self, batch_id):
+        batch = await self.client.batches.retrieve(batch_id)
+        results = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                content = await self.client.files.content(file_id)
+                results.update(parse_batch_output(content.text))
+        return results
+
+    async def cancel(self, batch_id):
+        await self.client.batches.cancel(batch_id)
+
+
+class LocalBatchTransport:
+    """Offline stand-in for the Batch API.
+
+    Writes each batch file to `directory`, then completes it in the
+    background with `backend` (a SimulatedBackend by default), `delay`
+    seconds after submission at the earliest, writing an output file in the
+    Batch API format. With `never_complete`, batches stay in progress
+    forever, to exercise the deadline fallback.
+    """
+
+    name = "local"
+
+    def __init__(self, backend=None, delay=5, directory=None, never_complete=False):
+        self.backend = backend or SimulatedBackend()
+        self.delay = delay
+        self.directory = Path(directory or tempfile.mkdtemp(prefix="arachne-batches-"))
+        self.never_complete = never_complete
+        self._batches = {}  # batch ID -> status
+        self._ids = itertools.count(1)
+
+    async def submit(self, batch_file):
+        batch_id = f"batch_local_{next(self._ids)}"
+        (self.directory / f"{batch_id}_input.jsonl").write_bytes(batch_file)
+        self._batches[batch_id] = "in_progress"
+        if not self.never_complete:
+            asyncio.create_task(self._complete(batch_id))
+        return batch_id
+
+    async def _complete(self, batch_id):
+        await asyncio.sleep(self.delay)
+        requests = [
+            json.loads(line)
+            for line in (self.directory / f"{batch_id}_input.jsonl").read_text().splitlines()
+        ]
+
+        async def run(request):
+            body = request["body"]
+            try:
+                completion = await self.backend.complete(body["input"], body["max_output_tokens"])
+            except SummarizerError as e:
+                return {"custom_id": request["custom_id"], "response": None, "error": {"message": str(e)}}
+            return {
+                "custom_id": request["custom_id"],
+                "response": {
+                    "status_code": 200,
+                    "body": {
+                        "output": [
+                            {"type": "message", "content": [{"type": "output_text", "text": completion.text}]}
+                        ],
+                        "usage": {
+                            "input_tokens": completion.input_tokens,
+                            "output_tokens": completion.output_tokens,
+                        },
+                    },
+                },
+                "error": None,
+            }
+
+        lines = await asyncio.gather(*(run(request) for request in requests))
+        (self.directory / f"{batch_id}_output.jsonl").write_text(
+            "\n".join(json.dumps(line, ensure_ascii=False) for line in lines) + "\n"
+        )
+        if self._batches[batch_id] == "in_progress":
+            self._batches[batch_id] = "completed"
+
+    async def poll(self, batch_id):
+        return self._batches[batch_id]
+
+    async def results(self, batch_id):
+        return parse_batch_output((self.directory / f"{batch_id}_output.jsonl").read_text())
+
+    async def cancel(self, batch_id):
+        self._batches[batch_id] = "cancelled"
+
+
+TRANSPORTS = {
+    "openai": OpenAIBatchTransport,
+    "local": LocalBatchTransport,
+}
+
+
+class BatchClient:
+    """Collects model calls into batches, with the interface of LLMClient.
+
+    Args:
+        transport: BatchTransport submitting the batches
+        fallback: Client used for the prompts of a failed or late batch
+        collect_seconds: How long prompts are collected before submitting
+        poll_seconds: Interval between two status checks
+        deadline_minutes: Time after submission before falling back
+        slots: Semaphore bounding the fallback calls in flight, shared with
+            the direct path so a failed batch doesn't send all its prompts at once
+    """
+
+    name = "batch"
+
+    def __init__(
+        self,
+        transport,
+        fallback,
+        collect_seconds=BATCH_COLLECT_SECONDS,
+        poll_seconds=BATCH_POLL_SECONDS,
+        deadline_minutes=BATCH_DEADLINE_MINUTES,
+        slots=None,
+    ):
+        self.transport = transport
+        self.fallback = fallback
+        self.collect_seconds = collect_seconds
+        self.poll_seconds = poll_seconds
+        self.deadline = deadline_minutes * 60
+        self.slots = slots
+        self._pending = []
+        self._collector = None
+        self._ids = itertools.count(1)
+
+    async def complete(self, prompt, max_output_tokens=1000, channel_name=None):
+        """Add `prompt` to the next batch and return its Completion once the batch is done."""
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append(
+            (f"request-{next(self._ids)}", prompt, max_output_tokens, channel_name, future)
+        )
+        if self._collector is None:
+            self._collector = asyncio.create_task(self._collect())
+        return await future
+
+    async def _collect(self):
+        await asyncio.sleep(self.collect_seconds)
+        requests, self._pending, self._collector = self._pending, [], None
+        await self._run_batch(requests)
+
+    async def _run_batch(self, requests):
+        started = time.monotonic()
+        results = {}
+        try:
+            results = await self._wait_for_batch(requests, started)
+        except asyncio.CancelledError:
+            # Shutting down: the callers won't get an answer either way
+            for *_, future in requests:
+                future.cancel()
+            raise
+        except Exception:
+            # Whatever went wrong, every request still gets an answer below
+            logger.exception(f"Batch of {len(requests)} requests failed, sending them directly")
+        finally:
+            metrics.batch_seconds.observe(time.monotonic() - started, transport=self.transport.name)
+            fallbacks = []
+            for custom_id, prompt, max_tokens, channel_name, future in requests:
+                if future.done():
+                    continue  # the caller was cancelled
+                result = results.get(custom_id)
+                if isinstance(result, Completion):
+                    metrics.batch_requests.inc(outcome="batched")
+                    metrics.llm_tokens.inc(result.input_tokens, channel=channel_name or "unknown", direction="input")
+                    metrics.llm_tokens.inc(result.output_tokens, channel=channel_name or "unknown", direction="output")
+                    future.set_result(result)
+                else:
+                    metrics.batch_requests.inc(outcome="fallback")
+                    fallbacks.append(self._complete_directly(prompt, max_tokens, channel_name, future))
+            await asyncio.gather(*fallbacks)
+
+    async def _wait_for_batch(self, requests, started):
+        """Submit a batch and wait for it.
+
+        Returns:
+            Dict {custom_id: Completion or SummarizerError}, empty if the batch
+            failed or missed its deadline
+        """
+        batch_file = build_batch_file(
+            [(custom_id, prompt, max_tokens) for custom_id, prompt, max_tokens, _, _ in requests]
+        )
+        batch_id = await self.transport.submit(batch_file)
+        logger.info(
+            f"Submitted batch {batch_id} of {len(requests)} summary requests ({len(batch_file)} bytes)"
+        )
+        while True:
+            status = await self.transport.poll(batch_id)
+            if status == "completed":
+                logger.info(f"Batch {batch_id} completed in {time.monotonic() - started:.0f}s")
+                return await self.transport.results(batch_id)
+            if status in FAILED_STATUSES:
+                logger.warning(f"Batch {batch_id} {status}, sending its requests directly")
+                return {}
+            if time.monotonic() - started > self.deadline:
+                logger.warning(
+                    f"Batch {batch_id} missed its {self.deadline / 60:.0f} min deadline, sending its requests directly"
+                )
+                await self.transport.cancel(batch_id)
+                return {}
+            await asyncio.sleep(self.poll_seconds)
+
+    async def _complete_directly(self, prompt, max_tokens, channel_name, future):
+        try:
+            async with self.slots or nullcontext():
+                result = await self.fallback.complete(prompt, max_tokens, channel_name)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(result)
+
+
+def create_batch_client(fallback, name=BATCH_TRANSPORT, slots=None):
+    """Build a BatchClient on the transport registered under `name` (see TRANSPORTS)."""
+    if name not in TRANSPORTS:
+        raise ValueError(f"Unknown BATCH_TRANSPORT {name!r}, expected one of {list(TRANSPORTS)}")
+    logger.info(f"Using {name} batch transport for the daily reports")
+    return BatchClient(TRANSPORTS[name](), fallback, slots=slots)
@@ -0,0 +1,104 @@
+"""Offline load test of the summary pipeline with the simulated backend.
+
+Summarizes many synthetic channels concurrently, as the daily report does,
+and reports throughput and per-channel latency percentiles. No API key is
+needed: every model call goes to SimulatedBackend. The client's rate limits
+are off unless --rpm/--tpm are given, so the wall time measures the pipeline
+rather than LLM_RPM/LLM_TPM; the time spent waiting on them is reported apart.
+
+Usage (from the repository root):
+    python -m benchmarks.pipeline --channels 200 --messages 2000
+    python -m benchmarks.pipeline --latency-ms 1500 --error-rate 0.02
+    python -m benchmarks.pipeline --rpm 500 --tpm 200000
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import metrics
+import summarizer
+from benchmarks.synthetic import conversation
+from config import (
+    SIMULATED_ERROR_RATE,
+    SIMULATED_LATENCY_MS,
+    SIMULATED_OUTPUT_TOKENS,
+    SIMULATED_TOKENS_PER_SECOND,
+)
+from llm_client import LLMClient
+from summary_backends import SimulatedBackend
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def throttle_seconds():
+    """Return the total time model calls waited on the client's rate limits."""
+    return sum(
+        float(sample.rsplit(" ", 1)[1])
+        for sample in metrics.llm_throttle_seconds.samples()
+        if sample.startswith(f"{metrics.llm_throttle_seconds.name}_sum")
+    )
+
+
+async def run(channels, messages):
+    latencies = []
+    failures = 0
+
+    async def one(index):
+        nonlocal failures
+        started = time.perf_counter()
+        summary = await summarizer.summarize(
+            conversation(messages, seed=index), f"channel-{index}"
+        )
+        latencies.append(time.perf_counter() - started)
+        if summary == summarizer.SUMMARY_ERROR:
+            failures += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(channels)))
+    return time.perf_counter() - started, latencies, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--channels", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=1000, help="messages per channel")
+    parser.add_argument("--latency-ms", type=float, default=SIMULATED_LATENCY_MS)
+    parser.add_argument("--tokens-per-second", type=float, default=SIMULATED_TOKENS_PER_SECOND)
+    parser.add_argument("--output-tokens", type=int, default=SIMULATED_OUTPUT_TOKENS)
+    parser.add_argument("--error-rate", type=float, default=SIMULATED_ERROR_RATE)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--rpm", type=int, default=0, help="client requests per minute (0: unlimited)")
+    parser.add_argument("--tpm", type=int, default=0, help="client tokens per minute (0: unlimited)")
+    args = parser.parse_args()
+
+    backend = SimulatedBackend(
+        latency_ms=args.latency_ms,
+        tokens_per_second=args.tokens_per_second,
+        output_tokens=args.output_tokens,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    summarizer.use_backend(backend)
+    summarizer.client = LLMClient(backend, rpm=args.rpm, tpm=args.tpm)
+
+    elapsed, latencies, failures = asyncio.run(run(args.channels, args.messages))
+    print(f"channels            {args.channels} x {args.messages} messages")
+    print(f"wall time           {elapsed:.2f} s")
+    print(f"throughput          {args.channels / elapsed:.2f} channels/s")
+    print(f"rate limits         {args.rpm or 'unlimited'} rpm, {args.tpm or 'unlimited'} tpm")
+    print(f"throttled           {throttle_seconds():.2f} s (summed over calls)")
+    print(f"backend calls       {backend.calls} ({backend.errors} errors)")
+    print(f"failed summaries    {failures}")
+    print(f"latency p50         {statistics.median(latencies):.2f} s")
+    print(f"latency p95         {percentile(latencies, 0.95):.2f} s")
+    print(f"latency p99         {percentile(latencies, 0.99):.2f} s")
+    print(f"latency max         {max(latencies):.2f} s")
+
+
+if __name__ == "__main__":
+    main()
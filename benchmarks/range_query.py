@@ -0,0 +1,89 @@
+"""Range query latency as the messages table grows.
+
+Builds databases of increasing size and times the queries the scheduler and
+/resume run against them, once with the migrated schema (indexes) and once
+without the indexes, to show that indexed latency stays flat.
+
+Usage (from the repository root):
+    python -m benchmarks.range_query
+    python -m benchmarks.range_query --sizes 10000 100000 1000000
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+
+from benchmarks.synthetic import channel_id, populate
+from db import MessageStore
+
+
+def drop_indexes(store):
+    def drop(conn):
+        names = [
+            row[0]
+            for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'messages' AND sql IS NOT NULL"
+            )
+        ]
+        for name in names:
+            conn.execute(f"DROP INDEX {name}")
+
+    store._write(drop)
+
+
+def time_queries(store, end, repeat):
+    """Return median latency in milliseconds for each query shape."""
+    start = end - timedelta(days=1)
+    queries = {
+        "messages_in_range(channel_name)": lambda: store.get_messages_in_range(
+            start, end, channel_name="channel-0", server_id="1000"
+        ),
+        "messages_in_range(channel_id)": lambda: store.get_messages_in_range(
+            start, end, channel_id=channel_id(0, 0), server_id="1000"
+        ),
+        "active_channels_in_range(server)": lambda: store.get_active_channels_in_range(
+            start, end, server_id="1000"
+        ),
+        "active_channels_in_range(all)": lambda: store.get_active_channels_in_range(
+            start, end
+        ),
+        "servers": store.get_servers,
+    }
+    results = {}
+    for name, query in queries.items():
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            query()
+            samples.append((time.perf_counter() - started) * 1000)
+        results[name] = statistics.median(samples)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000]
+    )
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'rows':>10}  {'query':<36}{'indexed ms':>12}{'no index ms':>13}")
+    for rows in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = MessageStore(os.path.join(tmp, "bench.db"))
+            end = populate(store, rows)
+            indexed = time_queries(store, end, args.repeat)
+            drop_indexes(store)
+            unindexed = time_queries(store, end, args.repeat)
+            store.close()
+
+        for name in indexed:
+            print(f"{rows:>10}  {name:<36}{indexed[name]:>12.2f}{unindexed[name]:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""Micro-benchmark suite for storage, prompt building and message splitting.
+
+Measures:
+- insert throughput of MessageStore.add_message (write-behind batches), with
+  batch size 1 as the one-commit-per-message baseline;
+- range query latency at growing table sizes;
+- prompt build time (compaction, chunking and prompt text);
+- safe_send splitting of very large summaries.
+
+Results are written as JSON (with the git revision and library versions) so
+runs can be compared over time.
+
+Usage (from the repository root):
+    python -m benchmarks.suite
+    python -m benchmarks.suite --sizes 10000 100000 1000000 10000000
+    python -m benchmarks.suite --compare old.json new.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from benchmarks.range_query import time_queries
+from benchmarks.synthetic import conversation, message_rows, populate
+from compaction import compact
+from db import MessageStore, from_ms
+from summarizer import SUMMARY_CHUNK_TOKENS, _conversation_prompt, chunk_lines
+from delivery import split_message
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+
+
+def _median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def bench_insert(count, batch_sizes=(1, 200, 1000)):
+    """Messages per second through add_message for several batch sizes."""
+    rows = list(message_rows(count))
+    results = {}
+    for batch_size in batch_sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = MessageStore(
+                os.path.join(tmp, "bench.db"), batch_size=batch_size, flush_interval=1
+            )
+            started = time.perf_counter()
+            for message_id, sid, sname, cid, cname, author, content, ts in rows:
+                store.add_message(
+                    author,
+                    content,
+                    cname,
+                    from_ms(ts),
+                    server_id=sid,
+                    server_name=sname,
+                    channel_id=cid,
+                    message_id=message_id,
+                )
+            store.flush()
+            elapsed = time.perf_counter() - started
+            stats = store.ingestion_stats()
+            store.close()
+        results[f"batch_{batch_size}"] = {
+            "messages_per_second": count / elapsed,
+            "max_flush_latency_ms": stats["max_flush_latency"] * 1000,
+        }
+    return results
+
+
+def bench_range_queries(sizes, repeat):
+    """Median latency of the scheduler and /resume queries per table size."""
+    results = {}
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            store = MessageStore(os.path.join(tmp, "bench.db"))
+            end = populate(store, rows)
+            results[str(rows)] = time_queries(store, end, repeat)
+            store.close()
+    return results
+
+
+def bench_prompt_build(sizes, repeat):
+    """Time to turn a conversation into prompt text, per conversation size."""
+    results = {}
+    for count in sizes:
+        messages = conversation(count)
+
+        def build():
+            lines = [f"{author}: {content}" for author, content in compact(messages)]
+            for window in chunk_lines(lines, SUMMARY_CHUNK_TOKENS):
+                _conversation_prompt("\n".join(window), "bench")
+
+        results[str(count)] = {"ms": _median_ms(build, repeat)}
+    return results
+
+
+def bench_safe_send(sizes, repeat):
+    """Time to split summaries of growing size into Discord messages."""
+    results = {}
+    for size in sizes:
+        paragraph = "**#général** (120 messages):\n" + "Une ligne de résumé. " * 8
+        summary = "\n\n---\n\n".join([paragraph] * (size // len(paragraph) + 1))[:size]
+        chunks = []
+
+        def split():
+            chunks[:] = split_message(summary)
+
+        results[str(size)] = {"ms": _median_ms(split, repeat), "chunks": len(chunks)}
+    return results
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(old_path, new_path):
+    """Print the ratio new/old for every numeric result present in both files."""
+    with open(old_path) as f:
+        old = json.load(f)["results"]
+    with open(new_path) as f:
+        new = json.load(f)["results"]
+
+    def walk(a, b, path):
+        for key in sorted(set(a) & set(b)):
+            if isinstance(a[key], dict) and isinstance(b[key], dict):
+                walk(a[key], b[key], f"{path}.{key}" if path else key)
+            elif isinstance(a[key], (int, float)) and isinstance(b[key], (int, float)):
+                ratio = b[key] / a[key] if a[key] else float("inf")
+                name = f"{path}.{key}"
+                print(f"{name:<60} {a[key]:>14.3f} {b[key]:>14.3f} {ratio:>8.2f}x")
+
+    print(f"{'metric':<60} {'old':>14} {'new':>14} {'ratio':>8}")
+    walk(old, new, "")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[10_000, 100_000, 1_000_000],
+        help="table sizes for the range query benchmark (up to 10^7)",
+    )
+    parser.add_argument("--inserts", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="result file (default: benchmarks/results/<time>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    started = datetime.now(timezone.utc)
+    results = {}
+    print(f"Insert throughput ({args.inserts} messages)...")
+    results["insert"] = bench_insert(args.inserts)
+    print(f"Range queries at {args.sizes} rows...")
+    results["range_query"] = bench_range_queries(args.sizes, args.repeat)
+    print("Prompt build...")
+    results["prompt_build"] = bench_prompt_build([100, 1_000, 10_000, 100_000], args.repeat)
+    print("safe_send splitting...")
+    results["safe_send"] = bench_safe_send([10_000, 100_000, 1_000_000], args.repeat)
+
+    report = {
+        "started_at": started.isoformat(),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "results": results,
+    }
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"{started.strftime('%Y%m%dT%H%M%SZ')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Synthetic Discord traffic for the benchmarks.
+
+Messages are spread over many guilds and channels with a skewed activity
+distribution (a few busy channels, a long tail of quiet ones) and realistic
+content: mostly short chat lines, some links, emoji reactions, bot commands
+and the occasional long paste.
+"""
+
+import random
+from datetime import datetime, timedelta, timezone
+
+from db import to_ms
+
+SERVERS = 20
+CHANNELS_PER_SERVER = 25
+AUTHORS = 500
+DAYS = 90
+END = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+WORDS = (
+    "le la les un une des et ou mais donc pour avec sans sur sous dans ce cette "
+    "projet serveur bot message résumé demain hier réunion code bug fix test "
+    "merci super ok d'accord vraiment peut-être toujours jamais"
+).split()
+
+
+def server_id(server):
+    return str(1000 + server)
+
+
+def channel_id(server, channel):
+    return str(100000 + server * CHANNELS_PER_SERVER + channel)
+
+
+def content(rng):
+    """Return one message body."""
+    kind = rng.random()
+    if kind < 0.03:
+        return "!resume all"
+    if kind < 0.08:
+        return rng.choice(["👍", "😂😂", "🔥", "<:pog:123456789012345678>", "+1"])
+    if kind < 0.13:
+        return f"regardez https://example.com/{rng.randrange(10**6)}?ref=discord&utm_source=share"
+    if kind < 0.15:
+        # Pasted log
+        return "\n".join(
+            f"2025-01-01 12:00:{i % 60:02d} INFO worker-{rng.randrange(4)}: step {i} ok"
+            for i in range(rng.randrange(20, 200))
+        )
+    length = max(1, int(rng.lognormvariate(2.2, 0.8)))
+    return " ".join(rng.choice(WORDS) for _ in range(length))
+
+
+def message_rows(count, seed=42, end=END, days=DAYS):
+    """Yield `count` rows in the order MessageStore queues them (see add_message)."""
+    rng = random.Random(seed)
+    span = days * 24 * 3600
+    for index in range(count):
+        server = min(int(rng.paretovariate(1.2)) - 1, SERVERS - 1)
+        channel = min(int(rng.paretovariate(1.1)) - 1, CHANNELS_PER_SERVER - 1)
+        timestamp = end - timedelta(seconds=rng.randrange(span))
+        yield (
+            10**12 + index,
+            int(server_id(server)),
+            f"server-{server}",
+            int(channel_id(server, channel)),
+            f"channel-{channel}",
+            f"user-{rng.randrange(AUTHORS)}",
+            content(rng),
+            to_ms(timestamp),
+        )
+
+
+def conversation(count, seed=42):
+    """Return `count` (author, content) tuples, as passed to the summarizer."""
+    rng = random.Random(seed)
+    return [(f"user-{rng.randrange(20)}", content(rng)) for _ in range(count)]
+
+
+def populate(store, rows, seed=42, batch_size=50000):
+    """Insert `rows` synthetic messages directly through the writer thread."""
+    batch = []
+    for row in message_rows(rows, seed):
+        batch.append(row)
+        if len(batch) >= batch_size:
+            _write_rows(store, batch)
+            batch = []
+    _write_rows(store, batch)
+    store._write(lambda conn: conn.execute("ANALYZE"))
+    return END
+
+
+def _write_rows(store, rows):
+    store._write(lambda conn: store._insert_messages(conn, rows))
@@ -3,13 +3,21 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 from discord.utils import _ColourFormatter
-from db import MessageStore
+from backfill import Backfill
+from db import AsyncMessageStore, MessageStore, to_ms
 from scheduler import DailySummary
-from summarizer import summarize
+import summarizer
+from rolling import RollingSummaries
+from retention import Retention
+from coordination import Leadership
+from summary_channels import SummaryChannels
+from summary_jobs import SummaryQueue, resume_report
+from search import SearchResults, readable_channel_ids
+from summary_cache import SummaryCache
 from utils import safe_send
 import config
+import metrics
 from datetime import datetime, timezone, timedelta
-from openai import OpenAIError
 import logging
 
 
@@ -45,10 +53,58 @@ logger = logging.getLogger(__name__)
 intents = discord.Intents.default()
 intents.message_content = True
 
-bot = commands.Bot(command_prefix="!", intents=intents)
+if config.SHARD_COUNT:
+    # This process connects to SHARD_IDS (all shards when empty); the other
+    # shards run in sibling processes sharing the same database
+    bot = commands.AutoShardedBot(
+        command_prefix="!",
+        intents=intents,
+        shard_count=config.SHARD_COUNT,
+        shard_ids=config.SHARD_IDS or None,
+    )
+else:
+    bot = commands.Bot(command_prefix="!", intents=intents)
+
+# One store shared by the bot and the scheduler: a single writer thread and a
+# pool of WAL readers behind an awaitable facade
+message_store = MessageStore()
+store = AsyncMessageStore(message_store)
+summary_channels = SummaryChannels(bot, store)
+# With SUMMARY_QUEUE, summaries are built by summary_worker.py processes
+summary_queue = SummaryQueue(store) if config.SUMMARY_QUEUE else None
+scheduler = DailySummary(bot, store, summary_channels, summary_queue)
+backfill = Backfill(store)
+summarizer.use_cache(SummaryCache(store))
+rolling = RollingSummaries(store, backfill)
+retention = Retention(store, backfill)
+metrics.start_server()
+
+
+def start_jobs():
+    logger.info("Starting daily summary scheduler...")
+    scheduler.start()
+    if summary_queue and not summary_queue.deliver.is_running():
+        logger.info("Delivering summaries built by the summary workers...")
+        summary_queue.deliver.start()
+    if config.ROLLING_SEGMENT_MINUTES > 0 and not rolling.run.is_running():
+        logger.info("Starting rolling summaries...")
+        rolling.run.start()
+    if config.RETENTION_DAYS > 0 and not retention.run.is_running():
+        logger.info(f"Starting retention job ({config.RETENTION_DAYS} days kept hot)...")
+        retention.run.start()
+
+
+def stop_jobs():
+    logger.info("Stopping scheduled jobs...")
+    scheduler.stop()
+    if summary_queue:
+        summary_queue.deliver.cancel()
+    rolling.run.cancel()
+    retention.run.cancel()
+
 
-store = MessageStore()
-scheduler = DailySummary(bot)
+# With several processes, only the one holding the lease runs the jobs
+leadership = Leadership(store, start_jobs, stop_jobs) if config.SHARD_COUNT else None
 
 
 # ----------------------
@@ -57,34 +113,63 @@ scheduler = DailySummary(bot)
 @bot.event
 async def on_ready():
     logger.info(f"{bot.user} est connecté.")
-    
-    # Sync slash commands
-    try:
-        synced = await bot.tree.sync()
-        logger.info(f"Synced {len(synced)} command(s)")
-    except Exception as e:
-        logger.error(f"Failed to sync commands: {e}")
+    await summary_channels.load()
+
+    # Sync slash commands (once, from the process running shard 0)
+    if not config.SHARD_IDS or 0 in config.SHARD_IDS:
+        try:
+            synced = await bot.tree.sync()
+            logger.info(f"Synced {len(synced)} command(s)")
+        except Exception as e:
+            logger.error(f"Failed to sync commands: {e}")
 
-    # Fetch messages smartly
+    # Fetch missed history in the background so commands work right away
     n_days = config.FETCH_NB_DAYS
     logger.info(
         f"Populating database with {n_days} days of message history if needed..."
     )
-    for guild in bot.guilds:
-        for channel in guild.text_channels:
-            try:
-                await fetch_history(channel, days=n_days)
-                await asyncio.sleep(1)  # respect rate limits
-            except Exception as e:
-                logger.warning(f"Could not fetch messages from #{channel.name}: {e}")
-    logger.info(f"Populating database done")
+    backfill.start(bot.guilds, days=n_days)
 
 
 # Start daily summary scheduler
 @bot.event
 async def on_connect():
-    logger.info("Starting daily summary scheduler...")
-    scheduler.run_daily_summary.start()
+    if leadership is None:
+        start_jobs()
+    elif not leadership.run.is_running():
+        logger.info("Joining the election of the scheduled jobs process...")
+        leadership.run.start()
+
+
+# Keep the summary channel index current
+@bot.event
+async def on_guild_join(guild):
+    summary_channels.index_guild(guild)
+
+
+@bot.event
+async def on_guild_available(guild):
+    summary_channels.index_guild(guild)
+
+
+@bot.event
+async def on_guild_remove(guild):
+    summary_channels.forget_guild(guild)
+
+
+@bot.event
+async def on_guild_channel_create(channel):
+    summary_channels.channel_changed(channel)
+
+
+@bot.event
+async def on_guild_channel_update(before, after):
+    summary_channels.channel_changed(after, before)
+
+
+@bot.event
+async def on_guild_channel_delete(channel):
+    summary_channels.channel_changed(channel)
 
 
 # Remember messages seen
@@ -113,6 +198,7 @@ async def on_message(message):
         server_id=server_id,
         server_name=server_name,
         channel_id=channel_id,
+        message_id=message.id,
     )
     await bot.process_commands(message)
 
@@ -140,6 +226,11 @@ async def manual_resume(interaction: discord.Interaction, channel: str, days: in
     # Defer the response since this will take time
     await interaction.response.defer()
 
+    if backfill.running:
+        await interaction.followup.send(
+            f"⏳ Synchronisation de l'historique en cours ({backfill.progress()}), le résumé peut être incomplet."
+        )
+
     # Determine time range based on days parameter
     now = datetime.now(timezone.utc)
     
@@ -164,102 +255,46 @@ async def manual_resume(interaction: discord.Interaction, channel: str, days: in
     server_id = str(interaction.guild.id) if interaction.guild else None
     server_name = interaction.guild.name if interaction.guild else None
 
-    try:
-        if channel == "all":
-            # Generate summaries for all active channels in current server
-            if period_type == "range":
-                active_channels = store.get_active_channels_in_range(
-                    start_time, end_time, server_id
-                )
-            else:
-                active_channels = store.get_active_channels(start_time, server_id)
-
-            if not active_channels:
-                server_desc = f" sur {server_name}" if server_name else ""
-                await interaction.followup.send(
-                    f"📋 Aucun message trouvé {time_desc} dans aucun canal{server_desc}."
-                )
-                return
-
-            # Send initial progress message
+    # Generate summary for all channels, or a specific channel or the
+    # current channel in current server
+    target_channel = interaction.channel.name if channel == "current" else channel # type: ignore
+    payload = {
+        "server_id": server_id,
+        "server_name": server_name,
+        "channel": target_channel,
+        "start_ms": to_ms(start_time),
+        "end_ms": to_ms(end_time),
+        "period_type": period_type,
+        "time_desc": time_desc,
+        "channel_id": interaction.channel_id,
+        "user_id": interaction.user.id,
+    }
+
+    if summary_queue:
+        # A summary worker builds it; deliver_resume posts it in this channel
+        job_id = await summary_queue.submit("resume", payload)
+        await interaction.followup.send(
+            f"⏳ Résumé en file d'attente (tâche n°{job_id}), il sera publié dans ce canal."
+        )
+        return
+
+    async def progress(done, total, channel_name):
+        # Send progress message
+        if channel_name is None:
             await interaction.followup.send(
-                f"⚙️ Génération des résumés pour {len(active_channels)} canaux sur {server_name}..."
+                f"⚙️ Génération des résumés pour {total} canaux sur {server_name}..."
             )
-
-            summaries = []
-            total_messages = 0
-            for i, channel_name in enumerate(active_channels):
-                if period_type == "range":
-                    messages = store.get_messages_in_range(
-                        start_time, end_time, channel_name=channel_name, server_id=server_id
-                    )
-                else:
-                    messages = store.get_messages_since(
-                        start_time, channel_name=channel_name, server_id=server_id
-                    )
-
-                if messages:
-                    total_messages += len(messages)
-                    # Get category information for this channel from channel_meta
-                    _, category_name_cat = store.get_channel_category(
-                        channel_name=channel_name, server_id=server_id
-                    )
-                    category_display = (
-                        f" [{category_name_cat}]" if category_name_cat else ""
-                    )
-
-                    summary = summarize(messages, channel_name)
-                    summaries.append(
-                        f"**#{channel_name}**{category_display} ({len(messages)} messages):\n{summary}"
-                    )
-
-            if summaries:
-                server_desc = f" sur **{server_name}**" if server_name else ""
-                header = f"📋 Résumés de tous les canaux {time_desc}{server_desc} ({total_messages} messages sur {len(active_channels)} canaux) :\n\n"
-                full_summary = header + "\n\n---\n\n".join(summaries)
-
-                # Use safe_send to handle long messages
-                await safe_send(interaction, full_summary)
-            else:
-                await interaction.followup.send(f"📋 Aucun message à résumer {time_desc}.")
-
         else:
-            # Generate summary for specific channel or current channel in current server
-            target_channel = interaction.channel.name if channel == "current" else channel # type: ignore
-
-            if period_type == "range":
-                messages = store.get_messages_in_range(
-                    start_time,
-                    end_time,
-                    channel_name=target_channel,
-                    server_id=server_id,
-                )
-            else:
-                messages = store.get_messages_since(
-                    start_time, channel_name=target_channel, server_id=server_id
-                )
-
-            if not messages:
-                server_desc = f" sur {server_name}" if server_name else ""
-                await interaction.followup.send(
-                    f"📋 Aucun message trouvé {time_desc} dans #{target_channel}{server_desc}."
-                )
-                return
-
-            # Send progress message
             await interaction.followup.send(
-                f"⚙️ Génération du résumé pour #{target_channel}..."
+                f"⚙️ Génération du résumé pour #{channel_name}..."
             )
-            summary = summarize(messages, target_channel)
-
-            server_desc = f" sur **{server_name}**" if server_name else ""
-            result_msg = f"📋 Résumé de #{target_channel} {time_desc}{server_desc} ({len(messages)} messages) :\n\n{summary}"
-            await safe_send(interaction, result_msg)
 
-    except OpenAIError as e:
-        logger.error(f"OpenAI error while generating summary: {e}")
-        await interaction.followup.send(f"⚠️ Impossible de générer le résumé pour l'instant : {str(e)}")
-        return
+    try:
+        result_msg = await resume_report(store, payload, progress)
+        if result_msg == summarizer.SUMMARY_ERROR:
+            logger.error(f"Summarizer error while generating /resume summary in {interaction.guild}")
+        # Use safe_send to handle long messages
+        await safe_send(interaction, result_msg)
     except Exception as e:
         logger.exception("Unexpected error in /resume command")
         await interaction.followup.send(f"⚠️ Une erreur inattendue est survenue : {str(e)}")
@@ -270,65 +305,104 @@ async def manual_resume(interaction: discord.Interaction, channel: str, days: in
     )
 
 
-# ----------------------
-# Utilities
-# ----------------------
-async def fetch_history(channel, days):
-    """
-    Fetch messages from Discord from the last `days` days or since last fetch known in DB.
-    """
-    # Get server and channel information
-    server_id = str(channel.guild.id) if channel.guild else None
-    server_name = channel.guild.name if channel.guild else None
-    channel_id = str(channel.id)
+async def deliver_resume(job):
+    """Post a /resume summary built by a summary worker (SummaryQueue handler)."""
+    payload = job["payload"]
+    channel = bot.get_channel(payload["channel_id"]) or await bot.fetch_channel(payload["channel_id"])
+    if job["status"] == "failed":
+        logger.error(f"Summarizer error while generating summary: {job['error']}")
+        await safe_send(
+            channel,
+            f"<@{payload['user_id']}> ⚠️ Impossible de générer le résumé pour l'instant : {job['error']}",
+        )
+        return
+    await safe_send(channel, f"<@{payload['user_id']}> {job['result']}")
+    logger.info(f"Résumé de la tâche n°{job['id']} envoyé dans {channel}")
 
-    # Get category information
-    category_id = str(channel.category_id) if channel.category else None
-    category_name = channel.category.name if channel.category else None
 
-    last_fetched = (
-        store.get_last_fetched(channel_id, server_id, channel.name)
-        if server_id
-        else None
-    )
-    after_date = last_fetched or (datetime.now(timezone.utc) - timedelta(days=days))
+if summary_queue:
+    summary_queue.on_result("resume", deliver_resume)
 
-    logger.info(
-        f"Fetching messages|{server_name}|{category_name}|{category_id}|#{channel.name}|{channel_id}|{after_date.isoformat()}"
-    )
 
-    # Pulling message history from Discord
+@bot.tree.command(name="search", description="Search the message history of this server")
+@app_commands.describe(
+    query="Words to search for (all must appear, word* for prefixes)",
+    channel="Only search this channel",
+    author="Only messages from this member",
+    days="Only search the last N days (default: all history)",
+)
+async def search(
+    interaction: discord.Interaction,
+    query: str,
+    channel: discord.TextChannel = None,
+    author: discord.User = None,
+    days: int = 0,
+):
+    """Slash command to search the stored messages of the current server."""
+    if not interaction.guild:
+        await interaction.response.send_message("⚠️ Cette commande ne fonctionne que sur un serveur.", ephemeral=True)
+        return
+
+    # Results stay private and only cover channels the member can read
+    await interaction.response.defer(ephemeral=True)
+    description = ""
     try:
-        async for message in channel.history(limit=None, after=after_date):
-            if not message.author.bot:
-                store.add_message(
-                    str(message.author),
-                    message.content,
-                    channel.name,
-                    message.created_at,
-                    server_id=server_id,
-                    server_name=server_name,
-                    channel_id=channel_id,
-                )
-
-        # Update last fetched timestamp (including category info for channel metadata)
-        if server_id:
-            store.update_last_fetched(
-                channel_id,
-                datetime.now(timezone.utc),
-                server_id,
-                server_name,
-                channel.name,
-                category_id,
-                category_name,
-            )
+        channel_ids = await readable_channel_ids(interaction.guild, interaction.user, store)
+        if channel:
+            channel_ids = [channel_id for channel_id in channel_ids if channel_id == str(channel.id)]
+            description += f" dans #{channel.name}"
+        filters = {"channel_ids": channel_ids}
+        if author:
+            filters["author"] = str(author)
+            description += f" de @{author}"
+        if days > 0:
+            filters["start_datetime"] = datetime.now(timezone.utc) - timedelta(days=days)
+            description += f" sur les {days} derniers jours"
+
+        view = SearchResults(
+            store, str(interaction.guild.id), interaction.user.id, query, filters, description
+        )
+        await interaction.followup.send(await view.render(), view=view, ephemeral=True)
     except Exception as e:
+        logger.exception("Unexpected error in /search command")
+        await interaction.followup.send(f"⚠️ Une erreur inattendue est survenue : {str(e)}", ephemeral=True)
+        return
+    logger.info(f"Recherche « {query} » par {interaction.user} sur {interaction.guild}")
+
+
+@bot.tree.command(name="summary_channel", description="Choose where the daily summaries of this server are posted")
+@app_commands.describe(
+    channel=f"Channel receiving the daily summaries (default: back to #{config.SUMMARY_CHANNEL})"
+)
+async def summary_channel(interaction: discord.Interaction, channel: discord.TextChannel = None):
+    """Slash command to override the summary channel of the current server."""
+    if interaction.user.id not in config.AUTHORIZED_USER_IDS:
         logger.warning(
-            f"Failed fetching  |{server_name}|{category_name}|{category_id}|#{channel.name}|{channel_id}: {e}"
+            f"Unauthorized /summary_channel attempt by {interaction.user} (ID: {interaction.user.id})"
         )
+        await interaction.response.send_message("⚠️ Vous n'êtes pas autorisé à utiliser cette commande.", ephemeral=True)
+        return
+    if not interaction.guild:
+        await interaction.response.send_message("⚠️ Cette commande ne fonctionne que sur un serveur.", ephemeral=True)
+        return
+
+    await summary_channels.set_override(interaction.guild, channel)
+    logger.info(f"Summary channel of {interaction.guild} set to {channel} by {interaction.user}")
+    if channel:
+        await interaction.response.send_message(f"📋 Les résumés quotidiens seront publiés dans {channel.mention}.")
+    else:
+        await interaction.response.send_message(f"📋 Les résumés quotidiens seront publiés dans #{config.SUMMARY_CHANNEL}.")
 
 
 # ----------------------
 # Run bot
 # ----------------------
 bot.run(config.DISCORD_TOKEN)
+
+# Hand the scheduled jobs over now rather than once the lease expires
+if leadership and leadership.is_leader:
+    asyncio.run(leadership.release())
+
+# Write whatever is still queued once the bot has shut down
+logger.info(f"Flushing {store.queue_depth} pending messages before exit")
+message_store.close()
@@ -0,0 +1,147 @@
+"""Prompt compaction: shrink a conversation before it is sent to the model.
+
+Each step takes and returns a list of (author, content) tuples. The steps run
+in the order of COMPACTION_STEPS, and the tokens saved are logged and
+accumulated per channel.
+"""
+
+import logging
+import os
+import re
+import unicodedata
+from collections import defaultdict
+from urllib.parse import urlparse
+
+from config import COMPACTION_STEPS, COMPACTION_MAX_MESSAGE_CHARS
+
+logger = logging.getLogger(__name__)
+
+COMMAND_PREFIXES = ("!",)
+URL_RE = re.compile(r"https?://\S+")
+CUSTOM_EMOJI_RE = re.compile(r"<a?:\w+:\d+>")
+MIN_PREFIX_LENGTH = 10  # shorter common prefixes are not worth stripping
+
+# Tokens saved by compaction since startup, per channel
+tokens_saved = defaultdict(int)
+
+
+def _estimate_tokens(messages):
+    return sum(len(author) + len(content) + 2 for author, content in messages) // 4
+
+
+def drop_commands(messages):
+    """Drop bot command invocations such as `!resume`."""
+    return [
+        (author, content)
+        for author, content in messages
+        if not content.lstrip().startswith(COMMAND_PREFIXES)
+    ]
+
+
+def _is_noise(content):
+    text = CUSTOM_EMOJI_RE.sub("", content)
+    for char in text:
+        # Emoji, symbols, joiners and variation selectors carry no content
+        if char.isspace() or unicodedata.category(char)[0] in ("S", "P", "M", "C"):
+            continue
+        return False
+    return True
+
+
+def drop_noise(messages):
+    """Drop empty, emoji-only and punctuation-only messages."""
+    return [(author, content) for author, content in messages if not _is_noise(content)]
+
+
+def _short_link(match):
+    host = urlparse(match.group(0)).netloc
+    return f"[lien {host}]" if host else match.group(0)
+
+
+def shorten_links(messages):
+    """Replace URLs by their host name."""
+    return [(author, URL_RE.sub(_short_link, content)) for author, content in messages]
+
+
+def truncate_long(messages):
+    """Truncate messages longer than COMPACTION_MAX_MESSAGE_CHARS (pasted logs, code)."""
+    limit = COMPACTION_MAX_MESSAGE_CHARS
+    return [
+        (
+            author,
+            content
+            if len(content) <= limit
+            else f"{content[:limit]}... [tronqué, {len(content)} caractères]",
+        )
+        for author, content in messages
+    ]
+
+
+def merge_same_author(messages):
+    """Merge consecutive messages of the same author into a single turn."""
+    merged = []
+    for author, content in messages:
+        if merged and merged[-1][0] == author:
+            merged[-1] = (author, f"{merged[-1][1]}\n{content}")
+        else:
+            merged.append((author, content))
+    return merged
+
+
+def strip_repeated_prefixes(messages):
+    """Write a prefix shared by every line of a message (timestamps, tags) only once."""
+    stripped = []
+    for author, content in messages:
+        lines = content.split("\n")
+        if len(lines) >= 3:
+            prefix = os.path.commonprefix(lines)
+            if len(prefix) >= MIN_PREFIX_LENGTH:
+                content = "\n".join(
+                    [lines[0]] + [f"…{line[len(prefix):]}" for line in lines[1:]]
+                )
+        stripped.append((author, content))
+    return stripped
+
+
+STEPS = {
+    "commands": drop_commands,
+    "noise": drop_noise,
+    "links": shorten_links,
+    "truncate": truncate_long,
+    "merge": merge_same_author,
+    "prefixes": strip_repeated_prefixes,
+}
+
+_unknown_steps = set(COMPACTION_STEPS) - set(STEPS)
+if _unknown_steps:
+    raise ValueError(
+        f"Unknown COMPACTION_STEPS {sorted(_unknown_steps)}, expected some of {list(STEPS)}"
+    )
+
+
+def compact(messages, channel_name=None, steps=COMPACTION_STEPS):
+    """Run the configured compaction steps on (author, content) tuples.
+
+    Args:
+        messages: Conversation to compact, in chronological order
+        channel_name: Channel the savings are reported for
+        steps: Names of the steps to run, in order (keys of STEPS)
+
+    Returns:
+        The compacted list of (author, content) tuples
+    """
+    compacted = [(str(author), content or "") for author, content in messages]
+    before = _estimate_tokens(compacted)
+    for step in steps:
+        compacted = STEPS[step](compacted)
+    after = _estimate_tokens(compacted)
+
+    saved = before - after
+    tokens_saved[channel_name or "unknown"] += saved
+    logger.info(
+        f"Compaction #{channel_name or 'unknown'}: {len(messages)} -> {len(compacted)} messages, "
+        f"~{before} -> ~{after} tokens ({saved / before:.0%} saved)"
+        if before
+        else f"Compaction #{channel_name or 'unknown'}: nothing to compact"
+    )
+    return compacted
@@ -9,7 +9,81 @@ DISCORD_TOKEN = str(os.getenv("DISCORD_TOKEN"))
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 SUMMARY_CHANNEL = os.getenv("SUMMARY_CHANNEL", "summaries")  # default value
 SUMMARY_HOUR = int(os.getenv("SUMMARY_HOUR", 20))  # default value: 20h UTC
+SUMMARY_TIMEZONE = os.getenv("SUMMARY_TIMEZONE", "UTC")  # default value: SUMMARY_HOUR is in UTC
+GUILD_SCHEDULES = {
+    entry.split("=", 1)[0].strip(): entry.split("=", 1)[1].strip()
+    for entry in os.getenv("GUILD_SCHEDULES", "").split(",")
+    if "=" in entry
+}  # Per-guild report time overrides (comma-separated guild_id=hour or guild_id=hour@timezone)
+SUMMARY_STAGGER_MINUTES = int(os.getenv("SUMMARY_STAGGER_MINUTES", 10))  # default value: reports spread over 10 minutes
+SUMMARY_CATCHUP_HOURS = int(os.getenv("SUMMARY_CATCHUP_HOURS", 12))  # default value: missed reports are sent up to 12 hours late
 FETCH_NB_DAYS = int(os.getenv("FETCH_NB_DAYS", 7))  # default value: 7 days
+BACKFILL_CONCURRENCY = int(os.getenv("BACKFILL_CONCURRENCY", 4))  # default value: 4 channels at a time
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 200))  # default value: 200 messages per write
+INGEST_FLUSH_INTERVAL = float(os.getenv("INGEST_FLUSH_INTERVAL", 0.5))  # default value: 0.5 seconds
+STORE_READ_POOL_SIZE = int(os.getenv("STORE_READ_POOL_SIZE", 4))  # default value: 4 read connections
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", 500))  # default value: 500 rows per fetch
+SUMMARY_BACKEND = os.getenv("SUMMARY_BACKEND", "openai")  # default value: OpenAI API ("simulated" for offline load tests)
+SUMMARY_MODEL = os.getenv("SUMMARY_MODEL", "gpt-5-mini")  # default value: gpt-5-mini
+SIMULATED_LATENCY_MS = float(os.getenv("SIMULATED_LATENCY_MS", 800))  # default value: 800 ms before the first token
+SIMULATED_TOKENS_PER_SECOND = float(os.getenv("SIMULATED_TOKENS_PER_SECOND", 80))  # default value: 80 generated tokens per second
+SIMULATED_OUTPUT_TOKENS = int(os.getenv("SIMULATED_OUTPUT_TOKENS", 300))  # default value: 300 tokens per summary
+SIMULATED_ERROR_RATE = float(os.getenv("SIMULATED_ERROR_RATE", 0))  # default value: no simulated errors
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", 4))  # default value: 4 parallel LLM calls
+SUMMARY_CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", 12000))  # default value: 12000 input tokens per LLM call
+SUMMARY_MAX_INPUT_TOKENS = int(os.getenv("SUMMARY_MAX_INPUT_TOKENS", 100000))  # default value: 100000 tokens read per channel
+SUMMARY_CHUNK_FANOUT = int(os.getenv("SUMMARY_CHUNK_FANOUT", 8))  # default value: 8 partial summaries merged per call
+COMPACTION_STEPS = [
+    step.strip()
+    for step in os.getenv(
+        "COMPACTION_STEPS", "commands,noise,links,truncate,merge,prefixes"
+    ).split(",")
+    if step.strip()
+]  # Prompt compaction steps, in order (comma-separated, empty to disable)
+COMPACTION_MAX_MESSAGE_CHARS = int(os.getenv("COMPACTION_MAX_MESSAGE_CHARS", 1500))  # default value: 1500 characters
+SUMMARY_CACHE_MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", 2000))  # default value: 2000 cached summaries
+SUMMARY_CACHE_TTL_HOURS = int(os.getenv("SUMMARY_CACHE_TTL_HOURS", 168))  # default value: 7 days
+ROLLING_SEGMENT_MINUTES = int(os.getenv("ROLLING_SEGMENT_MINUTES", 60))  # default value: hourly segments, 0 to disable
+ROLLING_LOOKBACK_HOURS = int(os.getenv("ROLLING_LOOKBACK_HOURS", 48))  # default value: 48 hours
+# LLM_RPM and LLM_TPM are enforced per process: with several bot shards
+# (SHARD_PROCESSES) or summary workers (SUMMARY_WORKER_PROCESSES) calling the
+# model, divide the account's limits by the number of those processes
+LLM_RPM = int(os.getenv("LLM_RPM", 500))  # default value: 500 requests per minute per process (OpenAI tier 1), 0 for no limit
+LLM_TPM = int(os.getenv("LLM_TPM", 200000))  # default value: 200k tokens per minute per process, 0 for no limit
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 4))  # default value: 4 retries of a transient failure
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", 1))  # default value: backoff of up to 1, 2, 4... seconds
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", 60))  # default value: backoff capped at 60 seconds
+LLM_BREAKER_THRESHOLD = int(os.getenv("LLM_BREAKER_THRESHOLD", 5))  # default value: circuit opens after 5 failures in a row
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv("LLM_BREAKER_COOLDOWN_SECONDS", 60))  # default value: calls fail fast for 60 seconds
+SUMMARY_BATCH = int(os.getenv("SUMMARY_BATCH", 0))  # default value: daily reports call the model directly (1: through the batch API)
+BATCH_TRANSPORT = os.getenv("BATCH_TRANSPORT", "openai")  # default value: OpenAI Batch API ("local" for offline tests)
+BATCH_COLLECT_SECONDS = float(os.getenv("BATCH_COLLECT_SECONDS", 30))  # default value: prompts collected for 30 seconds per batch
+BATCH_POLL_SECONDS = float(os.getenv("BATCH_POLL_SECONDS", 60))  # default value: batch status checked every minute
+BATCH_DEADLINE_MINUTES = float(os.getenv("BATCH_DEADLINE_MINUTES", 60))  # default value: direct calls if a batch takes over an hour
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")  # default value: local connections only
+METRICS_PORT = int(os.getenv("METRICS_PORT", 0))  # default value: 0, metrics endpoint disabled
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", 0))  # default value: every message stays in the main table (N: archive messages older than N days)
+ARCHIVE_DB_PATH = os.getenv("ARCHIVE_DB_PATH", "")  # default value: <database>_archive.db next to the main database
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", 5000))  # default value: 5000 messages moved per transaction
+VACUUM_PAGES_PER_RUN = int(os.getenv("VACUUM_PAGES_PER_RUN", 2000))  # default value: 2000 free pages released per hour
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", 0))  # default value: 0, a single unsharded connection
+SHARD_IDS = [
+    int(shard_id) for shard_id in os.getenv("SHARD_IDS", "").split(",") if shard_id.strip()
+]  # default value: every shard of SHARD_COUNT in this process
+SHARD_PROCESSES = int(os.getenv("SHARD_PROCESSES", 1))  # default value: 1 process (launch_shards.py)
+LEASE_TTL_SECONDS = int(os.getenv("LEASE_TTL_SECONDS", 60))  # default value: 60 seconds before another process takes over the scheduled jobs
+DELIVERY_RATE = float(os.getenv("DELIVERY_RATE", 1))  # default value: 1 message per second per channel on average
+DELIVERY_BURST = int(os.getenv("DELIVERY_BURST", 5))  # default value: bursts of 5 messages, Discord's per-channel limit
+DELIVERY_MAX_CHUNKS = int(os.getenv("DELIVERY_MAX_CHUNKS", 8))  # default value: longer texts are sent as a file attachment
+DELIVERY_MAX_RETRIES = int(os.getenv("DELIVERY_MAX_RETRIES", 3))  # default value: 3 retries of a rate-limited call
+PROGRESS_EDIT_INTERVAL = float(os.getenv("PROGRESS_EDIT_INTERVAL", 5))  # default value: progress messages edited every 5 seconds at most
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", 5))  # default value: 5 /search results per page
+SUMMARY_QUEUE = int(os.getenv("SUMMARY_QUEUE", 0))  # default value: 0, summaries built by the bot; 1 to queue them for summary_worker.py
+SUMMARY_WORKER_PROCESSES = int(os.getenv("SUMMARY_WORKER_PROCESSES", 2))  # default value: 2 worker processes
+SUMMARY_WORKER_JOBS = int(os.getenv("SUMMARY_WORKER_JOBS", 1))  # default value: 1 job at a time per worker process
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 5))  # default value: 5 seconds between two looks at an empty queue
+JOB_HEARTBEAT_SECONDS = int(os.getenv("JOB_HEARTBEAT_SECONDS", 30))  # default value: 30 seconds; a job silent for 3 heartbeats is resumed elsewhere
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", 3))  # default value: 3 attempts before a job fails
 AUTHORIZED_USER_IDS = [
     int(user_id.strip())
     for user_id in os.getenv("AUTHORIZED_USER_IDS", "0").split(",")
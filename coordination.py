@@ -0,0 +1,71 @@
+"""Coordination between bot processes sharing one database.
+
+With sharding, several processes run the bot, each connected to some of the
+shards. Every process ingests the messages of its own guilds, but the
+scheduled jobs (daily reports, rolling summaries, retention) must run in
+exactly one of them. That process holds a lease in the job_leases table,
+renewed every third of LEASE_TTL_SECONDS; if it dies, another one takes the
+lease over once it expires.
+"""
+
+import logging
+import os
+import socket
+from datetime import timedelta
+
+from discord.ext import tasks
+
+from config import LEASE_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+PROCESS_ID = f"{socket.gethostname()}:{os.getpid()}"
+LEADER_LEASE = "scheduled-jobs"
+
+
+class Leadership:
+    """Elects one process to run the scheduled jobs.
+
+    Args:
+        store: Store shared by every process
+        on_elected: Called when this process becomes the leader
+        on_demoted: Called when this process loses the lease
+    """
+
+    def __init__(self, store, on_elected, on_demoted, ttl_seconds=LEASE_TTL_SECONDS):
+        self.store = store
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.is_leader = False
+        self.run.change_interval(seconds=max(ttl_seconds / 3, 1))
+
+    @tasks.loop(seconds=20)
+    async def run(self):
+        try:
+            leader = await self.store.acquire_lease(LEADER_LEASE, PROCESS_ID, self.ttl)
+        except Exception:
+            # Without a renewed lease another process may take over: stop
+            # running the jobs rather than risk running them twice
+            logger.exception("Could not renew the scheduled jobs lease")
+            leader = False
+
+        if leader and not self.is_leader:
+            logger.info(f"Process {PROCESS_ID} now runs the scheduled jobs")
+            self.is_leader = True
+            self.on_elected()
+        elif not leader and self.is_leader:
+            logger.warning(f"Process {PROCESS_ID} lost the scheduled jobs lease")
+            self.is_leader = False
+            self.on_demoted()
+
+    async def release(self):
+        """Hand the jobs over immediately, e.g. on shutdown.
+
+        Without it, the other processes wait for the lease to expire
+        (LEASE_TTL_SECONDS) before running the jobs again.
+        """
+        if self.is_leader:
+            self.is_leader = False
+            self.on_demoted()
+            await self.store.release_lease(LEADER_LEASE, PROCESS_ID)
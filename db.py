@@ -1,18 +1,540 @@
+import asyncio
+import json
 import sqlite3
 import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from contextlib import contextmanager
 from datetime import datetime, timezone
+import metrics
+from config import (
+    ARCHIVE_BATCH_SIZE,
+    ARCHIVE_DB_PATH,
+    INGEST_BATCH_SIZE,
+    INGEST_FLUSH_INTERVAL,
+    STORE_READ_POOL_SIZE,
+    STREAM_BATCH_SIZE,
+)
 
 logger = logging.getLogger(__name__)
 
+# Messages are keyed on their Discord ID: the same message seen twice (live
+# and by a backfill) is stored once, and a re-fetch picks up edited content.
+# Servers, channels and authors are stored once in their own tables and
+# referenced by integer keys; timestamps are epoch milliseconds (UTC).
+INSERT_MESSAGE_QUERY = """
+    INSERT INTO messages (message_id, channel_key, author_key, content, timestamp_ms)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT(message_id) DO UPDATE SET content=excluded.content
+"""
+
+MESSAGE_COLUMNS = "id, message_id, channel_key, author_key, content, timestamp_ms"
+
+# Messages older than the retention period are moved to a separate archive
+# database, attached to every connection under this name
+ARCHIVE_SCHEMA = "archive"
+# Seconds between two reads of the archive high-water mark: with several
+# processes on one database, another one may have archived meanwhile
+ARCHIVE_REFRESH_INTERVAL = 60
+# Backoff of the writer thread after a failed flush, in seconds
+FLUSH_RETRY_BASE_SECONDS = 0.5
+FLUSH_RETRY_MAX_SECONDS = 30
+# Failed flushes of a batch before its messages are written one by one
+FLUSH_MAX_ATTEMPTS = 3
+
+
+def to_ms(dt):
+    """Convert a datetime to epoch milliseconds. Naive datetimes are taken as UTC."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp() * 1000)
+
+
+def from_ms(ms):
+    """Convert epoch milliseconds to a UTC datetime."""
+    return datetime.fromtimestamp(ms / 1000, timezone.utc)
+
+
+def fts_query(text):
+    """Turn user search terms into an FTS5 query matching all of them.
+
+    Each term is quoted, so FTS5 operators and punctuation in the input are
+    searched literally instead of raising syntax errors; a trailing * keeps
+    its prefix meaning ("résum*").
+    """
+    terms = []
+    for term in text.split():
+        prefix = term.endswith("*") and len(term) > 1
+        term = term.rstrip("*")
+        if term:
+            terms.append('"' + term.replace('"', '""') + '"' + ("*" if prefix else ""))
+    return " ".join(terms)
+
+
+# ----------------------
+# Schema migrations
+# ----------------------
+# Each migration upgrades the schema by one version. The current version is
+# stored in `PRAGMA user_version`, so MIGRATIONS[n] upgrades from version n to
+# version n + 1. Append new migrations at the end, never reorder or edit them.
+def _migration_range_indexes(conn):
+    """Add composite indexes matching the range query shapes"""
+    # get_messages_in_range / get_messages_since filtered by channel_id
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_messages_server_channel_id_ts ON messages (server_id, channel_id, timestamp)"
+    )
+    # Same queries filtered by channel_name (scheduler and /resume)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_messages_server_channel_name_ts ON messages (server_id, channel_name, timestamp)"
+    )
+    # get_active_channels_in_range across all servers
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON messages (timestamp)"
+    )
+    # get_servers
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_messages_server ON messages (server_id, server_name)"
+    )
+
+
+def _migration_message_ids(conn):
+    """Store Discord message IDs and drop duplicated messages"""
+    conn.execute("ALTER TABLE messages ADD COLUMN message_id TEXT")
+    # Rows stored before message IDs existed: the same message ingested both
+    # live and by a backfill has identical channel, author, content and time
+    removed = conn.execute(
+        """
+        DELETE FROM messages WHERE id NOT IN (
+            SELECT MIN(id) FROM messages
+            GROUP BY server_id, channel_id, channel_name, author, content, timestamp
+        )
+    """
+    ).rowcount
+    logger.info("Removed %d duplicated messages", removed)
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_messages_message_id ON messages (message_id)"
+    )
+
+
+def _migration_summary_cache(conn):
+    """Add the summaries table caching generated summaries"""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS summaries (
+            cache_key TEXT PRIMARY KEY,
+            server_id TEXT,
+            channel TEXT,
+            range_start DATETIME,
+            range_end DATETIME,
+            content_hash TEXT,
+            summary TEXT,
+            created_at DATETIME,
+            last_used_at DATETIME
+        )
+    """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_summaries_last_used ON summaries (last_used_at)"
+    )
+
+
+def _migration_segment_summaries(conn):
+    """Add the segment_summaries table for rolling summaries"""
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS segment_summaries (
+            server_id TEXT,
+            channel_name TEXT,
+            segment_start DATETIME,
+            segment_end DATETIME,
+            message_count INTEGER,
+            content_hash TEXT,
+            summary TEXT,
+            created_at DATETIME,
+            PRIMARY KEY (server_id, channel_name, segment_start)
+        )
+    """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_segment_summaries_start ON segment_summaries (segment_start)"
+    )
+
+
+# ISO 8601 text (with or without offset) to epoch milliseconds, in SQL
+_ISO_TO_MS = "CAST(ROUND((julianday({0}) - 2440587.5) * 86400000) AS INTEGER)"
+
+
+def _create_normalized_messages(conn, schema, table="messages"):
+    conn.execute(
+        f"""
+        CREATE TABLE {schema}.{table} (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            message_id INTEGER UNIQUE,
+            channel_key INTEGER NOT NULL,
+            author_key INTEGER NOT NULL,
+            content TEXT,
+            timestamp_ms INTEGER NOT NULL
+        )
+    """
+    )
+
+
+def _create_fts(conn, schema):
+    """Create the full-text index of <schema>.messages and fill it.
+
+    messages_fts is an external content FTS5 table: it stores only the index
+    and reads the text back from messages, and triggers keep it in sync with
+    every insert, content update and delete (including archiving).
+    """
+    conn.execute(
+        f"""
+        CREATE VIRTUAL TABLE {schema}.messages_fts USING fts5(
+            content,
+            content='messages',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER {schema}.messages_fts_insert AFTER INSERT ON messages BEGIN
+            INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+        END
+    """
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER {schema}.messages_fts_delete AFTER DELETE ON messages BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        END
+    """
+    )
+    conn.execute(
+        f"""
+        CREATE TRIGGER {schema}.messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+        END
+    """
+    )
+    conn.execute(f"INSERT INTO {schema}.messages_fts (messages_fts) VALUES ('rebuild')")
+
+
+def _copy_to_normalized(conn, schema):
+    """Copy <schema>.messages (text layout) into <schema>.messages_normalized."""
+    timestamp_ms = _ISO_TO_MS.format("m.timestamp")
+    # Rows with a channel ID reference the channel by its Discord ID, older
+    # rows by server and channel name
+    conn.execute(
+        f"""
+        INSERT INTO {schema}.messages_normalized (id, message_id, channel_key, author_key, content, timestamp_ms)
+        SELECT m.id, CAST(m.message_id AS INTEGER), c.id, a.id, m.content, COALESCE({timestamp_ms}, 0)
+        FROM {schema}.messages m
+        JOIN main.channels c ON c.discord_id = CAST(m.channel_id AS INTEGER)
+        JOIN main.authors a ON a.name = m.author
+        WHERE m.channel_id IS NOT NULL
+    """
+    )
+    conn.execute(
+        f"""
+        INSERT INTO {schema}.messages_normalized (id, message_id, channel_key, author_key, content, timestamp_ms)
+        SELECT m.id, CAST(m.message_id AS INTEGER), c.id, a.id, m.content, COALESCE({timestamp_ms}, 0)
+        FROM {schema}.messages m
+        LEFT JOIN main.servers s ON s.discord_id = CAST(m.server_id AS INTEGER)
+        JOIN main.channels c ON c.discord_id IS NULL AND c.name IS m.channel_name AND c.server_key IS s.id
+        JOIN main.authors a ON a.name = m.author
+        WHERE m.channel_id IS NULL
+    """
+    )
+    conn.execute(f"DROP TABLE {schema}.messages")
+    conn.execute(f"ALTER TABLE {schema}.messages_normalized RENAME TO messages")
+
+
+def _migration_normalized_schema(conn):
+    """Move servers, channels and authors to dimension tables and store epoch ms timestamps"""
+    conn.execute(
+        """
+        CREATE TABLE servers (
+            id INTEGER PRIMARY KEY,
+            discord_id INTEGER UNIQUE,
+            name TEXT
+        )
+    """
+    )
+    # channel_meta (categories, fetch position) is folded into channels
+    conn.execute(
+        """
+        CREATE TABLE channels (
+            id INTEGER PRIMARY KEY,
+            server_key INTEGER REFERENCES servers (id),
+            discord_id INTEGER UNIQUE,
+            name TEXT,
+            category_id INTEGER,
+            category_name TEXT,
+            last_fetched_ms INTEGER
+        )
+    """
+    )
+    conn.execute("CREATE INDEX idx_channels_server_name ON channels (server_key, name)")
+    conn.execute("CREATE INDEX idx_channels_name ON channels (name)")
+    conn.execute("CREATE TABLE authors (id INTEGER PRIMARY KEY, name TEXT UNIQUE)")
+
+    # Archived messages (see archive_messages) are converted along with the
+    # main table and share its dimensions
+    sources = ["main.messages"]
+    archive_columns = [
+        row[1] for row in conn.execute(f"PRAGMA {ARCHIVE_SCHEMA}.table_info(messages)")
+    ]
+    if "server_id" in archive_columns:
+        sources.append(f"{ARCHIVE_SCHEMA}.messages")
+    all_messages = " UNION ALL ".join(
+        f"SELECT server_id, server_name, channel_id, channel_name, author, timestamp FROM {source}"
+        for source in sources
+    )
+
+    # Names are taken from the most recent message
+    conn.execute(
+        f"""
+        INSERT INTO servers (discord_id, name)
+        SELECT discord_id, name FROM (
+            SELECT CAST(server_id AS INTEGER) AS discord_id, server_name AS name, MAX(timestamp)
+            FROM ({all_messages}) WHERE server_id IS NOT NULL GROUP BY server_id
+        )
+    """
+    )
+    conn.execute(
+        """
+        INSERT OR IGNORE INTO servers (discord_id, name)
+        SELECT CAST(server_id AS INTEGER), server_name FROM channel_meta WHERE server_id IS NOT NULL
+    """
+    )
+    conn.execute(
+        f"""
+        INSERT INTO channels (server_key, discord_id, name)
+        SELECT s.id, c.discord_id, c.name FROM (
+            SELECT CAST(channel_id AS INTEGER) AS discord_id, server_id, channel_name AS name, MAX(timestamp)
+            FROM ({all_messages}) WHERE channel_id IS NOT NULL GROUP BY channel_id
+        ) c
+        LEFT JOIN servers s ON s.discord_id = CAST(c.server_id AS INTEGER)
+    """
+    )
+    conn.execute(
+        f"""
+        INSERT INTO channels (server_key, discord_id, name)
+        SELECT DISTINCT s.id, NULL, m.channel_name
+        FROM ({all_messages}) m
+        LEFT JOIN servers s ON s.discord_id = CAST(m.server_id AS INTEGER)
+        WHERE m.channel_id IS NULL
+    """
+    )
+    conn.execute(
+        """
+        INSERT INTO channels (server_key, discord_id, name, category_id, category_name, last_fetched_ms)
+        SELECT s.id, CAST(cm.channel_id AS INTEGER), cm.channel_name,
+               CAST(cm.category_id AS INTEGER), cm.category_name, {0}
+        FROM channel_meta cm
+        LEFT JOIN servers s ON s.discord_id = CAST(cm.server_id AS INTEGER)
+        WHERE cm.channel_id IS NOT NULL
+        ON CONFLICT (discord_id) DO UPDATE SET
+            category_id = excluded.category_id,
+            category_name = excluded.category_name,
+            last_fetched_ms = excluded.last_fetched_ms
+    """.format(_ISO_TO_MS.format("cm.last_fetched"))
+    )
+    conn.execute(
+        f"INSERT INTO authors (name) SELECT DISTINCT author FROM ({all_messages}) WHERE author IS NOT NULL"
+    )
+
+    for source in sources:
+        schema = source.split(".")[0]
+        _create_normalized_messages(conn, schema, "messages_normalized")
+        _copy_to_normalized(conn, schema)
+    conn.execute("DROP TABLE channel_meta")
+
+    conn.execute("CREATE INDEX idx_messages_channel_ts ON messages (channel_key, timestamp_ms)")
+    conn.execute("CREATE INDEX idx_messages_ts ON messages (timestamp_ms)")
+    logger.info(
+        "Normalized %d messages, %d channels, %d authors",
+        conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0],
+        conn.execute("SELECT COUNT(*) FROM channels").fetchone()[0],
+        conn.execute("SELECT COUNT(*) FROM authors").fetchone()[0],
+    )
+
+
+def _migration_daily_reports(conn):
+    """Add the daily_reports table recording the reports already sent"""
+    conn.execute(
+        """
+        CREATE TABLE daily_reports (
+            server_id INTEGER,
+            report_date TEXT,
+            sent_at_ms INTEGER,
+            PRIMARY KEY (server_id, report_date)
+        )
+    """
+    )
+
+
+def _migration_job_leases(conn):
+    """Add job leases and daily report claims for multi-process deployments"""
+    conn.execute(
+        """
+        CREATE TABLE job_leases (
+            job TEXT PRIMARY KEY,
+            owner TEXT,
+            expires_at_ms INTEGER
+        )
+    """
+    )
+    conn.execute("ALTER TABLE daily_reports ADD COLUMN claimed_by TEXT")
+    conn.execute("ALTER TABLE daily_reports ADD COLUMN claimed_at_ms INTEGER")
+
+
+def _migration_summary_channel_overrides(conn):
+    """Add per-server summary channel overrides"""
+    conn.execute(
+        """
+        CREATE TABLE summary_channel_overrides (
+            server_id INTEGER PRIMARY KEY,
+            channel_id INTEGER NOT NULL
+        )
+    """
+    )
+
+
+def _migration_full_text_search(conn):
+    """Add a full-text index over message contents"""
+    _create_fts(conn, "main")
+
+
+def _migration_summary_jobs(conn):
+    """Add the durable queue of summary jobs run by worker processes"""
+    conn.execute(
+        """
+        CREATE TABLE summary_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            dedupe_key TEXT UNIQUE,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            claimed_by TEXT,
+            heartbeat_ms INTEGER,
+            result TEXT,
+            error TEXT,
+            created_at_ms INTEGER NOT NULL,
+            finished_at_ms INTEGER
+        )
+    """
+    )
+    conn.execute("CREATE INDEX idx_summary_jobs_status ON summary_jobs (status, id)")
+
+
+MIGRATIONS = [
+    _migration_range_indexes,
+    _migration_message_ids,
+    _migration_summary_cache,
+    _migration_segment_summaries,
+    _migration_normalized_schema,
+    _migration_daily_reports,
+    _migration_job_leases,
+    _migration_summary_channel_overrides,
+    _migration_full_text_search,
+    _migration_summary_jobs,
+]
+
 
 class MessageStore:
-    def __init__(self, db_path="messages.db"):
-        self.conn = sqlite3.connect(db_path)
-        self._create_tables()
-        logger.debug("Database initialized at %s", db_path)
+    """SQLite message store shared by the bot and the scheduler.
+
+    The database runs in WAL mode so readers never block the writer:
+    - every write goes through a single writer thread, which batches queued
+      messages and writes them with executemany (write-behind ingestion);
+    - reads check out one of `read_pool_size` connections, so several queries
+      can run at the same time from different threads.
+
+    All methods are blocking and thread-safe. Coroutines should use the
+    AsyncMessageStore facade instead of calling them directly.
+    """
+
+    def __init__(
+        self,
+        db_path="messages.db",
+        batch_size=INGEST_BATCH_SIZE,
+        flush_interval=INGEST_FLUSH_INTERVAL,
+        read_pool_size=STORE_READ_POOL_SIZE,
+        archive_path=ARCHIVE_DB_PATH,
+    ):
+        self.db_path = db_path
+        # Defaults to "<name>_archive.db" next to the main database
+        self.archive_path = archive_path or "%s_archive%s" % os.path.splitext(db_path)
+
+        # The writer connection is only used by the writer thread once started.
+        # Its transactions take the write lock up front (BEGIN IMMEDIATE), so
+        # with several processes on one database a writer waits for the lock
+        # (busy_timeout) instead of failing when upgrading a read transaction.
+        self._write_conn = self._connect()
+        self._write_conn.isolation_level = "IMMEDIATE"
+        # Takes effect on a new database only, and must come before the WAL
+        # switch; an existing one is converted by an explicit full VACUUM
+        # (see enable_incremental_vacuum)
+        self._write_conn.execute("PRAGMA main.auto_vacuum = INCREMENTAL")
+        self._write_conn.execute("PRAGMA journal_mode=WAL")
+        self._write_conn.execute(f"PRAGMA {ARCHIVE_SCHEMA}.journal_mode=WAL")
+        self._write_conn.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+        self._create_archive_tables()
+
+        # Reads starting before this timestamp also query the archive
+        self._archived_until = self._write_conn.execute(
+            f"SELECT MAX(timestamp_ms) FROM {ARCHIVE_SCHEMA}.messages"
+        ).fetchone()[0]
+        self._archived_checked = time.monotonic()
+
+        self._readers = queue.Queue()
+        for _ in range(read_pool_size):
+            self._readers.put(self._connect())
+
+        # Write-behind ingestion queue: messages are buffered and written in
+        # batches once `batch_size` is reached or `flush_interval` has elapsed.
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._writes = queue.Queue()
+        # Dimension keys already resolved, only used by the writer thread
+        self._server_keys = {}
+        self._channel_keys = {}
+        self._author_keys = {}
+        self._stats_lock = threading.Lock()
+        self._queued = 0
+        self.flush_count = 0
+        self.flushed_messages = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        # Consecutive failed flushes, backing off the next attempt
+        self._flush_failures = 0
+
+        self._writer = threading.Thread(
+            target=self._writer_loop, name="MessageStore-writer", daemon=True
+        )
+        self._writer.start()
+
+        logger.debug(
+            "Database initialized at %s (WAL, %d readers)", db_path, read_pool_size
+        )
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA busy_timeout = 30000")
+        conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (self.archive_path,))
+        return conn
 
     def _create_tables(self):
-        self.conn.execute(
+        """Create the version 0 schema, which MIGRATIONS then upgrade."""
+        self._write_conn.execute(
             """
             CREATE TABLE IF NOT EXISTS messages (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -26,7 +548,7 @@ class MessageStore:
             )
         """
         )
-        self.conn.execute(
+        self._write_conn.execute(
             """
             CREATE TABLE IF NOT EXISTS channel_meta (
                 server_id TEXT,
@@ -40,7 +562,385 @@ class MessageStore:
             )
         """
         )
-        self.conn.commit()
+        self._write_conn.commit()
+
+    def _create_archive_tables(self):
+        # Same layout as messages; the original row id is kept so that moving
+        # a batch twice (after a crash between the two databases) is harmless
+        conn = self._write_conn
+        exists = conn.execute(
+            f"SELECT 1 FROM {ARCHIVE_SCHEMA}.sqlite_master WHERE type = 'table' AND name = 'messages'"
+        ).fetchone()
+        if not exists:
+            _create_normalized_messages(conn, ARCHIVE_SCHEMA)
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_archive_channel_ts ON messages (channel_key, timestamp_ms)"
+        )
+        conn.execute(
+            f"CREATE INDEX IF NOT EXISTS {ARCHIVE_SCHEMA}.idx_archive_ts ON messages (timestamp_ms)"
+        )
+        has_fts = conn.execute(
+            f"SELECT 1 FROM {ARCHIVE_SCHEMA}.sqlite_master WHERE type = 'table' AND name = 'messages_fts'"
+        ).fetchone()
+        if not has_fts:
+            _create_fts(conn, ARCHIVE_SCHEMA)
+        conn.commit()
+
+    def _migrate(self):
+        """Upgrade the schema in place to the latest version."""
+        conn = self._write_conn
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version == 0:
+            self._create_tables()
+        if version > len(MIGRATIONS):
+            raise RuntimeError(
+                f"Database schema version {version} is newer than this code supports ({len(MIGRATIONS)})"
+            )
+
+        while True:
+            conn.execute("BEGIN IMMEDIATE")
+            # Read again under the write lock: another process sharing the
+            # database may have run this migration in the meantime
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= len(MIGRATIONS):
+                conn.commit()
+                break
+            target = version + 1
+            migration = MIGRATIONS[version]
+            logger.info(
+                "Migrating database schema to version %d: %s",
+                target,
+                migration.__doc__,
+            )
+            try:
+                migration(conn)
+                conn.execute(f"PRAGMA user_version = {target}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                logger.exception("Database migration to version %d failed", target)
+                raise
+
+    # ----------------------
+    # Writer thread
+    # ----------------------
+    def _writer_loop(self):
+        """Own the write connection: batch queued messages and run write calls.
+
+        The thread must outlive any error, or every later write would wait
+        forever: an unexpected one fails the request being handled and the
+        loop goes on.
+        """
+        pending = []
+        deadline = None
+        while True:
+            timeout = None if not pending else max(0.0, deadline - time.monotonic())
+            try:
+                kind, payload, future = self._writes.get(timeout=timeout)
+            except queue.Empty:
+                # Time threshold reached
+                pending = self._write_batch(pending)
+                deadline = time.monotonic() + self.flush_interval
+                continue
+
+            if kind == "message":
+                if not pending:
+                    deadline = time.monotonic() + self.flush_interval
+                pending.append(payload)
+                if len(pending) >= self.batch_size:
+                    pending = self._write_batch(pending)
+                continue
+
+            try:
+                # Any other request is ordered after the messages queued before it
+                written = len(pending)
+                pending = self._write_batch(pending)
+                if kind == "stop":
+                    future.set_result(written)
+                    return
+                if kind == "flush":
+                    future.set_result(written)
+                    continue
+                try:
+                    result = payload(self._write_conn)
+                    self._write_conn.commit()
+                except BaseException as e:
+                    self._write_conn.rollback()
+                    self._forget_keys()
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+            except Exception as e:
+                logger.exception("Unexpected error in the writer thread")
+                if not future.done():
+                    future.set_exception(e)
+            if pending:
+                deadline = time.monotonic() + self.flush_interval
+
+    def _write_batch(self, batch):
+        """Write a batch of messages in one transaction.
+
+        Returns:
+            The messages left to write: empty on success, the batch on failure
+            so that it is retried on the next flush. After a failure the
+            writer sleeps with exponential backoff, so a database that stays
+            locked or full doesn't make it spin.
+
+        A batch failing for another reason than the database itself (a
+        malformed message), or FLUSH_MAX_ATTEMPTS times in a row, is written
+        one message at a time, dropping the messages that can't be stored, so
+        one bad message doesn't block ingestion.
+        """
+        if not batch:
+            return batch
+
+        started = time.perf_counter()
+        try:
+            self._insert_messages(self._write_conn, batch)
+            self._write_conn.commit()
+        except Exception as e:
+            self._write_conn.rollback()
+            self._forget_keys()
+            metrics.ingest_flush_failures.inc()
+            self._flush_failures += 1
+            if isinstance(e, sqlite3.OperationalError) and self._flush_failures < FLUSH_MAX_ATTEMPTS:
+                # Locked, busy or full database: retry the whole batch later
+                logger.exception(
+                    "Failed to flush %d pending messages (%d in a row)", len(batch), self._flush_failures
+                )
+                self._back_off()
+                return batch
+            logger.exception("Failed to flush %d pending messages, writing them one by one", len(batch))
+            batch = self._write_one_by_one(batch)
+            if batch:
+                self._back_off()
+            else:
+                self._flush_failures = 0
+            return batch
+
+        self._flush_failures = 0
+        self._record_flush(len(batch), time.perf_counter() - started)
+        return []
+
+    def _write_one_by_one(self, batch):
+        """Write messages in separate transactions, dropping those that can't be stored.
+
+        Returns:
+            The messages left to write if the database itself failed
+        """
+        for index, message in enumerate(batch):
+            started = time.perf_counter()
+            try:
+                self._insert_messages(self._write_conn, [message])
+                self._write_conn.commit()
+            except sqlite3.OperationalError:
+                self._write_conn.rollback()
+                self._forget_keys()
+                return batch[index:]
+            except Exception:
+                self._write_conn.rollback()
+                self._forget_keys()
+                metrics.ingest_dropped.inc()
+                logger.exception("Dropping a message that can't be stored: %r", message)
+                with self._stats_lock:
+                    self._queued -= 1
+                continue
+            self._record_flush(1, time.perf_counter() - started)
+        return []
+
+    def _back_off(self):
+        """Sleep after a failed flush, longer after each consecutive failure."""
+        delay = min(FLUSH_RETRY_MAX_SECONDS, FLUSH_RETRY_BASE_SECONDS * 2 ** (self._flush_failures - 1))
+        logger.warning("Retrying the flush in %.1fs", delay)
+        time.sleep(delay)
+
+    def _record_flush(self, count, latency):
+        metrics.messages_ingested.inc(count)
+        metrics.ingest_flush_seconds.observe(latency)
+        with self._stats_lock:
+            self._queued -= count
+            self.flush_count += 1
+            self.flushed_messages += count
+            self.last_flush_latency = latency
+            self.max_flush_latency = max(self.max_flush_latency, latency)
+        logger.debug(
+            "Flushed %d messages in %.1f ms (%d still pending)",
+            count,
+            latency * 1000,
+            self._queued,
+        )
+
+    def _insert_messages(self, conn, batch):
+        """Insert queued message tuples (see add_message), resolving their dimension keys."""
+        rows = []
+        for message_id, server_id, server_name, channel_id, channel_name, author, content, timestamp_ms in batch:
+            server_key = self._server_key(conn, server_id, server_name)
+            channel_key = self._channel_key(conn, server_key, channel_id, channel_name)
+            rows.append(
+                (message_id, channel_key, self._author_key(conn, author), content, timestamp_ms)
+            )
+        # A message re-ingested after it was archived (backfill, edit of an
+        # old message) updates the archived row instead of coming back to main
+        message_ids = [row[0] for row in rows if row[0] is not None]
+        if message_ids:
+            archived = {
+                message_id
+                for (message_id,) in conn.execute(
+                    f"SELECT message_id FROM {ARCHIVE_SCHEMA}.messages WHERE message_id IN (SELECT value FROM json_each(?))",
+                    (json.dumps(message_ids),),
+                )
+            }
+            if archived:
+                conn.executemany(
+                    f"UPDATE {ARCHIVE_SCHEMA}.messages SET content = ? WHERE message_id = ?",
+                    [(row[3], row[0]) for row in rows if row[0] in archived],
+                )
+                rows = [row for row in rows if row[0] not in archived]
+        conn.executemany(INSERT_MESSAGE_QUERY, rows)
+
+    def _server_key(self, conn, discord_id, name):
+        if discord_id is None:
+            return None
+        cached = self._server_keys.get(discord_id)
+        if cached and (name is None or cached[1] == name):
+            return cached[0]
+        if name is None:
+            row = conn.execute(
+                "INSERT INTO servers (discord_id) VALUES (?) ON CONFLICT (discord_id) DO UPDATE SET discord_id = discord_id RETURNING id, name",
+                (discord_id,),
+            ).fetchone()
+        else:
+            # New server, or renamed since it was last seen
+            row = conn.execute(
+                "INSERT INTO servers (discord_id, name) VALUES (?, ?) ON CONFLICT (discord_id) DO UPDATE SET name = excluded.name RETURNING id, name",
+                (discord_id, name),
+            ).fetchone()
+        self._server_keys[discord_id] = row
+        return row[0]
+
+    def _channel_key(self, conn, server_key, discord_id, name):
+        if discord_id is None:
+            # Messages stored before channel IDs: the channel is known by name
+            cache_key = (server_key, name)
+            key = self._channel_keys.get(cache_key)
+            if key is None:
+                row = conn.execute(
+                    "SELECT id FROM channels WHERE server_key IS ? AND name IS ? AND discord_id IS NULL",
+                    cache_key,
+                ).fetchone()
+                key = row[0] if row else conn.execute(
+                    "INSERT INTO channels (server_key, name) VALUES (?, ?)", cache_key
+                ).lastrowid
+                self._channel_keys[cache_key] = key
+            return key
+
+        cached = self._channel_keys.get(discord_id)
+        if cached and (name is None or cached[1] == name):
+            return cached[0]
+        if name is None:
+            row = conn.execute(
+                "INSERT INTO channels (server_key, discord_id) VALUES (?, ?) ON CONFLICT (discord_id) DO UPDATE SET discord_id = discord_id RETURNING id, name",
+                (server_key, discord_id),
+            ).fetchone()
+        else:
+            row = conn.execute(
+                "INSERT INTO channels (server_key, discord_id, name) VALUES (?, ?, ?) ON CONFLICT (discord_id) DO UPDATE SET name = excluded.name RETURNING id, name",
+                (server_key, discord_id, name),
+            ).fetchone()
+        self._channel_keys[discord_id] = row
+        return row[0]
+
+    def _author_key(self, conn, name):
+        key = self._author_keys.get(name)
+        if key is None:
+            key = conn.execute(
+                "INSERT INTO authors (name) VALUES (?) ON CONFLICT (name) DO UPDATE SET name = name RETURNING id",
+                (name,),
+            ).fetchone()[0]
+            self._author_keys[name] = key
+        return key
+
+    def _forget_keys(self):
+        """Drop cached keys, which may point to rows of a rolled back transaction."""
+        self._server_keys.clear()
+        self._channel_keys.clear()
+        self._author_keys.clear()
+
+    def _submit(self, kind, payload=None):
+        future = Future()
+        self._writes.put((kind, payload, future))
+        return future
+
+    def _write(self, fn):
+        """Run `fn(conn)` on the writer thread and return its result."""
+        return self._submit("call", fn).result()
+
+    def _messages_source(self, start_datetime):
+        """Return the table expression to read messages from `start_datetime` on.
+
+        Ranges starting after everything archived read the main table alone;
+        older ones read the main table and the archive together.
+        """
+        if not self._reads_archive(start_datetime):
+            return "messages"
+        return (
+            f"(SELECT {MESSAGE_COLUMNS} FROM main.messages "
+            f"UNION ALL SELECT {MESSAGE_COLUMNS} FROM {ARCHIVE_SCHEMA}.messages)"
+        )
+
+    def _reads_archive(self, start_datetime):
+        """Return True if messages from `start_datetime` on may be archived."""
+        if time.monotonic() - self._archived_checked > ARCHIVE_REFRESH_INTERVAL:
+            self._archived_checked = time.monotonic()
+            with self._reader() as conn:
+                latest = conn.execute(
+                    f"SELECT MAX(timestamp_ms) FROM {ARCHIVE_SCHEMA}.messages"
+                ).fetchone()[0]
+            if latest is not None:
+                self._archived_until = max(self._archived_until or 0, latest)
+        archived_until = self._archived_until
+        return archived_until is not None and to_ms(start_datetime) <= archived_until
+
+    @staticmethod
+    def _message_conditions(
+        start_datetime, end_datetime=None, channel_name=None, server_id=None, channel_id=None
+    ):
+        """Build the WHERE conditions and parameters selecting messages `m`.
+
+        Channel and server filters are resolved to channel keys first, so the
+        (channel_key, timestamp_ms) index serves the time range.
+        """
+        conditions = ["m.timestamp_ms >= ?"]
+        params = [to_ms(start_datetime)]
+        if end_datetime:
+            conditions.append("m.timestamp_ms < ?")
+            params.append(to_ms(end_datetime))
+
+        channel_conditions = []
+        # Prefer channel_id over channel_name for precision
+        if channel_id:
+            channel_conditions.append("discord_id = ?")
+            params.append(int(channel_id))
+        elif channel_name:
+            channel_conditions.append("name = ?")
+            params.append(channel_name)
+        if server_id:
+            channel_conditions.append("server_key IN (SELECT id FROM servers WHERE discord_id = ?)")
+            params.append(int(server_id))
+        if channel_conditions:
+            conditions.append(
+                f"m.channel_key IN (SELECT id FROM channels WHERE {' AND '.join(channel_conditions)})"
+            )
+        return conditions, params
+
+    @contextmanager
+    def _reader(self):
+        """Check out a read connection from the pool."""
+        conn = self._readers.get()
+        try:
+            yield conn
+        finally:
+            self._readers.put(conn)
 
     def add_message(
         self,
@@ -51,25 +951,165 @@ class MessageStore:
         server_id=None,
         server_name=None,
         channel_id=None,
+        message_id=None,
     ):
+        """Queue a message for insertion. Never blocks.
+
+        The message is written on the next flush, which happens as soon as
+        `batch_size` messages are pending or `flush_interval` seconds after the
+        first of them was queued. A message whose `message_id` is already stored
+        only has its content updated.
+        """
         timestamp = timestamp or datetime.now(timezone.utc)
-        query = "INSERT INTO messages (server_id, server_name, channel_id, channel_name, author, content, timestamp) VALUES (?, ?, ?, ?, ?, ?, ?)"
         params = (
-            str(server_id) if server_id else None,
+            int(message_id) if message_id else None,
+            int(server_id) if server_id else None,
             str(server_name) if server_name else None,
-            str(channel_id) if channel_id else None,
+            int(channel_id) if channel_id else None,
             str(channel_name),
             str(author),
             content,
-            timestamp.isoformat(),
+            to_ms(timestamp),
         )
 
-        logger.debug("Executing query: %s | params=%s", query, params)
-        self.conn.execute(query, params)
-        self.conn.commit()
+        with self._stats_lock:
+            self._queued += 1
+        self._submit("message", params)
+
+    @property
+    def queue_depth(self):
+        """Number of messages waiting to be written."""
+        return self._queued
+
+    def flush(self):
+        """Write all pending messages and wait until they are committed.
+
+        Returns:
+            Number of messages written
+        """
+        return self._submit("flush").result()
+
+    def ingestion_stats(self):
+        """Return a snapshot of the write-behind queue state."""
+        with self._stats_lock:
+            return {
+                "queue_depth": self._queued,
+                "flush_count": self.flush_count,
+                "flushed_messages": self.flushed_messages,
+                "last_flush_latency": self.last_flush_latency,
+                "max_flush_latency": self.max_flush_latency,
+            }
+
+    def close(self):
+        """Flush pending messages, stop the writer and close all connections."""
+        if self._writer.is_alive():
+            self._submit("stop").result()
+            self._writer.join()
+        self._write_conn.close()
+        while not self._readers.empty():
+            self._readers.get().close()
+
+    # ----------------------
+    # Retention
+    # ----------------------
+    def archive_messages(self, before, batch_size=ARCHIVE_BATCH_SIZE):
+        """Move messages older than `before` from the main table to the archive.
+
+        Messages are moved in transactions of `batch_size` rows, so live
+        ingestion keeps flushing between batches. Archived messages remain
+        readable: queries for ranges starting before the archive boundary read
+        both databases.
+
+        Returns:
+            Number of messages moved
+        """
+        cutoff = to_ms(before)
+
+        def move_batch(conn):
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS archive_batch (id INTEGER PRIMARY KEY)")
+            conn.execute("DELETE FROM temp.archive_batch")
+            conn.execute(
+                "INSERT INTO temp.archive_batch SELECT id FROM main.messages WHERE timestamp_ms < ? ORDER BY timestamp_ms LIMIT ?",
+                (cutoff, batch_size),
+            )
+            conn.execute(
+                f"""
+                INSERT OR IGNORE INTO {ARCHIVE_SCHEMA}.messages ({MESSAGE_COLUMNS})
+                SELECT {MESSAGE_COLUMNS} FROM main.messages
+                WHERE id IN (SELECT id FROM temp.archive_batch)
+            """
+            )
+            return conn.execute(
+                "DELETE FROM main.messages WHERE id IN (SELECT id FROM temp.archive_batch)"
+            ).rowcount
+
+        moved = 0
+        while True:
+            count = self._write(move_batch)
+            if count:
+                # Every row before the cutoff may now be in the archive
+                self._archived_until = max(self._archived_until or 0, cutoff)
+            moved += count
+            if count < batch_size:
+                break
+
+        logger.info("Archived %d messages older than %s", moved, before)
+        return moved
+
+    def incremental_vacuum_enabled(self):
+        """Return True if the main database uses incremental auto-vacuum."""
+        with self._reader() as conn:
+            return conn.execute("PRAGMA main.auto_vacuum").fetchone()[0] == 2
+
+    def enable_incremental_vacuum(self):
+        """Switch the main database to incremental auto-vacuum.
+
+        Changing the mode of an existing database takes a full VACUUM, which
+        rewrites the whole file once and holds the writer thread meanwhile,
+        so it is a one-off step run while the bot is stopped
+        (python retention.py --enable-incremental-vacuum); later calls do
+        nothing.
+
+        Returns:
+            True if the database had to be converted
+        """
+
+        def enable(conn):
+            if conn.execute("PRAGMA main.auto_vacuum").fetchone()[0] == 2:
+                return False
+            logger.warning("Converting %s to incremental auto-vacuum (full VACUUM)", self.db_path)
+            conn.commit()
+            conn.execute("PRAGMA main.auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM main")
+            return True
+
+        return self._write(enable)
+
+    def incremental_vacuum(self, max_pages):
+        """Release up to `max_pages` free pages and truncate the WAL.
+
+        Returns:
+            Number of pages released
+        """
+
+        def vacuum(conn):
+            before = conn.execute("PRAGMA main.freelist_count").fetchone()[0]
+            conn.execute(f"PRAGMA main.incremental_vacuum({int(max_pages)})").fetchall()
+            conn.commit()
+            conn.execute("PRAGMA main.wal_checkpoint(TRUNCATE)").fetchall()
+            return before - conn.execute("PRAGMA main.freelist_count").fetchone()[0]
+
+        released = self._write(vacuum)
+        logger.info("Incremental vacuum released %d pages", released)
+        return released
 
     def get_messages_since(
-        self, since_datetime, channel_name=None, server_id=None, channel_id=None
+        self,
+        since_datetime,
+        channel_name=None,
+        server_id=None,
+        channel_id=None,
+        with_timestamps=False,
     ):
         """Return a list of tuples (author, content) for messages since `since_datetime`.
 
@@ -78,27 +1118,21 @@ class MessageStore:
             channel_name: Optional channel name to filter by. If None, returns all channels.
             server_id: Optional server ID to filter by. If None, returns all servers.
             channel_id: Optional channel ID to filter by (more precise than channel_name).
+            with_timestamps: Return (timestamp_ms, author, content) tuples instead.
+        """
+        conditions, params = self._message_conditions(
+            since_datetime, None, channel_name, server_id, channel_id
+        )
+        columns = "m.timestamp_ms, a.name, m.content" if with_timestamps else "a.name, m.content"
+        query = f"""
+            SELECT {columns} FROM {self._messages_source(since_datetime)} m
+            JOIN authors a ON a.id = m.author_key
+            WHERE {' AND '.join(conditions)} ORDER BY m.timestamp_ms ASC
         """
-        conditions = ["timestamp >= ?"]
-        params = [since_datetime.isoformat()]
-
-        # Prefer channel_id over channel_name for precision
-        if channel_id:
-            conditions.append("channel_id = ?")
-            params.append(str(channel_id))
-        elif channel_name:
-            conditions.append("channel_name = ?")
-            params.append(channel_name)
-
-        if server_id:
-            conditions.append("server_id = ?")
-            params.append(str(server_id))
-
-        query = f"SELECT author, content FROM messages WHERE {' AND '.join(conditions)} ORDER BY timestamp ASC"
 
         logger.debug("Executing query: %s | params=%s", query, params)
-        cursor = self.conn.execute(query, params)
-        results = cursor.fetchall()
+        with self._reader() as conn:
+            results = conn.execute(query, params).fetchall()
 
         filter_desc = []
         if channel_id:
@@ -131,6 +1165,7 @@ class MessageStore:
         channel_name=None,
         server_id=None,
         channel_id=None,
+        with_timestamps=False,
     ):
         """Return a list of tuples (author, content) for messages in date range.
 
@@ -140,27 +1175,21 @@ class MessageStore:
             channel_name: Optional channel name to filter by. If None, returns all channels.
             server_id: Optional server ID to filter by. If None, returns all servers.
             channel_id: Optional channel ID to filter by (more precise than channel_name).
+            with_timestamps: Return (timestamp_ms, author, content) tuples instead.
+        """
+        conditions, params = self._message_conditions(
+            start_datetime, end_datetime, channel_name, server_id, channel_id
+        )
+        columns = "m.timestamp_ms, a.name, m.content" if with_timestamps else "a.name, m.content"
+        query = f"""
+            SELECT {columns} FROM {self._messages_source(start_datetime)} m
+            JOIN authors a ON a.id = m.author_key
+            WHERE {' AND '.join(conditions)} ORDER BY m.timestamp_ms ASC
         """
-        conditions = ["timestamp >= ?", "timestamp < ?"]
-        params = [start_datetime.isoformat(), end_datetime.isoformat()]
-
-        # Prefer channel_id over channel_name for precision
-        if channel_id:
-            conditions.append("channel_id = ?")
-            params.append(str(channel_id))
-        elif channel_name:
-            conditions.append("channel_name = ?")
-            params.append(channel_name)
-
-        if server_id:
-            conditions.append("server_id = ?")
-            params.append(str(server_id))
-
-        query = f"SELECT author, content FROM messages WHERE {' AND '.join(conditions)} ORDER BY timestamp ASC"
 
         logger.debug("Executing query: %s | params=%s", query, params)
-        cursor = self.conn.execute(query, params)
-        results = cursor.fetchall()
+        with self._reader() as conn:
+            results = conn.execute(query, params).fetchall()
 
         filter_desc = []
         if channel_id:
@@ -189,21 +1218,26 @@ class MessageStore:
         return results
 
     def get_last_fetched(self, channel_id, server_id, channel_name=None):
-        # Try channel_id first (most precise)
-        row = self.conn.execute(
-            "SELECT last_fetched FROM channel_meta WHERE channel_id = ? AND server_id = ?",
-            (str(channel_id), str(server_id)),
-        ).fetchone()
-
-        # Fallback to channel_name if channel_id not found (for backward compatibility)
-        if not row and channel_name:
-            row = self.conn.execute(
-                "SELECT last_fetched FROM channel_meta WHERE channel_name = ? AND server_id = ?",
-                (channel_name, str(server_id)),
+        with self._reader() as conn:
+            # Try channel_id first (most precise)
+            row = conn.execute(
+                "SELECT last_fetched_ms FROM channels WHERE discord_id = ?",
+                (int(channel_id),),
             ).fetchone()
 
+            # Fallback to channel_name if channel_id not found (for backward compatibility)
+            if not row and channel_name:
+                row = conn.execute(
+                    """
+                    SELECT MAX(c.last_fetched_ms) FROM channels c
+                    JOIN servers s ON s.id = c.server_key
+                    WHERE c.name = ? AND s.discord_id = ?
+                """,
+                    (channel_name, int(server_id)),
+                ).fetchone()
+
         if row and row[0]:
-            return datetime.fromisoformat(row[0])
+            return from_ms(row[0])
         return None
 
     def update_last_fetched(
@@ -216,28 +1250,66 @@ class MessageStore:
         category_id=None,
         category_name=None,
     ):
-        self.conn.execute(
-            """
-            INSERT INTO channel_meta(server_id, server_name, channel_id, channel_name, category_id, category_name, last_fetched)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(server_id, channel_id) DO UPDATE SET 
-                last_fetched=excluded.last_fetched,
-                server_name=excluded.server_name,
-                channel_name=excluded.channel_name,
-                category_id=excluded.category_id,
-                category_name=excluded.category_name
-        """,
-            (
-                str(server_id),
-                str(server_name) if server_name else None,
-                str(channel_id),
+        # Runs on the writer thread after every message queued before it, so
+        # the fetch position is never recorded ahead of the messages written
+        def update(conn):
+            server_key = self._server_key(
+                conn, int(server_id), str(server_name) if server_name else None
+            )
+            channel_key = self._channel_key(
+                conn,
+                server_key,
+                int(channel_id),
                 str(channel_name) if channel_name else None,
-                str(category_id) if category_id else None,
-                str(category_name) if category_name else None,
-                timestamp.isoformat(),
-            ),
-        )
-        self.conn.commit()
+            )
+            conn.execute(
+                "UPDATE channels SET category_id = ?, category_name = ?, last_fetched_ms = ? WHERE id = ?",
+                (
+                    int(category_id) if category_id else None,
+                    str(category_name) if category_name else None,
+                    to_ms(timestamp),
+                    channel_key,
+                ),
+            )
+
+        self._write(update)
+
+    def _active_channels(self, start_datetime, end_datetime, server_id):
+        # One index probe per known channel instead of scanning the whole range
+        range_condition = "m.timestamp_ms >= ?"
+        params = [to_ms(start_datetime)]
+        if end_datetime:
+            range_condition += " AND m.timestamp_ms < ?"
+            params.append(to_ms(end_datetime))
+        active = f"""
+            EXISTS (
+                SELECT 1 FROM {self._messages_source(start_datetime)} m
+                WHERE m.channel_key = c.id AND {range_condition}
+            )
+        """
+        if server_id:
+            query = f"""
+                SELECT DISTINCT c.name FROM channels c
+                JOIN servers s ON s.id = c.server_key
+                WHERE s.discord_id = ? AND {active}
+                ORDER BY c.name
+            """
+            params.insert(0, int(server_id))
+        else:
+            query = f"""
+                SELECT CAST(s.discord_id AS TEXT), s.name, CAST(c.discord_id AS TEXT), c.name
+                FROM channels c
+                LEFT JOIN servers s ON s.id = c.server_key
+                WHERE {active}
+                ORDER BY s.discord_id, c.name
+            """
+
+        logger.debug("Executing query: %s | params=%s", query, params)
+        with self._reader() as conn:
+            results = conn.execute(query, params).fetchall()
+        if server_id:
+            results = [row[0] for row in results]  # Just channel names
+        return results
 
     def get_active_channels(self, since_datetime, server_id=None):
         """Return list of channels that have messages since the given datetime.
@@ -249,19 +1321,9 @@ class MessageStore:
         Returns:
             List of tuples (server_id, server_name, channel_id, channel_name) or just (channel_name,) if server_id specified
         """
-        if server_id:
-            query = "SELECT DISTINCT channel_name FROM messages WHERE timestamp >= ? AND server_id = ? ORDER BY channel_name"
-            params = (since_datetime.isoformat(), str(server_id))
-        else:
-            query = "SELECT DISTINCT server_id, server_name, channel_id, channel_name FROM messages WHERE timestamp >= ? ORDER BY server_id, channel_name"
-            params = (since_datetime.isoformat(),)
-
-        logger.debug("Executing query: %s | params=%s", query, params)
-        cursor = self.conn.execute(query, params)
-        results = cursor.fetchall()
+        results = self._active_channels(since_datetime, None, server_id)
 
         if server_id:
-            results = [row[0] for row in results]  # Just channel names
             logger.info(
                 "Found %d active channels in server %s since %s",
                 len(results),
@@ -290,23 +1352,9 @@ class MessageStore:
         Returns:
             List of tuples (server_id, server_name, channel_id, channel_name) or just (channel_name,) if server_id specified
         """
-        if server_id:
-            query = "SELECT DISTINCT channel_name FROM messages WHERE timestamp >= ? AND timestamp < ? AND server_id = ? ORDER BY channel_name"
-            params = (
-                start_datetime.isoformat(),
-                end_datetime.isoformat(),
-                str(server_id),
-            )
-        else:
-            query = "SELECT DISTINCT server_id, server_name, channel_id, channel_name FROM messages WHERE timestamp >= ? AND timestamp < ? ORDER BY server_id, channel_name"
-            params = (start_datetime.isoformat(), end_datetime.isoformat())
-
-        logger.debug("Executing query: %s | params=%s", query, params)
-        cursor = self.conn.execute(query, params)
-        results = cursor.fetchall()
+        results = self._active_channels(start_datetime, end_datetime, server_id)
 
         if server_id:
-            results = [row[0] for row in results]  # Just channel names
             logger.info(
                 "Found %d active channels in server %s between %s and %s",
                 len(results),
@@ -324,17 +1372,676 @@ class MessageStore:
 
         return results
 
+    def get_messages_grouped(
+        self,
+        start_datetime,
+        end_datetime=None,
+        server_id=None,
+        max_chars_per_channel=None,
+    ):
+        """Return all messages of a date range in one pass, grouped by server and channel.
+
+        Rows are streamed from the cursor, newest first within each channel, and
+        a channel stops keeping messages once `max_chars_per_channel` is reached,
+        so memory is bounded by the budget rather than by the size of the range.
+
+        Args:
+            start_datetime: Start datetime for message retrieval
+            end_datetime: Optional end datetime. If None, returns messages up to now.
+            server_id: Optional server ID to filter by. If None, returns all servers.
+            max_chars_per_channel: Optional budget of author and content characters
+                kept per channel. The most recent messages are kept.
+
+        Returns:
+            Dict {server_id: {"name": server_name, "channels": [channel, ...]}} where
+            each channel is a dict with "name", "category" (may be None),
+            "messages", a list of (timestamp_ms, author, content) tuples in
+            chronological order, "count", the number of messages in the range, and
+            "truncated", True if older messages were left out by the budget.
+            Servers and channels are sorted by ID and name.
+        """
+        conditions, params = self._message_conditions(
+            start_datetime, end_datetime, server_id=server_id
+        )
+        # Messages without a server (direct messages) are left out by the join
+        query = f"""
+            SELECT CAST(s.discord_id AS TEXT), s.name, c.name, c.category_name, m.timestamp_ms, a.name, m.content
+            FROM {self._messages_source(start_datetime)} m
+            JOIN channels c ON c.id = m.channel_key
+            JOIN servers s ON s.id = c.server_key
+            JOIN authors a ON a.id = m.author_key
+            WHERE {' AND '.join(conditions)}
+            ORDER BY s.discord_id, c.name, m.timestamp_ms DESC
+        """
+
+        logger.debug("Executing query: %s | params=%s", query, params)
+        servers = {}
+        channel = None
+        used = 0
+        count = 0
+        with self._reader() as conn:
+            for (
+                row_server_id,
+                server_name,
+                channel_name,
+                category_name,
+                timestamp,
+                author,
+                content,
+            ) in conn.execute(query, params):
+                server = servers.get(row_server_id)
+                if server is None:
+                    server = servers[row_server_id] = {"name": server_name, "channels": []}
+                    channel = None
+                if channel is None or channel["name"] != channel_name:
+                    if channel is not None:
+                        channel["messages"].reverse()
+                    channel = {
+                        "name": channel_name,
+                        "category": None,
+                        "messages": [],
+                        "count": 0,
+                        "truncated": False,
+                    }
+                    server["channels"].append(channel)
+                    used = 0
+                # Channels stored before channel IDs have no category
+                if category_name:
+                    channel["category"] = category_name
+                channel["count"] += 1
+                count += 1
+
+                size = len(author) + len(content or "") + 2
+                if (
+                    max_chars_per_channel
+                    and channel["messages"]
+                    and used + size > max_chars_per_channel
+                ):
+                    channel["truncated"] = True
+                    continue
+                channel["messages"].append((timestamp, author, content))
+                used += size
+
+        if channel is not None:
+            channel["messages"].reverse()
+
+        logger.info(
+            "Fetched %d messages from %d servers between %s and %s",
+            count,
+            len(servers),
+            start_datetime,
+            end_datetime or "now",
+        )
+        return servers
+
+    def iter_message_batches(
+        self,
+        start_datetime,
+        end_datetime=None,
+        channel_name=None,
+        server_id=None,
+        channel_id=None,
+        newest_first=False,
+        batch_size=STREAM_BATCH_SIZE,
+    ):
+        """Stream (timestamp_ms, author, content) rows of a date range in batches.
+
+        A read connection stays checked out until the generator is exhausted or
+        closed, so close it when stopping early.
+
+        Args:
+            start_datetime: Start datetime for message retrieval
+            end_datetime: Optional end datetime. If None, streams messages up to now.
+            channel_name: Optional channel name to filter by. If None, streams all channels.
+            server_id: Optional server ID to filter by. If None, streams all servers.
+            channel_id: Optional channel ID to filter by (more precise than channel_name).
+            newest_first: Stream the most recent messages first.
+            batch_size: Rows fetched from the cursor at a time.
+
+        Yields:
+            Lists of at most `batch_size` rows
+        """
+        conditions, params = self._message_conditions(
+            start_datetime, end_datetime, channel_name, server_id, channel_id
+        )
+        order = "DESC" if newest_first else "ASC"
+        query = f"""
+            SELECT m.timestamp_ms, a.name, m.content FROM {self._messages_source(start_datetime)} m
+            JOIN authors a ON a.id = m.author_key
+            WHERE {' AND '.join(conditions)} ORDER BY m.timestamp_ms {order}
+        """
+
+        logger.debug("Streaming query: %s | params=%s", query, params)
+        with self._reader() as conn:
+            cursor = conn.execute(query, params)
+            try:
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        return
+                    yield rows
+            finally:
+                cursor.close()
+
+    def search_messages(
+        self,
+        query,
+        server_id,
+        channel_ids=None,
+        channel_name=None,
+        author=None,
+        start_datetime=None,
+        end_datetime=None,
+        limit=10,
+        offset=0,
+    ):
+        """Return the messages of a server matching the search terms `query`, best first.
+
+        Args:
+            query: Search terms, all of which must appear (see fts_query)
+            server_id: Server to search
+            channel_ids: Only search these channel IDs (e.g. those the user can read)
+            channel_name: Only search this channel
+            author: Only messages of this author
+            start_datetime: Only messages from this datetime on
+            end_datetime: Only messages before this datetime
+            limit: Page size
+            offset: Number of results to skip
+
+        Returns:
+            List of (timestamp_ms, channel_id, channel_name, author, snippet, message_id)
+            tuples ranked by BM25; the snippet highlights the terms in bold
+        """
+        match = fts_query(query)
+        if not match or channel_ids == []:
+            return []
+        start_datetime = start_datetime or from_ms(0)
+        conditions, params = self._message_conditions(
+            start_datetime, end_datetime, channel_name, server_id
+        )
+        if channel_ids is not None:
+            placeholders = ", ".join("?" * len(channel_ids))
+            conditions.append(
+                f"m.channel_key IN (SELECT id FROM channels WHERE discord_id IN ({placeholders}))"
+            )
+            params += [int(channel_id) for channel_id in channel_ids]
+        if author:
+            conditions.append("m.author_key IN (SELECT id FROM authors WHERE name = ?)")
+            params.append(author)
+
+        schemas = ["main"]
+        if self._reads_archive(start_datetime):
+            schemas.append(ARCHIVE_SCHEMA)
+        # The index is searched first; filters only apply to matching rows
+        branches = [
+            f"""
+            SELECT m.timestamp_ms, CAST(c.discord_id AS TEXT), c.name, a.name,
+                snippet(messages_fts, 0, '**', '**', '…', 24), m.message_id,
+                bm25(messages_fts) AS rank
+            FROM {schema}.messages_fts
+            JOIN {schema}.messages m ON m.id = messages_fts.rowid
+            JOIN channels c ON c.id = m.channel_key
+            JOIN authors a ON a.id = m.author_key
+            WHERE messages_fts MATCH ? AND {' AND '.join(conditions)}
+            """
+            for schema in schemas
+        ]
+        sql = " UNION ALL ".join(branches) + " ORDER BY rank LIMIT ? OFFSET ?"
+        all_params = ([match] + params) * len(schemas) + [limit, offset]
+
+        logger.debug("Executing query: %s | params=%s", sql, all_params)
+        with self._reader() as conn:
+            rows = conn.execute(sql, all_params).fetchall()
+        return [row[:6] for row in rows]
+
     def get_servers(self):
-        """Return list of all servers with messages in database."""
-        query = "SELECT DISTINCT server_id, server_name FROM messages WHERE server_id IS NOT NULL ORDER BY server_name"
+        """Return list of (server_id, server_name) of every server seen."""
+        query = "SELECT CAST(discord_id AS TEXT), name FROM servers ORDER BY name"
 
         logger.debug("Executing query: %s", query)
-        cursor = self.conn.execute(query)
-        results = cursor.fetchall()
+        with self._reader() as conn:
+            results = conn.execute(query).fetchall()
 
         logger.info("Found %d servers in database", len(results))
         return results
 
+    def get_channel_ids(self, server_id):
+        """Return the IDs (as text) of the channels and threads of a server with stored messages."""
+        with self._reader() as conn:
+            rows = conn.execute(
+                """
+                SELECT CAST(c.discord_id AS TEXT) FROM channels c
+                JOIN servers s ON s.id = c.server_key
+                WHERE s.discord_id = ? AND c.discord_id IS NOT NULL
+            """,
+                (int(server_id),),
+            ).fetchall()
+        return [channel_id for (channel_id,) in rows]
+
+    def get_cached_summary(self, cache_key, max_age):
+        """Return the cached summary for `cache_key`, or None if missing or expired.
+
+        Args:
+            cache_key: Key built by SummaryCache
+            max_age: timedelta after which an entry is considered expired
+        """
+        now = datetime.now(timezone.utc)
+        with self._reader() as conn:
+            row = conn.execute(
+                "SELECT summary FROM summaries WHERE cache_key = ? AND created_at >= ?",
+                (cache_key, (now - max_age).isoformat()),
+            ).fetchone()
+
+        if not row:
+            return None
+
+        # Refresh the LRU position without waiting for the writer
+        self._submit(
+            "call",
+            lambda conn: conn.execute(
+                "UPDATE summaries SET last_used_at = ? WHERE cache_key = ?",
+                (now.isoformat(), cache_key),
+            ),
+        )
+        return row[0]
+
+    def put_cached_summary(
+        self,
+        cache_key,
+        summary,
+        server_id,
+        channel,
+        range_start,
+        range_end,
+        content_hash,
+        max_entries,
+        max_age,
+    ):
+        """Store a generated summary and evict expired and least recently used entries."""
+        now = datetime.now(timezone.utc)
+
+        def put(conn):
+            conn.execute(
+                """
+                INSERT INTO summaries (cache_key, server_id, channel, range_start, range_end, content_hash, summary, created_at, last_used_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(cache_key) DO UPDATE SET
+                    range_end=excluded.range_end,
+                    summary=excluded.summary,
+                    created_at=excluded.created_at,
+                    last_used_at=excluded.last_used_at
+            """,
+                (
+                    cache_key,
+                    str(server_id) if server_id else None,
+                    str(channel),
+                    range_start.isoformat(),
+                    range_end.isoformat(),
+                    content_hash,
+                    summary,
+                    now.isoformat(),
+                    now.isoformat(),
+                ),
+            )
+            expired = conn.execute(
+                "DELETE FROM summaries WHERE created_at < ?",
+                ((now - max_age).isoformat(),),
+            ).rowcount
+            evicted = conn.execute(
+                """
+                DELETE FROM summaries WHERE cache_key IN (
+                    SELECT cache_key FROM summaries ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+                )
+            """,
+                (max_entries,),
+            ).rowcount
+            if expired or evicted:
+                logger.debug(
+                    "Summary cache: %d expired and %d least recently used entries evicted",
+                    expired,
+                    evicted,
+                )
+
+        self._write(put)
+
+    def get_segment_summaries(self, server_id, channel_name, start_datetime, end_datetime):
+        """Return the stored segment summaries of a channel within a date range.
+
+        Returns:
+            Dict mapping segment start (ISO string) to (content_hash, summary)
+        """
+        with self._reader() as conn:
+            rows = conn.execute(
+                """
+                SELECT segment_start, content_hash, summary FROM segment_summaries
+                WHERE server_id = ? AND channel_name = ? AND segment_start >= ? AND segment_start < ?
+            """,
+                (
+                    str(server_id),
+                    channel_name,
+                    start_datetime.isoformat(),
+                    end_datetime.isoformat(),
+                ),
+            ).fetchall()
+        return {segment_start: (digest, summary) for segment_start, digest, summary in rows}
+
+    def get_summarized_channels(self, segment_start):
+        """Return the set of (server_id, channel_name) already summarized for a segment."""
+        with self._reader() as conn:
+            rows = conn.execute(
+                "SELECT server_id, channel_name FROM segment_summaries WHERE segment_start = ?",
+                (segment_start.isoformat(),),
+            ).fetchall()
+        return set(rows)
+
+    def save_segment_summary(
+        self,
+        server_id,
+        channel_name,
+        segment_start,
+        segment_end,
+        message_count,
+        content_hash,
+        summary,
+    ):
+        params = (
+            str(server_id),
+            channel_name,
+            segment_start.isoformat(),
+            segment_end.isoformat(),
+            message_count,
+            content_hash,
+            summary,
+            datetime.now(timezone.utc).isoformat(),
+        )
+        self._write(
+            lambda conn: conn.execute(
+                """
+                INSERT INTO segment_summaries (server_id, channel_name, segment_start, segment_end, message_count, content_hash, summary, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(server_id, channel_name, segment_start) DO UPDATE SET
+                    segment_end=excluded.segment_end,
+                    message_count=excluded.message_count,
+                    content_hash=excluded.content_hash,
+                    summary=excluded.summary,
+                    created_at=excluded.created_at
+            """,
+                params,
+            )
+        )
+
+    def get_summary_channel_overrides(self):
+        """Return {server_id: channel_id} of the servers posting reports to a chosen channel."""
+        with self._reader() as conn:
+            rows = conn.execute(
+                "SELECT server_id, channel_id FROM summary_channel_overrides"
+            ).fetchall()
+        return {str(server_id): channel_id for server_id, channel_id in rows}
+
+    def set_summary_channel_override(self, server_id, channel_id):
+        """Post the reports of a server to `channel_id`, or back to SUMMARY_CHANNEL if None."""
+        if channel_id is None:
+            query = "DELETE FROM summary_channel_overrides WHERE server_id = ?"
+            params = (int(server_id),)
+        else:
+            query = "INSERT OR REPLACE INTO summary_channel_overrides (server_id, channel_id) VALUES (?, ?)"
+            params = (int(server_id), int(channel_id))
+        self._write(lambda conn: conn.execute(query, params))
+
+    def get_last_report_date(self, server_id):
+        """Return the date (YYYY-MM-DD) of the last daily report sent to a server, or None."""
+        with self._reader() as conn:
+            row = conn.execute(
+                "SELECT MAX(report_date) FROM daily_reports WHERE server_id = ? AND sent_at_ms IS NOT NULL",
+                (int(server_id),),
+            ).fetchone()
+        return row[0]
+
+    def claim_daily_report(self, server_id, report_date, owner, stale_after):
+        """Claim the daily report of `report_date` for a server before generating it.
+
+        Only one claim succeeds, so two processes can never both send the same
+        report. A claim left unsent for `stale_after` (its owner crashed) can
+        be taken over.
+
+        Returns:
+            True if `owner` now holds the claim
+        """
+        now = to_ms(datetime.now(timezone.utc))
+        params = (
+            int(server_id),
+            report_date.isoformat(),
+            owner,
+            now,
+            now - int(stale_after.total_seconds() * 1000),
+        )
+
+        def claim(conn):
+            return conn.execute(
+                """
+                INSERT INTO daily_reports (server_id, report_date, claimed_by, claimed_at_ms)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (server_id, report_date) DO UPDATE SET
+                    claimed_by = excluded.claimed_by,
+                    claimed_at_ms = excluded.claimed_at_ms
+                WHERE daily_reports.sent_at_ms IS NULL
+                    AND (daily_reports.claimed_at_ms IS NULL OR daily_reports.claimed_at_ms < ?)
+            """,
+                params,
+            ).rowcount == 1
+
+        return self._write(claim)
+
+    def release_daily_report(self, server_id, report_date, owner):
+        """Drop an unsent claim, so the report can be retried."""
+        params = (int(server_id), report_date.isoformat(), owner)
+        self._write(
+            lambda conn: conn.execute(
+                "DELETE FROM daily_reports WHERE server_id = ? AND report_date = ? AND claimed_by = ? AND sent_at_ms IS NULL",
+                params,
+            )
+        )
+
+    def save_daily_report(self, server_id, report_date):
+        """Record that the daily report of `report_date` was sent to a server."""
+        params = (
+            int(server_id),
+            report_date.isoformat(),
+            to_ms(datetime.now(timezone.utc)),
+        )
+        self._write(
+            lambda conn: conn.execute(
+                """
+                INSERT INTO daily_reports (server_id, report_date, sent_at_ms) VALUES (?, ?, ?)
+                ON CONFLICT (server_id, report_date) DO UPDATE SET sent_at_ms = excluded.sent_at_ms
+            """,
+                params,
+            )
+        )
+
+    def acquire_lease(self, job, owner, ttl):
+        """Take or renew the lease on `job` for `ttl` (a timedelta).
+
+        The lease goes to `owner` if it is free, expired or already held by
+        `owner`. Processes sharing the database use it to elect the one that
+        runs a singleton job.
+
+        Returns:
+            True if `owner` holds the lease
+        """
+        now = to_ms(datetime.now(timezone.utc))
+        params = (job, owner, now + int(ttl.total_seconds() * 1000), now)
+
+        def acquire(conn):
+            conn.execute(
+                """
+                INSERT INTO job_leases (job, owner, expires_at_ms) VALUES (?, ?, ?)
+                ON CONFLICT (job) DO UPDATE SET
+                    owner = excluded.owner,
+                    expires_at_ms = excluded.expires_at_ms
+                WHERE job_leases.owner = excluded.owner OR job_leases.expires_at_ms < ?
+            """,
+                params,
+            )
+            row = conn.execute("SELECT owner FROM job_leases WHERE job = ?", (job,)).fetchone()
+            return row[0] == owner
+
+        return self._write(acquire)
+
+    def release_lease(self, job, owner):
+        """Give up the lease on `job` if `owner` holds it."""
+        self._write(
+            lambda conn: conn.execute(
+                "DELETE FROM job_leases WHERE job = ? AND owner = ?", (job, owner)
+            )
+        )
+
+    # ----------------------
+    # Summary jobs
+    # ----------------------
+    # A job goes pending -> running -> done or failed, then is deleted once
+    # its result has been delivered. A running job whose worker stopped
+    # heartbeating is claimed again by the next worker.
+
+    def enqueue_summary_job(self, kind, payload, dedupe_key=None):
+        """Queue a summary job and return its ID.
+
+        Args:
+            kind: Job kind (see summary_jobs.JOB_KINDS)
+            payload: JSON-serializable dict describing the report
+            dedupe_key: Jobs sharing a key are queued once; a failed one is queued again
+        """
+        params = (kind, dedupe_key, json.dumps(payload), to_ms(datetime.now(timezone.utc)))
+
+        def enqueue(conn):
+            row = conn.execute(
+                """
+                INSERT INTO summary_jobs (kind, dedupe_key, payload, created_at_ms) VALUES (?, ?, ?, ?)
+                ON CONFLICT (dedupe_key) DO UPDATE SET
+                    status = 'pending', attempts = 0, payload = excluded.payload, error = NULL
+                WHERE summary_jobs.status = 'failed'
+                RETURNING id
+            """,
+                params,
+            ).fetchone()
+            if row is None:
+                # Already queued or running
+                row = conn.execute(
+                    "SELECT id FROM summary_jobs WHERE dedupe_key = ?", (dedupe_key,)
+                ).fetchone()
+            return row[0]
+
+        return self._write(enqueue)
+
+    def claim_summary_job(self, owner, stale_after, max_attempts):
+        """Claim the oldest pending job, or a running one abandoned for `stale_after`.
+
+        An abandoned job already claimed `max_attempts` times (e.g. one that
+        keeps crashing its worker) is marked failed instead of handed out again.
+
+        Returns:
+            Dict with "id", "kind", "payload" and "attempts", or None if there is nothing to do
+        """
+        now = to_ms(datetime.now(timezone.utc))
+        stale = now - int(stale_after.total_seconds() * 1000)
+
+        def claim(conn):
+            conn.execute(
+                """
+                UPDATE summary_jobs
+                SET status = 'failed', error = 'le traitement a été interrompu ' || attempts || ' fois', finished_at_ms = ?
+                WHERE status = 'running' AND heartbeat_ms < ? AND attempts >= ?
+            """,
+                (now, stale, max_attempts),
+            )
+            return conn.execute(
+                """
+                UPDATE summary_jobs
+                SET status = 'running', claimed_by = ?, heartbeat_ms = ?, attempts = attempts + 1
+                WHERE id = (
+                    SELECT id FROM summary_jobs
+                    WHERE status = 'pending' OR (status = 'running' AND heartbeat_ms < ?)
+                    ORDER BY id LIMIT 1
+                )
+                RETURNING id, kind, payload, attempts
+            """,
+                (owner, now, stale),
+            ).fetchone()
+
+        row = self._write(claim)
+        if row is None:
+            return None
+        return {"id": row[0], "kind": row[1], "payload": json.loads(row[2]), "attempts": row[3]}
+
+    def heartbeat_summary_job(self, job_id, owner):
+        """Record that `owner` is still working on a job.
+
+        Returns:
+            False if the job was taken over by another worker
+        """
+        params = (to_ms(datetime.now(timezone.utc)), job_id, owner)
+        return self._write(
+            lambda conn: conn.execute(
+                "UPDATE summary_jobs SET heartbeat_ms = ? WHERE id = ? AND claimed_by = ? AND status = 'running'",
+                params,
+            ).rowcount == 1
+        )
+
+    def finish_summary_job(self, job_id, owner, result=None, error=None, retry=False):
+        """Store the outcome of a job claimed by `owner`.
+
+        Args:
+            result: Text produced by the job, when it succeeded
+            error: Error message, when it failed
+            retry: Queue the failed job again instead of marking it failed
+        """
+        if error is None:
+            status = "done"
+        else:
+            status = "pending" if retry else "failed"
+        params = (status, result, error, to_ms(datetime.now(timezone.utc)), job_id, owner)
+        self._write(
+            lambda conn: conn.execute(
+                """
+                UPDATE summary_jobs SET status = ?, result = ?, error = ?, finished_at_ms = ?
+                WHERE id = ? AND claimed_by = ? AND status = 'running'
+            """,
+                params,
+            )
+        )
+
+    def get_finished_summary_jobs(self, limit=50):
+        """Return the done and failed jobs waiting for delivery, oldest first.
+
+        Returns:
+            List of dicts with "id", "kind", "payload", "status", "result",
+            "error" and "created_at_ms"
+        """
+        with self._reader() as conn:
+            rows = conn.execute(
+                """
+                SELECT id, kind, payload, status, result, error, created_at_ms FROM summary_jobs
+                WHERE status IN ('done', 'failed') ORDER BY id LIMIT ?
+            """,
+                (limit,),
+            ).fetchall()
+        return [
+            {
+                "id": job_id,
+                "kind": kind,
+                "payload": json.loads(payload),
+                "status": status,
+                "result": result,
+                "error": error,
+                "created_at_ms": created_at_ms,
+            }
+            for job_id, kind, payload, status, result, error, created_at_ms in rows
+        ]
+
+    def delete_summary_job(self, job_id):
+        """Drop a job once its result has been delivered."""
+        self._write(lambda conn: conn.execute("DELETE FROM summary_jobs WHERE id = ?", (job_id,)))
+
     def get_channel_category(self, channel_id=None, channel_name=None, server_id=None):
         """Get category information for a specific channel.
 
@@ -348,20 +2055,120 @@ class MessageStore:
         """
         if channel_id and server_id:
             # Preferred: lookup by channel_id and server_id
-            row = self.conn.execute(
-                "SELECT category_id, category_name FROM channel_meta WHERE channel_id = ? AND server_id = ?",
-                (str(channel_id), str(server_id)),
-            ).fetchone()
+            query = """
+                SELECT CAST(c.category_id AS TEXT), c.category_name FROM channels c
+                JOIN servers s ON s.id = c.server_key
+                WHERE c.discord_id = ? AND s.discord_id = ?
+            """
+            params = (int(channel_id), int(server_id))
         elif channel_name and server_id:
             # Fallback: lookup by channel_name and server_id
-            row = self.conn.execute(
-                "SELECT category_id, category_name FROM channel_meta WHERE channel_name = ? AND server_id = ?",
-                (channel_name, str(server_id)),
-            ).fetchone()
+            query = """
+                SELECT CAST(c.category_id AS TEXT), c.category_name FROM channels c
+                JOIN servers s ON s.id = c.server_key
+                WHERE c.name = ? AND s.discord_id = ? AND c.category_id IS NOT NULL
+            """
+            params = (channel_name, int(server_id))
         else:
             return (None, None)
 
+        with self._reader() as conn:
+            row = conn.execute(query, params).fetchone()
+
         if row:
             return (row[0], row[1])
         else:
             return (None, None)
+
+
+# ----------------------
+# Async facade
+# ----------------------
+def _offload(name):
+    """Build a coroutine method running MessageStore.<name> in a worker thread."""
+
+    async def method(self, *args, **kwargs):
+        with metrics.store_query_seconds.time(method=name):
+            return await asyncio.to_thread(getattr(self.store, name), *args, **kwargs)
+
+    method.__name__ = name
+    method.__doc__ = getattr(MessageStore, name).__doc__
+    return method
+
+
+class AsyncMessageStore:
+    """Awaitable facade over a MessageStore, for use from coroutines.
+
+    Queries run in worker threads against the read pool and writes are handed
+    to the writer thread, so neither ever blocks the event loop. Create one
+    instance and share it between the bot and the scheduler.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def add_message(self, *args, **kwargs):
+        """Queue a message for insertion (see MessageStore.add_message)."""
+        # Only enqueues, so it is safe to call directly from the event loop
+        self.store.add_message(*args, **kwargs)
+
+    @property
+    def queue_depth(self):
+        return self.store.queue_depth
+
+    def ingestion_stats(self):
+        return self.store.ingestion_stats()
+
+    flush = _offload("flush")
+    get_messages_since = _offload("get_messages_since")
+    get_messages_in_range = _offload("get_messages_in_range")
+    get_last_fetched = _offload("get_last_fetched")
+    update_last_fetched = _offload("update_last_fetched")
+    get_active_channels = _offload("get_active_channels")
+    get_active_channels_in_range = _offload("get_active_channels_in_range")
+    get_messages_grouped = _offload("get_messages_grouped")
+
+    async def iter_messages(self, *args, **kwargs):
+        """Async iterator over the rows of MessageStore.iter_message_batches.
+
+        Each batch is fetched in a worker thread; closing the iterator early
+        releases the read connection.
+        """
+        batches = self.store.iter_message_batches(*args, **kwargs)
+        try:
+            while True:
+                with metrics.store_query_seconds.time(method="iter_messages"):
+                    batch = await asyncio.to_thread(next, batches, None)
+                if batch is None:
+                    return
+                for row in batch:
+                    yield row
+        finally:
+            await asyncio.to_thread(batches.close)
+
+    archive_messages = _offload("archive_messages")
+    incremental_vacuum_enabled = _offload("incremental_vacuum_enabled")
+    incremental_vacuum = _offload("incremental_vacuum")
+    search_messages = _offload("search_messages")
+    get_servers = _offload("get_servers")
+    get_channel_ids = _offload("get_channel_ids")
+    get_channel_category = _offload("get_channel_category")
+    get_summary_channel_overrides = _offload("get_summary_channel_overrides")
+    set_summary_channel_override = _offload("set_summary_channel_override")
+    get_last_report_date = _offload("get_last_report_date")
+    claim_daily_report = _offload("claim_daily_report")
+    release_daily_report = _offload("release_daily_report")
+    save_daily_report = _offload("save_daily_report")
+    acquire_lease = _offload("acquire_lease")
+    release_lease = _offload("release_lease")
+    enqueue_summary_job = _offload("enqueue_summary_job")
+    claim_summary_job = _offload("claim_summary_job")
+    heartbeat_summary_job = _offload("heartbeat_summary_job")
+    finish_summary_job = _offload("finish_summary_job")
+    get_finished_summary_jobs = _offload("get_finished_summary_jobs")
+    delete_summary_job = _offload("delete_summary_job")
+    get_cached_summary = _offload("get_cached_summary")
+    put_cached_summary = _offload("put_cached_summary")
+    get_segment_summaries = _offload("get_segment_summaries")
+    get_summarized_channels = _offload("get_summarized_channels")
+    save_segment_summary = _offload("save_segment_summary")
@@ -0,0 +1,238 @@
+"""Outbound delivery of messages to Discord.
+
+Every message the bot posts or edits goes through a Delivery, which paces
+the calls of each channel with a token bucket (DELIVERY_RATE messages per
+second, bursts of DELIVERY_BURST) so that long reports stay under Discord's
+per-channel rate limits, and retries calls rejected with a 429 after the
+delay Discord asks for. Buckets are per channel, so reports of different
+guilds are delivered in parallel and only wait for their own channel.
+
+A text that would need more than DELIVERY_MAX_CHUNKS messages is posted as
+a single file attachment instead, and progress messages are edited at most
+once every PROGRESS_EDIT_INTERVAL seconds.
+"""
+
+import asyncio
+import io
+import logging
+import time
+
+import discord
+from discord.ext import commands
+
+import metrics
+from config import (
+    DELIVERY_RATE,
+    DELIVERY_BURST,
+    DELIVERY_MAX_CHUNKS,
+    DELIVERY_MAX_RETRIES,
+    PROGRESS_EDIT_INTERVAL,
+)
+
+logger = logging.getLogger(__name__)
+
+TRUNCATED_SUFFIX = "... [tronqué]"
+
+
+def split_message(content, max_length=1900):
+    """Split `content` on line boundaries into chunks of at most `max_length`.
+
+    Lines longer than `max_length` are truncated.
+    """
+    if len(content) <= max_length:
+        return [content]
+
+    chunks = []
+    lines = []  # lines of the chunk being built
+    size = 0
+    for line in content.split("\n"):
+        # If adding this line would exceed limit, close the current chunk
+        if size + len(line) + 1 > max_length:
+            if lines:
+                chunks.append("\n".join(lines).strip())
+                lines = []
+                size = 0
+            if len(line) + 1 > max_length:
+                # Single line is too long, truncate it
+                chunks.append(line[: max_length - 20] + TRUNCATED_SUFFIX)
+                continue
+        lines.append(line)
+        size += len(line) + 1
+
+    if lines:
+        chunks.append("\n".join(lines).strip())
+    return [chunk for chunk in chunks if chunk]
+
+
+class TokenBucket:
+    """Allows `rate` calls per second on average, with bursts of `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a call is allowed. Waiters are served in order."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        """Hold every call for `seconds`, after the server asked us to slow down."""
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+def _channel_key(destination):
+    if isinstance(destination, discord.Interaction):
+        return destination.channel_id
+    if isinstance(destination, commands.Context):
+        return destination.channel.id
+    return getattr(destination, "id", None)
+
+
+class Delivery:
+    """Rate-limited sends and edits, paced per channel."""
+
+    def __init__(
+        self,
+        rate=DELIVERY_RATE,
+        burst=DELIVERY_BURST,
+        max_chunks=DELIVERY_MAX_CHUNKS,
+        max_retries=DELIVERY_MAX_RETRIES,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_chunks = max_chunks
+        self.max_retries = max_retries
+        self._buckets = {}
+
+    def _bucket(self, key):
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    async def call(self, key, fn, *args, **kwargs):
+        """Await `fn(*args, **kwargs)` within the rate of channel `key`.
+
+        Calls rejected with a 429 are retried up to `max_retries` times.
+        """
+        bucket = self._bucket(key)
+        for attempt in range(self.max_retries + 1):
+            await bucket.acquire()
+            try:
+                return await fn(*args, **kwargs)
+            except discord.RateLimited as e:
+                retry_after = e.retry_after
+            except discord.HTTPException as e:
+                if e.status != 429:
+                    raise
+                retry_after = float(e.response.headers.get("Retry-After", 1))
+            if attempt == self.max_retries:
+                break
+            metrics.discord_rate_limited.inc()
+            logger.warning(f"Rate limited on channel {key}, retrying in {retry_after:.1f}s")
+            bucket.pause(retry_after)
+        raise discord.RateLimited(retry_after)
+
+    async def send(self, destination, content, max_length=1900):
+        """Post `content` to a channel, context or interaction.
+
+        Long texts are split on line boundaries; beyond `max_chunks` messages
+        the text is attached as a file to a single message instead.
+
+        Returns:
+            The last message sent
+        """
+        key = _channel_key(destination)
+        chunks = split_message(content, max_length)
+        with metrics.discord_send_seconds.time():
+            if len(chunks) > self.max_chunks:
+                first_line = content.split("\n", 1)[0][: max_length - 100]
+                return await self.call(
+                    key,
+                    _send,
+                    destination,
+                    f"{first_line}\n📎 Texte complet en pièce jointe ({len(chunks)} messages sinon).",
+                    attachment=content,
+                )
+            message = None
+            for chunk in chunks:
+                message = await self.call(key, _send, destination, chunk)
+            return message
+
+    def progress(self, message, interval=PROGRESS_EDIT_INTERVAL):
+        """Wrap a message that is edited to report progress."""
+        return ProgressMessage(self, message, interval)
+
+
+class ProgressMessage:
+    """A progress message edited at most once every `interval` seconds.
+
+    Updates arriving in between are dropped, except the latest one, which is
+    written when the interval has elapsed.
+    """
+
+    def __init__(self, delivery, message, interval):
+        self.delivery = delivery
+        self.message = message
+        self.interval = interval
+        self._content = None
+        self._edited_at = None
+        self._pending = None
+
+    def update(self, content):
+        self._content = content
+        if self._pending is None:
+            self._pending = asyncio.create_task(self._flush())
+
+    async def _flush(self):
+        try:
+            if self._edited_at is not None:
+                wait = self._edited_at + self.interval - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+            self._edited_at = time.monotonic()
+            await self.delivery.call(
+                self.message.channel.id, self.message.edit, content=self._content
+            )
+        except discord.HTTPException:
+            pass  # Message might have been deleted
+        finally:
+            self._pending = None
+
+    async def delete(self):
+        if self._pending is not None:
+            self._pending.cancel()
+        try:
+            await self.delivery.call(self.message.channel.id, self.message.delete)
+        except discord.HTTPException:
+            pass
+
+
+async def _send(destination, content, attachment=None):
+    """Send a message using the appropriate method, with `attachment` as a resume.md file."""
+    metrics.discord_sends.inc()
+    # A discord.File is consumed by the request, so each attempt gets its own
+    kwargs = (
+        {"file": discord.File(io.BytesIO(attachment.encode()), filename="resume.md")}
+        if attachment
+        else {}
+    )
+    if isinstance(destination, discord.Interaction):
+        return await destination.followup.send(content, wait=True, **kwargs)
+    # A channel, a context or similar
+    return await destination.send(content, **kwargs)
+
+
+# Shared by the bot and the scheduler, so all sends to a channel share its bucket
+delivery = Delivery()
@@ -0,0 +1,62 @@
+"""Run the bot as SHARD_PROCESSES processes sharing SHARD_COUNT shards.
+
+Each process runs bot.py with its own slice of the shard IDs in SHARD_IDS
+(shard i goes to process i % SHARD_PROCESSES). All of them use the same
+SQLite database, which must be on a local filesystem shared by the
+processes (WAL does not work over network filesystems); exactly one of
+them runs the scheduled jobs (see coordination.py).
+
+When METRICS_PORT is set, process i serves its metrics on METRICS_PORT + i.
+
+Usage:
+    SHARD_COUNT=8 SHARD_PROCESSES=2 python launch_shards.py
+"""
+
+import logging
+import os
+import signal
+import subprocess
+import sys
+
+from config import SHARD_COUNT, SHARD_PROCESSES, METRICS_PORT
+
+logger = logging.getLogger(__name__)
+
+
+def shard_slices(shard_count, processes):
+    """Return the shard IDs of each process."""
+    return [list(range(index, shard_count, processes)) for index in range(processes)]
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    if not SHARD_COUNT:
+        sys.exit("SHARD_COUNT must be set to run several shard processes")
+    processes = min(SHARD_PROCESSES, SHARD_COUNT)
+
+    children = []
+    for index, shard_ids in enumerate(shard_slices(SHARD_COUNT, processes)):
+        env = dict(os.environ, SHARD_IDS=",".join(map(str, shard_ids)))
+        if METRICS_PORT:
+            env["METRICS_PORT"] = str(METRICS_PORT + index)
+        logger.info(f"Starting process {index} with shards {shard_ids}")
+        children.append(subprocess.Popen([sys.executable, "bot.py"], env=env))
+
+    def forward(signum, frame):
+        for child in children:
+            if child.poll() is None:
+                child.send_signal(signum)
+
+    signal.signal(signal.SIGINT, forward)
+    signal.signal(signal.SIGTERM, forward)
+
+    # Wait for every child; a crashed process is not restarted here, leave
+    # that to the service manager
+    exit_code = 0
+    for child in children:
+        exit_code = child.wait() or exit_code
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
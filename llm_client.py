@@ -0,0 +1,208 @@
+"""Resilient calls to a summarizer backend.
+
+LLMClient wraps a backend (see summary_backends) with what a shared API
+account needs once many summaries run in parallel:
+
+- request and token budgets (LLM_RPM, LLM_TPM) enforced on our side, so
+  bursts wait for capacity instead of being rejected with 429s; they are
+  per process, so several processes share the account's limits by
+  splitting them;
+- retries of transient failures (rate limits, timeouts, 5xx) with jittered
+  exponential backoff, honouring the server's Retry-After;
+- a circuit breaker that fails fast for LLM_BREAKER_COOLDOWN_SECONDS after
+  LLM_BREAKER_THRESHOLD consecutive failures, instead of piling retries on
+  an API that is down;
+- per-call latency, retry and token usage metrics.
+"""
+
+import asyncio
+import logging
+import random
+import time
+
+import metrics
+from config import (
+    LLM_RPM,
+    LLM_TPM,
+    LLM_MAX_RETRIES,
+    LLM_RETRY_BASE_SECONDS,
+    LLM_RETRY_MAX_SECONDS,
+    LLM_BREAKER_THRESHOLD,
+    LLM_BREAKER_COOLDOWN_SECONDS,
+)
+from summary_backends import SummarizerError
+
+logger = logging.getLogger(__name__)
+
+
+class RateBudget:
+    """Allows `per_minute` units per minute, refilled continuously.
+
+    A limit of 0 disables the budget.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.available = per_minute
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        """Wait until `amount` units are available and take them. Waiters are served in order."""
+        if not self.capacity:
+            return
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.available >= amount:
+                    self.available -= amount
+                    return
+                await asyncio.sleep((amount - self.available) / self.rate)
+
+    def adjust(self, amount):
+        """Take `amount` more units (or give them back if negative) after the fact."""
+        if self.capacity:
+            self._refill()
+            self.available = min(self.capacity, self.available - amount)
+
+
+class CircuitOpenError(SummarizerError):
+    """The backend failed too often recently; the call was not attempted."""
+
+
+class CircuitBreaker:
+    """Stops calls to a failing backend for a while.
+
+    After `threshold` consecutive failures the circuit opens: calls fail at
+    once for `cooldown` seconds. Then one trial call is let through; its
+    success closes the circuit, its failure opens it again.
+    """
+
+    def __init__(self, threshold=LLM_BREAKER_THRESHOLD, cooldown=LLM_BREAKER_COOLDOWN_SECONDS):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def check(self):
+        """Raise CircuitOpenError if calls are currently blocked."""
+        if self.opened_at is None:
+            return
+        if time.monotonic() - self.opened_at < self.cooldown or self._trial:
+            raise CircuitOpenError("modèle indisponible, nouvel essai plus tard")
+        self._trial = True  # half-open: this call is the trial
+
+    def abandon(self):
+        """Forget a call that ended without an outcome (cancelled, unexpected error).
+
+        If it was the half-open trial, the next call becomes the trial.
+        """
+        self._trial = False
+
+    def success(self):
+        if self.opened_at is not None:
+            logger.info("Summarizer backend recovered, closing the circuit")
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+
+    def failure(self):
+        self.failures += 1
+        self._trial = False
+        if self.failures >= self.threshold:
+            if self.opened_at is None:
+                logger.warning(
+                    f"Summarizer backend failed {self.failures} times in a row, "
+                    f"pausing calls for {self.cooldown}s"
+                )
+            self.opened_at = time.monotonic()
+
+
+class LLMClient:
+    """Throttled, retried and metered calls to `backend`."""
+
+    def __init__(
+        self,
+        backend,
+        rpm=LLM_RPM,
+        tpm=LLM_TPM,
+        max_retries=LLM_MAX_RETRIES,
+        breaker=None,
+    ):
+        self.backend = backend
+        self.name = backend.name
+        self.requests = RateBudget(rpm)
+        self.tokens = RateBudget(tpm)
+        self.max_retries = max_retries
+        self.breaker = breaker or CircuitBreaker()
+
+    def backoff(self, attempt, retry_after=None):
+        """Return the delay before retry number `attempt` (from 0): full jitter, at least `retry_after`."""
+        delay = random.uniform(0, min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * 2**attempt))
+        return max(delay, retry_after or 0)
+
+    async def complete(self, prompt, max_output_tokens=1000, channel_name=None):
+        """Generate a completion of `prompt`, retrying transient failures.
+
+        Returns:
+            The backend's Completion
+
+        Raises:
+            SummarizerError: if the call failed for good, or the circuit is open
+        """
+        channel = channel_name or "unknown"
+        # Reserve the worst case against the token budget, settled on the actual usage
+        reserved = len(prompt) // 4 + 1 + max_output_tokens
+        for attempt in range(self.max_retries + 1):
+            try:
+                self.breaker.check()
+            except CircuitOpenError:
+                metrics.llm_call_errors.inc(backend=self.name)
+                raise
+
+            started = None
+            try:
+                with metrics.llm_throttle_seconds.time(backend=self.name):
+                    await self.requests.acquire()
+                    await self.tokens.acquire(reserved)
+                started = time.perf_counter()
+                completion = await self.backend.complete(prompt, max_output_tokens)
+            except SummarizerError as e:
+                metrics.llm_call_seconds.observe(time.perf_counter() - started, backend=self.name)
+                metrics.llm_call_errors.inc(backend=self.name)
+                self.breaker.failure()
+                # Failed calls are not billed: give the reserved tokens back
+                self.tokens.adjust(-reserved)
+                if not e.retryable or attempt == self.max_retries:
+                    raise
+                delay = self.backoff(attempt, e.retry_after)
+                metrics.llm_retries.inc(backend=self.name)
+                logger.warning(
+                    f"{self.name} call failed ({e}), retry {attempt + 1}/{self.max_retries} in {delay:.1f}s"
+                )
+                await asyncio.sleep(delay)
+                continue
+            except BaseException:
+                # Cancelled (leadership lost, shutdown) or an unexpected bug:
+                # don't leave a half-open trial pending forever
+                self.breaker.abandon()
+                if started is not None:
+                    self.tokens.adjust(-reserved)
+                raise
+
+            metrics.llm_call_seconds.observe(time.perf_counter() - started, backend=self.name)
+            self.breaker.success()
+            self.tokens.adjust(
+                completion.input_tokens + completion.output_tokens - reserved
+            )
+            metrics.llm_tokens.inc(completion.input_tokens, channel=channel, direction="input")
+            metrics.llm_tokens.inc(completion.output_tokens, channel=channel, direction="output")
+            return completion
@@ -0,0 +1,205 @@
+"""In-process metrics, exposed in Prometheus text format over HTTP.
+
+Counters and histograms are module-level objects updated by the modules
+they measure (db, summarizer, scheduler, utils). Nothing is served unless
+METRICS_PORT is set: `start_server` then exposes every metric on
+http://METRICS_HOST:METRICS_PORT/metrics for a Prometheus scraper.
+"""
+
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import METRICS_HOST, METRICS_PORT
+
+logger = logging.getLogger(__name__)
+
+# Seconds; covers fast SQLite reads up to multi-minute daily reports
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+_registry = []
+_lock = threading.Lock()
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic count, optionally split by labels."""
+
+    kind = "counter"
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with _lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labels, key)} {value}"
+
+
+class Histogram:
+    """Distribution of observed values (latencies, sizes) in cumulative buckets."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}  # label values -> [bucket counts..., sum, count]
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            state = self._values.setdefault(key, [0] * (len(self.buckets) + 2))
+            if index < len(self.buckets):
+                state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the `with` block, in seconds."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with _lock:
+            values = {key: list(state) for key, state in self._values.items()}
+        for key, state in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                labels = _format_labels(self.labels, key, [("le", bound)])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labels, key, [("le", "+Inf")])
+            yield f"{self.name}_bucket{labels} {state[-1]}"
+            yield f"{self.name}_sum{_format_labels(self.labels, key)} {state[-2]}"
+            yield f"{self.name}_count{_format_labels(self.labels, key)} {state[-1]}"
+
+
+def render():
+    """Return every registered metric in Prometheus text exposition format."""
+    lines = []
+    for metric in _registry:
+        lines.append(f"# HELP {metric.name} {metric.documentation}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes every few seconds would flood bot.log
+
+
+def start_server(host=METRICS_HOST, port=METRICS_PORT):
+    """Serve /metrics from a daemon thread. Does nothing when `port` is 0.
+
+    Returns:
+        The HTTP server, or None when metrics are disabled
+    """
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"Metrics available on http://{host}:{server.server_port}/metrics")
+    return server
+
+
+# ----------------------
+# Metrics
+# ----------------------
+messages_ingested = Counter(
+    "arachne_messages_ingested_total", "Messages written to the database"
+)
+ingest_flush_seconds = Histogram(
+    "arachne_ingest_flush_seconds", "Time to write one batch of queued messages"
+)
+ingest_flush_failures = Counter(
+    "arachne_ingest_flush_failures_total", "Batches of messages that failed to be written"
+)
+ingest_dropped = Counter(
+    "arachne_ingest_dropped_total", "Messages dropped because they could not be stored"
+)
+store_query_seconds = Histogram(
+    "arachne_store_query_seconds", "MessageStore call latency seen by coroutines", ["method"]
+)
+llm_call_seconds = Histogram(
+    "arachne_llm_call_seconds", "Latency of one summarizer backend call", ["backend"]
+)
+llm_call_errors = Counter(
+    "arachne_llm_call_errors_total", "Failed summarizer backend calls", ["backend"]
+)
+llm_retries = Counter(
+    "arachne_llm_retries_total", "Summarizer backend calls retried after a transient failure", ["backend"]
+)
+llm_throttle_seconds = Histogram(
+    "arachne_llm_throttle_seconds", "Time a call waited for the request and token budgets", ["backend"]
+)
+batch_requests = Counter(
+    "arachne_batch_requests_total", "Daily report calls sent through the batch API, by outcome", ["outcome"]
+)
+batch_seconds = Histogram(
+    "arachne_batch_seconds", "Time from a batch's submission to its results or fallback",
+    ["transport"],
+    buckets=(60, 300, 900, 1800, 3600, 7200, 14400, 43200, 86400),
+)
+llm_tokens = Counter(
+    "arachne_llm_tokens_total",
+    "Tokens sent to and generated by the summarizer backend",
+    ["channel", "direction"],
+)
+daily_summary_seconds = Histogram(
+    "arachne_daily_summary_seconds", "Time to build and post a server's daily report", ["server"]
+)
+daily_summary_failures = Counter(
+    "arachne_daily_summary_failures_total", "Daily reports that failed", ["server"]
+)
+discord_sends = Counter(
+    "arachne_discord_messages_sent_total", "Discord messages posted by safe_send"
+)
+discord_rate_limited = Counter(
+    "arachne_discord_rate_limited_total", "Discord calls rejected with a 429 and retried"
+)
+discord_send_seconds = Histogram(
+    "arachne_discord_send_seconds", "Time for safe_send to post a whole text"
+)
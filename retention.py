@@ -0,0 +1,85 @@
+"""Retention: keep RETENTION_DAYS of messages in the main table.
+
+Off by default (RETENTION_DAYS=0): every message stays in the main table.
+With RETENTION_DAYS set, older messages are moved to the archive database
+every hour, and the pages they leave free are released with incremental
+vacuum so the main database file shrinks instead of only growing. Archived
+messages stay queryable, so summaries of old ranges still work.
+
+New databases use incremental vacuum from the start. A database created
+before it must be converted once with a full VACUUM, which rewrites the
+whole file; run it while the bot is stopped:
+    python retention.py --enable-incremental-vacuum
+"""
+
+import argparse
+import logging
+from datetime import datetime, timezone, timedelta
+
+from discord.ext import tasks
+
+from config import RETENTION_DAYS, VACUUM_PAGES_PER_RUN
+
+logger = logging.getLogger(__name__)
+
+
+class Retention:
+    """Background job archiving old messages and compacting the database."""
+
+    def __init__(self, store, backfill=None):
+        self.store = store
+        self.backfill = backfill
+        self.vacuum_enabled = None
+
+    @tasks.loop(hours=1)
+    async def run(self):
+        # Don't compete with a backfill for the writer thread
+        if self.backfill and self.backfill.running:
+            return
+
+        try:
+            if self.vacuum_enabled is None:
+                self.vacuum_enabled = await self.store.incremental_vacuum_enabled()
+                if not self.vacuum_enabled:
+                    logger.warning(
+                        "Incremental vacuum is off, the database file won't shrink; "
+                        "stop the bot and run: python retention.py --enable-incremental-vacuum"
+                    )
+
+            cutoff = datetime.now(timezone.utc) - timedelta(days=RETENTION_DAYS)
+            moved = await self.store.archive_messages(cutoff)
+            if moved:
+                logger.info(f"Moved {moved} messages older than {cutoff.date()} to the archive")
+            if self.vacuum_enabled:
+                await self.store.incremental_vacuum(VACUUM_PAGES_PER_RUN)
+        except Exception:
+            logger.exception("Retention run failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Database maintenance")
+    parser.add_argument(
+        "--enable-incremental-vacuum",
+        action="store_true",
+        help="convert the database to incremental vacuum (full VACUUM, stop the bot first)",
+    )
+    args = parser.parse_args()
+    if not args.enable_incremental_vacuum:
+        parser.print_help()
+        return
+
+    from db import MessageStore
+
+    logging.basicConfig(level=logging.INFO)
+    store = MessageStore()
+    try:
+        if store.enable_incremental_vacuum():
+            logger.info("Converted the database to incremental vacuum")
+        else:
+            logger.info("The database already uses incremental vacuum")
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
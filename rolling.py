@@ -0,0 +1,216 @@
+"""Rolling summaries: channels are summarized segment by segment through the day.
+
+Each closed segment (ROLLING_SEGMENT_MINUTES long, aligned on the epoch) is
+summarized once per active channel and stored in segment_summaries. Reports
+covering a range then merge the stored segments instead of summarizing every
+raw message at once, and only summarize from raw messages the segments that
+are still open or whose messages changed since.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timezone, timedelta
+from itertools import groupby
+
+from discord.ext import tasks
+
+import summarizer
+from db import from_ms
+from config import ROLLING_SEGMENT_MINUTES, ROLLING_LOOKBACK_HOURS
+from summary_backends import SummarizerError
+from summary_cache import content_hash
+
+logger = logging.getLogger(__name__)
+
+SEGMENT = timedelta(minutes=ROLLING_SEGMENT_MINUTES)
+SEGMENT_GRACE = timedelta(minutes=2)  # let late messages land before summarizing a segment
+# Attempts at a channel's segment before leaving it to the reports, which
+# then summarize it from its raw messages
+MAX_SEGMENT_ATTEMPTS = 3
+
+
+def segment_start(timestamp):
+    """Return the start of the segment containing `timestamp`."""
+    seconds = ROLLING_SEGMENT_MINUTES * 60
+    epoch = int(timestamp.timestamp()) // seconds * seconds
+    return datetime.fromtimestamp(epoch, timezone.utc)
+
+
+async def summarize_channel(store, messages, server_id, channel_name, start, end):
+    """Summarize a channel over a range, reusing stored segment summaries.
+
+    Args:
+        store: AsyncMessageStore
+        messages: (timestamp_ms, author, content) tuples in chronological order
+        server_id: Server of the channel
+        channel_name: Channel name
+        start: Start of the summarized range
+        end: End of the summarized range
+    """
+    plain = [(author, content) for _, author, content in messages]
+    cache_scope = (server_id, channel_name, start, end)
+    if ROLLING_SEGMENT_MINUTES <= 0 or not server_id or not messages:
+        return await summarizer.summarize(plain, channel_name, cache_scope)
+
+    stored = await store.get_segment_summaries(
+        server_id, channel_name, segment_start(start), end
+    )
+
+    # Walk the range segment by segment: a stored summary is reused when the
+    # segment's messages are unchanged, consecutive other segments are
+    # summarized together from their raw messages
+    parts = []
+    for segment, bucket in groupby(
+        messages, key=lambda m: segment_start(from_ms(m[0]))
+    ):
+        bucket = [(author, content) for _, author, content in bucket]
+        entry = stored.get(segment.isoformat())
+        if entry and entry[0] == content_hash(bucket):
+            parts.append(entry[1])
+        elif parts and isinstance(parts[-1], list):
+            parts[-1].extend(bucket)
+        else:
+            parts.append(bucket)
+
+    reused = sum(isinstance(part, str) for part in parts)
+    if not reused:
+        return await summarizer.summarize(plain, channel_name, cache_scope)
+
+    cache = summarizer.cache
+    if cache is not None:
+        cached = await cache.get(cache_scope, plain)
+        if cached is not None:
+            return cached
+
+    logger.info(
+        f"Merging {reused} precomputed segment(s) and {len(parts) - reused} raw part(s) for #{channel_name}"
+    )
+    try:
+        raw_runs = [part for part in parts if isinstance(part, list)]
+        raw_summaries = iter(
+            await asyncio.gather(
+                *(summarizer.generate_summary(run, channel_name) for run in raw_runs)
+            )
+        )
+        partials = [
+            next(raw_summaries) if isinstance(part, list) else part for part in parts
+        ]
+        summary = await summarizer.merge_summaries(partials, channel_name)
+    except SummarizerError as e:
+        logger.info(f"Summarizer error during summary generation: {e}")
+        return summarizer.SUMMARY_ERROR
+
+    if cache is not None:
+        await cache.put(cache_scope, plain, summary)
+    return summary
+
+
+class RollingSummaries:
+    """Background job summarizing every active channel as each segment closes."""
+
+    def __init__(self, store, backfill=None):
+        self.store = store
+        self.backfill = backfill
+        self.done_until = None  # every segment starting before this is summarized
+        # (segment start, server_id, channel_name) -> failed attempts
+        self.failures = {}
+
+    @tasks.loop(minutes=5)
+    async def run(self):
+        # Segments summarized mid-backfill would miss messages still being fetched
+        if self.backfill and self.backfill.running:
+            return
+
+        now = datetime.now(timezone.utc)
+        closed_until = segment_start(now - SEGMENT_GRACE)
+        lookback_start = segment_start(now - timedelta(hours=ROLLING_LOOKBACK_HOURS))
+        # Channels that failed in earlier runs are retried separately, so
+        # they don't hold back the other channels' segments
+        self.failures = {
+            key: attempts for key, attempts in self.failures.items() if key[0] >= lookback_start
+        }
+        retry = sorted(
+            {start for (start, _, _), attempts in self.failures.items() if attempts < MAX_SEGMENT_ATTEMPTS}
+        )
+
+        segment = self.done_until or lookback_start
+        while segment < closed_until:
+            try:
+                await self.summarize_segment(segment, segment + SEGMENT)
+            except Exception:
+                logger.exception(f"Rolling summary of segment {segment} failed")
+                break  # retry from this segment on the next run
+            segment += SEGMENT
+        self.done_until = segment
+
+        for start in retry:
+            try:
+                await self.summarize_segment(start, start + SEGMENT)
+            except Exception:
+                logger.exception(f"Rolling summary of segment {start} failed")
+
+    async def summarize_segment(self, start, end):
+        """Summarize every channel active in a segment and not summarized yet.
+
+        A channel that fails is tried again in the next runs, up to
+        MAX_SEGMENT_ATTEMPTS times (e.g. for a prompt the model keeps
+        rejecting); the reports then summarize that segment from its raw
+        messages.
+
+        Returns:
+            True if every channel was summarized
+        """
+        active = await self.store.get_active_channels_in_range(start, end)
+        done = await self.store.get_summarized_channels(start)
+        todo = sorted(
+            {
+                (server_id, channel_name)
+                for server_id, _, _, channel_name in active
+                if server_id
+                and (server_id, channel_name) not in done
+                and self.failures.get((start, server_id, channel_name), 0) < MAX_SEGMENT_ATTEMPTS
+            }
+        )
+        if not todo:
+            return True
+
+        logger.info(f"Rolling summaries for {len(todo)} channel(s) in segment {start}")
+        results = await asyncio.gather(
+            *(
+                self.summarize_channel_segment(server_id, channel_name, start, end)
+                for server_id, channel_name in todo
+            ),
+            return_exceptions=True,
+        )
+        failed = False
+        for (server_id, channel_name), result in zip(todo, results):
+            if not isinstance(result, Exception):
+                continue
+            failed = True
+            key = (start, server_id, channel_name)
+            self.failures[key] = self.failures.get(key, 0) + 1
+            if self.failures[key] < MAX_SEGMENT_ATTEMPTS:
+                logger.warning(f"Rolling summary of #{channel_name} failed in segment {start}: {result}")
+            else:
+                logger.error(
+                    f"Rolling summary of #{channel_name} failed {self.failures[key]} times in segment {start}, "
+                    f"giving up: {result}"
+                )
+        return not failed
+
+    async def summarize_channel_segment(self, server_id, channel_name, start, end):
+        messages = await self.store.get_messages_in_range(
+            start, end, channel_name=channel_name, server_id=server_id
+        )
+        if not messages:
+            return
+        summary = await summarizer.generate_summary(messages, channel_name)
+        await self.store.save_segment_summary(
+            server_id,
+            channel_name,
+            start,
+            end,
+            len(messages),
+            content_hash(messages),
+            summary,
+        )
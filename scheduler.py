@@ -1,157 +1,319 @@
-from discord.ext import tasks
-from datetime import datetime, timedelta, timezone
-from db import MessageStore
-from summarizer import summarize
+import asyncio
+import logging
+from datetime import date, datetime, timedelta, timezone
+import pytz
+from db import to_ms
+from delivery import delivery
+from summary_jobs import daily_report
 from utils import safe_send
-import discord
-from config import SUMMARY_CHANNEL, SUMMARY_HOUR
+import metrics
+from coordination import PROCESS_ID
+from config import (
+    SUMMARY_CHANNEL,
+    SUMMARY_HOUR,
+    SUMMARY_TIMEZONE,
+    GUILD_SCHEDULES,
+    SUMMARY_STAGGER_MINUTES,
+    SUMMARY_CATCHUP_HOURS,
+    SHARD_IDS,
+)
 
-store = MessageStore()
+logger = logging.getLogger(__name__)
+
+MAX_SLEEP = 300  # seconds; wake up regularly to pick up new guilds
+RETRY_DELAY = timedelta(minutes=15)  # before retrying a failed report
+CLAIM_TIMEOUT = timedelta(hours=1)  # an unsent claim older than this belongs to a dead process
 
 
 def get_midnight_utc():
     now = datetime.now(timezone.utc)
-    return datetime(now.year, now.month, now.day)
+    return datetime(now.year, now.month, now.day, tzinfo=timezone.utc)
 
 
-def get_summary_time_range():
-    """Return start and end datetime for summary period:
-    - Start: Beginning of previous day (00:00 yesterday)
-    - End: Current summary hour today
+def get_summary_time_range(report_date, hour=SUMMARY_HOUR, tz=timezone.utc):
+    """Return start and end datetime (UTC) of the report of `report_date`:
+    - Start: Beginning of the previous day (00:00 yesterday, local time)
+    - End: Summary hour on `report_date` (local time)
     """
-    now = datetime.now(timezone.utc)
-    yesterday = now - timedelta(days=1)
+    start_time = _local_time(report_date - timedelta(days=1), 0, tz)
+    end_time = _local_time(report_date, hour, tz)
+    return start_time, end_time
 
-    # Start of previous day (00:00 yesterday)
-    start_time = datetime(
-        yesterday.year, yesterday.month, yesterday.day, tzinfo=timezone.utc
-    )
 
-    # Current day up to summary hour
-    end_time = datetime(now.year, now.month, now.day, SUMMARY_HOUR, tzinfo=timezone.utc)
+def _local_time(day, hour, tz):
+    """Return `hour`:00 local time on `day` in `tz`, as a UTC datetime."""
+    naive = datetime(day.year, day.month, day.day, hour)
+    if hasattr(tz, "localize"):
+        local = tz.localize(naive)  # pytz zones need localize for DST
+    else:
+        local = naive.replace(tzinfo=tz)
+    return local.astimezone(timezone.utc)
 
-    return start_time, end_time
+
+class GuildSchedule:
+    """When the daily report of one guild is sent.
+
+    Reports fire at `hour` local time in `tz`, plus a fixed per-guild offset
+    (at most SUMMARY_STAGGER_MINUTES) so that guilds sharing an hour don't
+    all hit the database and the model at the same instant.
+    """
+
+    def __init__(self, guild_id, hour=SUMMARY_HOUR, tz_name=SUMMARY_TIMEZONE):
+        self.guild_id = str(guild_id)
+        self.hour = hour
+        self.tz = pytz.timezone(tz_name)
+        self.stagger = timedelta(seconds=int(guild_id) % (SUMMARY_STAGGER_MINUTES * 60 or 1))
+
+    @classmethod
+    def for_guild(cls, guild_id):
+        """Build the schedule of a guild from GUILD_SCHEDULES or the defaults."""
+        override = GUILD_SCHEDULES.get(str(guild_id))
+        if not override:
+            return cls(guild_id)
+        hour, _, tz_name = override.partition("@")
+        entry = f"GUILD_SCHEDULES entry {guild_id}={override}"
+        try:
+            hour = int(hour)
+        except ValueError:
+            raise ValueError(f"{entry}: the hour must be an integer") from None
+        if not 0 <= hour < 24:
+            raise ValueError(f"{entry}: the hour must be between 0 and 23")
+        try:
+            return cls(guild_id, hour, tz_name or SUMMARY_TIMEZONE)
+        except pytz.UnknownTimeZoneError:
+            raise ValueError(f"{entry}: unknown timezone {tz_name!r}") from None
+
+    def fire_time(self, report_date):
+        """Return when the report of `report_date` is due (UTC)."""
+        return _local_time(report_date, self.hour, self.tz) + self.stagger
+
+    def last_report_date(self, now):
+        """Return the date of the most recent report due at or before `now`."""
+        today = now.astimezone(self.tz).date()
+        if self.fire_time(today) <= now:
+            return today
+        return today - timedelta(days=1)
+
+    def next_fire_time(self, now):
+        """Return the first fire time strictly after `now`."""
+        return self.fire_time(self.last_report_date(now) + timedelta(days=1))
+
+    def time_range(self, report_date):
+        return get_summary_time_range(report_date, self.hour, self.tz)
+
+
+# Fail at startup rather than at report time on a malformed override
+for _guild_id in GUILD_SCHEDULES:
+    GuildSchedule.for_guild(_guild_id)
 
 
 class DailySummary:
-    def __init__(self, bot):
+    """Sends each guild its daily report at the guild's own time.
+
+    Instead of polling every minute, the scheduler computes the next fire time
+    of every guild and sleeps until the earliest one. A report is due once its
+    fire time has passed and it hasn't been recorded in daily_reports, so a
+    report missed while the bot was down or busy is sent on the next wake-up,
+    as long as it is less than SUMMARY_CATCHUP_HOURS late.
+
+    Each report is claimed in daily_reports before it is generated, so even
+    if two processes briefly both run the scheduler (during a leadership
+    handover), a report is only sent once.
+    """
+
+    def __init__(self, bot, store, summary_channels, queue=None):
         self.bot = bot
+        self.store = store
+        self.summary_channels = summary_channels
+        self.queue = queue  # SummaryQueue when reports are built by workers
+        if queue:
+            queue.on_result("daily", self.deliver_report)
+        self._task = None
+        self._running = set()  # guild IDs whose report is being generated
+        self._last_reports = {}  # guild ID -> date of the last report sent
+        self._retry_at = {}
+
+    def start(self):
+        """Start the scheduler loop if it isn't running yet."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self.run())
+
+    def stop(self):
+        """Stop scheduling reports. Reports already being generated finish."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def run(self):
+        await self.bot.wait_until_ready()
+        while True:
+            now = datetime.now(timezone.utc)
+            try:
+                wake_at = await self.start_due_reports(now)
+            except Exception:
+                logger.exception("Daily summary scheduler iteration failed")
+                wake_at = now + timedelta(minutes=1)
+            delay = (wake_at - datetime.now(timezone.utc)).total_seconds()
+            await asyncio.sleep(min(max(delay, 0), MAX_SLEEP))
 
-    @tasks.loop(minutes=1)
-    async def run_daily_summary(self):
-        now = datetime.now(timezone.utc)
-        if now.hour == SUMMARY_HOUR and now.minute == 0:  # à XXh00 UTC
-            start_time, end_time = get_summary_time_range()
-
-            # Get all servers with activity and process each separately
-            active_channels_all_servers = store.get_active_channels_in_range(
-                start_time, end_time
-            )
-
-            if not active_channels_all_servers:
-                # Try to find any summary channel to send "no activity" message
-                summary_channel = discord.utils.get(
-                    self.bot.get_all_channels(), name=SUMMARY_CHANNEL
+    async def start_due_reports(self, now):
+        """Start the reports that are due and return when the next one is.
+
+        Each report runs in its own task, so a slow guild never delays the
+        others or the next wake-up.
+        """
+        catchup = timedelta(hours=SUMMARY_CATCHUP_HOURS)
+        next_wake = now + timedelta(seconds=MAX_SLEEP)
+        for guild_id, guild_name in await self._guilds():
+            schedule = GuildSchedule.for_guild(guild_id)
+            next_wake = min(next_wake, schedule.next_fire_time(now))
+            if guild_id in self._running:
+                continue
+            retry_at = self._retry_at.get(guild_id)
+            if retry_at and retry_at > now:
+                next_wake = min(next_wake, retry_at)
+                continue
+
+            report_date = schedule.last_report_date(now)
+            late = now - schedule.fire_time(report_date)
+            if late > catchup or await self._already_sent(guild_id, report_date):
+                continue
+            if late > timedelta(minutes=1):
+                logger.info(
+                    f"Catching up the {report_date} report of {guild_name} ({late} late)"
                 )
-                if summary_channel:
-                    yesterday = now - timedelta(days=1)
-                    await summary_channel.send(
-                        f"📋 Aucune activité détectée du {yesterday.date()} au {now.date()} jusqu'à {SUMMARY_HOUR}h"
-                    )
-                return
+            self._running.add(guild_id)
+            asyncio.create_task(self._run_report(guild_id, guild_name, schedule, report_date))
+        return next_wake
 
-            # Group channels by server
-            servers = {}
-            for (
-                server_id,
-                server_name,
-                channel_id,
-                channel_name,
-            ) in active_channels_all_servers:
-                if server_id not in servers:
-                    servers[server_id] = {"name": server_name, "channels": []}
-                servers[server_id]["channels"].append(channel_name)
-
-            # Generate summaries for each server
-            for server_id, server_data in servers.items():
-                server_name = server_data["name"]
-                active_channels = server_data["channels"]
-
-                # Find summary channel for this specific server
-                summary_channel = None
-                for channel in self.bot.get_all_channels():
-                    if (
-                        channel.name == SUMMARY_CHANNEL
-                        and channel.guild
-                        and str(channel.guild.id) == server_id
-                    ):
-                        summary_channel = channel
-                        break
-
-                if not summary_channel:
-                    print(
-                        f"❌ Summary channel '{SUMMARY_CHANNEL}' not found on server {server_name}!"
-                    )
-                    continue
-
-                # Generate per-channel summaries for this server
-                summaries = []
-                total_messages = 0
-                yesterday = now - timedelta(days=1)
-
-                # Send initial thinking message
-                thinking_msg = None
-                if summary_channel:
-                    thinking_msg = await summary_channel.send(
-                        f"⚙️ Génération des résumés quotidiens pour {len(active_channels)} canaux sur {server_name}..."
-                    )
+    async def _guilds(self):
+        """Return (guild_id, guild_name) of every guild to report on.
 
-                for i, channel_name in enumerate(active_channels):
-                    messages = store.get_messages_in_range(
-                        start_time,
-                        end_time,
-                        channel_name=channel_name,
-                        server_id=server_id,
+        A process connected to some of the shards only sees their guilds; the
+        guilds of the other shards come from the shared database.
+        """
+        guilds = {str(guild.id): guild.name for guild in self.bot.guilds}
+        if SHARD_IDS:
+            # Overrides may have been set through another process
+            await self.summary_channels.load_overrides()
+            for server_id, server_name in await self.store.get_servers():
+                guilds.setdefault(server_id, server_name)
+        return list(guilds.items())
+
+    async def _already_sent(self, guild_id, report_date):
+        if guild_id not in self._last_reports:
+            last = await self.store.get_last_report_date(guild_id)
+            self._last_reports[guild_id] = date.fromisoformat(last) if last else None
+        last = self._last_reports[guild_id]
+        return last is not None and last >= report_date
+
+    async def _run_report(self, guild_id, guild_name, schedule, report_date):
+        try:
+            if not await self.store.claim_daily_report(
+                guild_id, report_date, PROCESS_ID, CLAIM_TIMEOUT
+            ):
+                # Sent or being generated by another process: check again later
+                self._last_reports.pop(guild_id, None)
+                self._retry_at[guild_id] = datetime.now(timezone.utc) + RETRY_DELAY
+                return
+            payload = self._report_payload(guild_id, guild_name, schedule, report_date)
+            try:
+                if self.queue:
+                    # A worker builds the report; deliver_report posts it
+                    await self.queue.submit(
+                        "daily", payload, dedupe_key=f"daily:{guild_id}:{report_date}"
                     )
-                    if messages:
-                        total_messages += len(messages)
-                        # Update progress
-                        if thinking_msg:
-                            try:
-                                await thinking_msg.edit(
-                                    content=f"⚙️ Génération des résumés quotidiens... ({i+1}/{len(active_channels)}) #{channel_name}"
-                                )
-                            except:
-                                pass  # Message might have been deleted
-                        # Get category information for this channel from channel_meta
-                        _, category_name_cat = store.get_channel_category(
-                            channel_name=channel_name, server_id=server_id
-                        )
-                        category_display = (
-                            f" [{category_name_cat}]" if category_name_cat else ""
-                        )
-
-                        summary = summarize(messages, channel_name)
-                        summaries.append(
-                            f"**#{channel_name}**{category_display} ({len(messages)} messages):\n{summary}"
-                        )
-
-                # Delete thinking message
-                if thinking_msg:
-                    try:
-                        await thinking_msg.delete()
-                    except:
-                        pass
-
-                if summaries:
-                    header = f"📋 Résumé du {yesterday.date()} au {now.date()} jusqu'à {SUMMARY_HOUR}h sur **{server_name}** ({total_messages} messages sur {len(active_channels)} canaux) :\n\n"
-                    full_summary = header + "\n\n---\n\n".join(summaries)
-
-                    # Use safe_send to handle long messages
-                    await safe_send(summary_channel, full_summary)
-                else:
-                    await summary_channel.send(
-                        f"📋 Aucun message à résumer du {yesterday.date()} au {now.date()} jusqu'à {SUMMARY_HOUR}h sur {server_name}"
+                    return
+                with metrics.daily_summary_seconds.time(server=guild_name):
+                    await self._post_daily_report(payload)
+            except Exception:
+                await self.store.release_daily_report(guild_id, report_date, PROCESS_ID)
+                raise
+            await self._report_sent(guild_id, report_date)
+        except Exception:
+            metrics.daily_summary_failures.inc(server=guild_name)
+            logger.exception("Daily summary failed for server %s", guild_name)
+            self._retry_at[guild_id] = datetime.now(timezone.utc) + RETRY_DELAY
+        finally:
+            self._running.discard(guild_id)
+
+    async def _report_sent(self, guild_id, report_date):
+        await self.store.save_daily_report(guild_id, report_date)
+        self._last_reports[guild_id] = report_date
+        self._retry_at.pop(guild_id, None)
+
+    def _report_payload(self, server_id, server_name, schedule, report_date):
+        """Describe the daily report of `report_date` for one server (see summary_jobs.daily_report)."""
+        start_time, end_time = schedule.time_range(report_date)
+        return {
+            "server_id": server_id,
+            "server_name": server_name,
+            "report_date": report_date.isoformat(),
+            "start_ms": to_ms(start_time),
+            "end_ms": to_ms(end_time),
+            "period": f"du {report_date - timedelta(days=1)} au {report_date} jusqu'à {schedule.hour}h",
+            "claimed_by": PROCESS_ID,
+        }
+
+    async def _post_daily_report(self, payload):
+        """Generate and post a daily report in this process."""
+        server_id = payload["server_id"]
+
+        # Find summary channel for this specific server
+        summary_channel = await self.summary_channels.resolve(server_id)
+        if not summary_channel:
+            logger.error(f"Summary channel '{SUMMARY_CHANNEL}' not found on server {payload['server_name']}")
+            return
+
+        thinking_msg = None
+
+        async def progress(done, total, channel_name):
+            nonlocal thinking_msg
+            if thinking_msg is None:
+                # Send initial thinking message, edited at a bounded rate below
+                thinking_msg = delivery.progress(
+                    await safe_send(
+                        summary_channel,
+                        f"⚙️ Génération des résumés quotidiens pour {total} canaux sur {payload['server_name']}...",
                     )
+                )
+            else:
+                thinking_msg.update(
+                    f"⚙️ Génération des résumés quotidiens... ({done}/{total}) #{channel_name}"
+                )
+
+        try:
+            report = await daily_report(self.store, payload, progress)
+        finally:
+            # Delete thinking message
+            if thinking_msg is not None:
+                await thinking_msg.delete()
+
+        # Use safe_send to handle long messages (None: no activity, nothing to post)
+        if report is not None:
+            await safe_send(summary_channel, report)
+
+    async def deliver_report(self, job):
+        """Post a daily report built by a summary worker (SummaryQueue handler)."""
+        payload = job["payload"]
+        server_id, server_name = payload["server_id"], payload["server_name"]
+        report_date = date.fromisoformat(payload["report_date"])
+
+        if job["status"] == "failed":
+            metrics.daily_summary_failures.inc(server=server_name)
+            logger.error(f"Daily summary failed for server {server_name}: {job['error']}")
+            await self.store.release_daily_report(server_id, report_date, payload["claimed_by"])
+            self._retry_at[server_id] = datetime.now(timezone.utc) + RETRY_DELAY
+            return
 
-            # Note: We don't clear messages anymore to maintain history
+        # No result: the server had no activity, there is nothing to post
+        if job["result"] is not None:
+            summary_channel = await self.summary_channels.resolve(server_id)
+            if summary_channel:
+                await safe_send(summary_channel, job["result"])
+            else:
+                logger.error(f"Summary channel '{SUMMARY_CHANNEL}' not found on server {server_name}")
+        await self._report_sent(server_id, report_date)
+        metrics.daily_summary_seconds.observe(
+            (to_ms(datetime.now(timezone.utc)) - job["created_at_ms"]) / 1000, server=server_name
+        )
@@ -0,0 +1,173 @@
+"""Full-text search of the stored history, for the /search command.
+
+Results come from the FTS5 index of the messages (see
+MessageStore.search_messages), ranked by relevance and shown
+SEARCH_PAGE_SIZE at a time, with buttons to move between pages. Only the
+channels the searching member can read are searched, including archived
+threads, checked against their parent channel.
+"""
+
+import logging
+
+import discord
+
+from config import SEARCH_PAGE_SIZE
+from db import from_ms
+
+logger = logging.getLogger(__name__)
+
+SNIPPET_MAX_CHARS = 250
+# Discord's limit on the length of a message
+MAX_PAGE_CHARS = 2000
+
+# Thread ID -> (parent channel ID, private) of the threads discord.py doesn't
+# cache (archived threads), fetched once; None for deleted channels
+_thread_parents = {}
+
+
+def _can_read(member, channel, private=False):
+    permissions = channel.permissions_for(member)
+    # Private threads are only listed to their members and moderators
+    return permissions.read_message_history and (not private or permissions.manage_threads)
+
+
+async def readable_channel_ids(guild, member, store):
+    """Return the IDs of the channels and threads of `guild` that `member` can read.
+
+    Archived threads aren't in the guild's cache, so stored channel IDs
+    unknown to it are fetched once and checked against their parent channel.
+    """
+    readable = {
+        str(channel.id)
+        for channel in [*guild.text_channels, *guild.threads]
+        if channel.permissions_for(member).read_message_history
+    }
+    known = {str(channel.id) for channel in [*guild.text_channels, *guild.threads]}
+    for channel_id in await store.get_channel_ids(str(guild.id)):
+        if channel_id in known:
+            continue
+        if channel_id not in _thread_parents:
+            try:
+                channel = await guild.fetch_channel(int(channel_id))
+            except discord.NotFound:
+                _thread_parents[channel_id] = None
+                continue
+            except discord.HTTPException as e:
+                logger.warning(f"Could not fetch channel {channel_id} of {guild}: {e}")
+                continue
+            parent_id = getattr(channel, "parent_id", None)
+            _thread_parents[channel_id] = (
+                (parent_id, channel.type == discord.ChannelType.private_thread) if parent_id else None
+            )
+        if _thread_parents[channel_id] is None:
+            continue
+        parent_id, private = _thread_parents[channel_id]
+        parent = guild.get_channel(parent_id)
+        if parent is not None and _can_read(member, parent, private):
+            readable.add(channel_id)
+    return sorted(readable)
+
+
+def format_results(guild_id, query, description, rows, page):
+    """Return the text of a page of results, at most MAX_PAGE_CHARS long."""
+    if not rows:
+        if page == 0:
+            return f"🔎 Aucun message trouvé pour « {query} »{description}."[:MAX_PAGE_CHARS]
+        return f"🔎 Plus de résultats pour « {query} »{description}."[:MAX_PAGE_CHARS]
+
+    header = f"🔎 Résultats pour « {query} »{description} (page {page + 1}) :"
+    results = []
+    for rank, (timestamp_ms, channel_id, channel_name, author, snippet, message_id) in enumerate(
+        rows, start=page * SEARCH_PAGE_SIZE + 1
+    ):
+        link = (
+            f" [↗](<https://discord.com/channels/{guild_id}/{channel_id}/{message_id}>)"
+            if message_id
+            else ""
+        )
+        results.append(
+            (
+                f"**{rank}.** #{channel_name} · {author} · {from_ms(timestamp_ms):%Y-%m-%d %H:%M} UTC{link}",
+                " ".join(snippet.split()),
+            )
+        )
+
+    # Shorten the snippets until the page fits in one message
+    snippet_chars = SNIPPET_MAX_CHARS
+    while True:
+        lines = [header]
+        for title, snippet in results:
+            if len(snippet) > snippet_chars:
+                snippet = snippet[: max(snippet_chars - 1, 0)] + "…"
+            lines.append(f"{title}\n> {snippet}")
+        text = "\n".join(lines)
+        if len(text) <= MAX_PAGE_CHARS or snippet_chars == 0:
+            return text[:MAX_PAGE_CHARS]
+        excess = len(text) - MAX_PAGE_CHARS
+        snippet_chars = max(snippet_chars - (excess // len(results) + 1), 0)
+
+
+class SearchResults(discord.ui.View):
+    """One page of search results, with buttons to the previous and next pages.
+
+    Args:
+        store: Store to search
+        guild_id: Server searched
+        user_id: Member who searched; only they can turn the pages
+        query: Search terms
+        filters: Keyword arguments of search_messages (channels, author, dates)
+        description: Text describing the filters, for the header
+    """
+
+    def __init__(self, store, guild_id, user_id, query, filters, description=""):
+        super().__init__(timeout=600)
+        self.store = store
+        self.guild_id = guild_id
+        self.user_id = user_id
+        self.query = query
+        self.filters = filters
+        self.description = description
+        self.page = 0
+
+    async def render(self):
+        """Fetch the current page and return its text."""
+        # One extra row tells whether there is a next page
+        rows = await self.store.search_messages(
+            self.query,
+            self.guild_id,
+            limit=SEARCH_PAGE_SIZE + 1,
+            offset=self.page * SEARCH_PAGE_SIZE,
+            **self.filters,
+        )
+        self.previous_page.disabled = self.page == 0
+        self.next_page.disabled = len(rows) <= SEARCH_PAGE_SIZE
+        return format_results(
+            self.guild_id, self.query, self.description, rows[:SEARCH_PAGE_SIZE], self.page
+        )
+
+    async def interaction_check(self, interaction):
+        if interaction.user.id != self.user_id:
+            await interaction.response.send_message(
+                "⚠️ Seul l'auteur de la recherche peut changer de page.", ephemeral=True
+            )
+            return False
+        return True
+
+    async def show_page(self, interaction, page):
+        self.page = page
+        try:
+            await interaction.response.edit_message(content=await self.render(), view=self)
+        except Exception as e:
+            logger.exception("Unexpected error while turning a /search page")
+            if not interaction.response.is_done():
+                await interaction.response.send_message(
+                    f"⚠️ Une erreur inattendue est survenue : {str(e)}", ephemeral=True
+                )
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction, button):
+        await self.show_page(interaction, max(self.page - 1, 0))
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction, button):
+        await self.show_page(interaction, self.page + 1)
@@ -1,43 +1,278 @@
+import asyncio
+import contextvars
 import logging
-from openai import OpenAI
-from openai._exceptions import OpenAIError
-from config import OPENAI_API_KEY
+from contextlib import contextmanager
+
+from batch_summaries import create_batch_client
+from compaction import compact
+from config import (
+    SUMMARY_CONCURRENCY,
+    SUMMARY_CHUNK_TOKENS,
+    SUMMARY_CHUNK_FANOUT,
+    SUMMARY_MAX_INPUT_TOKENS,
+)
+from llm_client import LLMClient
+from summary_backends import SummarizerError, create_backend
 
-client = OpenAI(api_key=OPENAI_API_KEY)
 logger = logging.getLogger(__name__)
 
+# Bounds the number of model calls in flight across all channels and servers
+_llm_slots = asyncio.Semaphore(SUMMARY_CONCURRENCY)
+
+SUMMARY_ERROR = "⚠️ Impossible de générer le résumé pour l'instant (erreur du modèle)."
+
+# Backend generating the summaries, created on first use (see use_backend),
+# and the LLMClient throttling and retrying its calls
+backend = None
+client = None
+
+# BatchClient collecting the calls of the daily reports (see batched_calls)
+batch_client = None
+_batching = contextvars.ContextVar("batching", default=False)
+
+# Optional SummaryCache consulted before generating a summary (see use_cache)
+cache = None
+
+
+def use_cache(summary_cache):
+    """Make summarize read from and write to `summary_cache`."""
+    global cache
+    cache = summary_cache
+
+
+def use_backend(summary_backend):
+    """Generate summaries with `summary_backend` instead of SUMMARY_BACKEND."""
+    global backend, client
+    backend = summary_backend
+    client = LLMClient(summary_backend)
+
+
+def get_backend():
+    """Return the summarizer backend, creating the configured one if needed."""
+    if backend is None:
+        use_backend(create_backend())
+    return backend
+
+
+def get_client():
+    """Return the LLMClient calling the summarizer backend."""
+    get_backend()
+    return client
+
+
+@contextmanager
+def batched_calls():
+    """Send the model calls made in this block, and in the tasks it starts, through the batch API.
+
+    Calls wait for their batch instead of a summarizer slot; a batch
+    missing its deadline falls back to the direct client (see
+    batch_summaries).
+    """
+    global batch_client
+    if batch_client is None:
+        batch_client = create_batch_client(get_client(), slots=_llm_slots)
+    token = _batching.set(True)
+    try:
+        yield
+    finally:
+        _batching.reset(token)
+
+
+CHARS_PER_TOKEN = 4
+# Per-channel input budget, in characters, for reads that can't count tokens
+MAX_INPUT_CHARS = SUMMARY_MAX_INPUT_TOKENS * CHARS_PER_TOKEN
+
+
+def estimate_tokens(text):
+    """Rough token count (about 4 characters per token), good enough for budgeting."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+async def read_within_budget(rows, max_tokens=SUMMARY_MAX_INPUT_TOKENS):
+    """Consume message rows, newest first, until the token budget is reached.
+
+    Reading stops at the first message over budget and `rows` is closed, so
+    older messages are never fetched from the database.
+
+    Args:
+        rows: Async iterator of (timestamp, author, content), newest first
+        max_tokens: Input token budget
+
+    Returns:
+        Tuple (messages in chronological order, truncated)
+    """
+    kept = []
+    used = 0
+    truncated = False
+    try:
+        async for row in rows:
+            cost = estimate_tokens(f"{row[1]}: {row[2]}")
+            if kept and used + cost > max_tokens:
+                truncated = True
+                break
+            kept.append(row)
+            used += cost
+    finally:
+        await rows.aclose()
+    kept.reverse()
+    return kept, truncated
+
+
+def chunk_lines(lines, max_tokens):
+    """Split conversation lines into consecutive windows of at most `max_tokens`.
+
+    A single line larger than the budget is truncated to fit in its own window.
+    """
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    windows = []
+    current = []
+    current_tokens = 0
+    for line in lines:
+        if len(line) > max_chars:
+            line = line[: max_chars - 20] + "... [tronqué]"
+        line_tokens = estimate_tokens(line)
+        if current and current_tokens + line_tokens > max_tokens:
+            windows.append(current)
+            current = []
+            current_tokens = 0
+        current.append(line)
+        current_tokens += line_tokens
+    if current:
+        windows.append(current)
+    return windows
 
-def summarize(messages, channel_name=None):
-    logger.info(f"Starting summarize for {len(messages) if messages else 0} messages from channel: {channel_name or 'unknown'}")
-    
-    if not messages:
-        logger.info("No messages to summarize, returning early")
-        return "Aucun message à résumer aujourd'hui."
 
-    text = "\n".join([f"{author}: {content}" for author, content in messages])
-    logger.info(f"Prepared text for summarization ({len(text)} characters)")
+async def _complete(prompt, channel_name=None):
+    """Run one LLM call and return the generated text."""
+    if _batching.get():
+        completion = await batch_client.complete(prompt, max_output_tokens=1000, channel_name=channel_name)
+        return completion.text
+    llm = get_client()
+    async with _llm_slots:
+        logger.info(
+            f"Calling {llm.name} backend for summary generation (~{estimate_tokens(prompt)} tokens)"
+        )
+        completion = await llm.complete(prompt, max_output_tokens=1000, channel_name=channel_name)
+    return completion.text
+
+
+def _channel_context(channel_name):
+    return f" du canal #{channel_name}" if channel_name else ""
 
-    channel_context = f" du canal #{channel_name}" if channel_name else ""
 
-    prompt = f"""
-    Voici une conversation Discord{channel_context} de la journée :
+def _conversation_prompt(text, channel_name):
+    return f"""
+    Voici une conversation Discord{_channel_context(channel_name)} de la journée :
     {text}
 
     Résume cette discussion de façon claire et concise (en français).
     """
 
-    try:
-        logger.info("Calling OpenAI API for summary generation")
-        response = client.responses.create(
-            model="gpt-5-mini",
-            input=prompt,
-            max_output_tokens=1000,
+
+def _window_prompt(text, index, count, channel_name):
+    return f"""
+    Voici la partie {index + 1}/{count} d'une conversation Discord{_channel_context(channel_name)} :
+    {text}
+
+    Résume cette partie de la discussion de façon claire et concise (en français).
+    """
+
+
+def _merge_prompt(summaries, channel_name):
+    parts = "\n\n".join(
+        f"--- Partie {i + 1} ---\n{summary}" for i, summary in enumerate(summaries)
+    )
+    return f"""
+    Voici des résumés successifs d'une conversation Discord{_channel_context(channel_name)}, dans l'ordre chronologique :
+    {parts}
+
+    Fusionne-les en un seul résumé clair et concis (en français), sans répétitions.
+    """
+
+
+async def merge_summaries(partials, channel_name=None):
+    """Merge successive partial summaries into one.
+
+    At most SUMMARY_CHUNK_FANOUT summaries are merged per call; larger inputs
+    are merged in several levels, each level running its calls concurrently.
+    """
+    while len(partials) > 1:
+        groups = [
+            partials[i : i + SUMMARY_CHUNK_FANOUT]
+            for i in range(0, len(partials), SUMMARY_CHUNK_FANOUT)
+        ]
+        partials = await asyncio.gather(
+            *(
+                _complete(_merge_prompt(group, channel_name), channel_name)
+                for group in groups
+            )
+        )
+    return partials[0]
+
+
+async def generate_summary(messages, channel_name=None):
+    """Generate a summary of (author, content) tuples, without caching.
+
+    Raises:
+        SummarizerError: if a model call fails
+    """
+    messages = compact(messages, channel_name)
+    if not messages:
+        return "Aucun message à résumer."
+
+    lines = [f"{author}: {content}" for author, content in messages]
+    windows = chunk_lines(lines, SUMMARY_CHUNK_TOKENS)
+    logger.info(
+        f"Prepared text for summarization ({sum(len(line) for line in lines)} characters, {len(windows)} window(s))"
+    )
+
+    if len(windows) == 1:
+        return await _complete(
+            _conversation_prompt("\n".join(windows[0]), channel_name), channel_name
         )
-        # ⚡ Use the Responses API format
-        summary = response.output_text.strip()
+
+    # Map: summarize every window concurrently, then reduce the partials
+    partials = await asyncio.gather(
+        *(
+            _complete(
+                _window_prompt("\n".join(window), i, len(windows), channel_name),
+                channel_name,
+            )
+            for i, window in enumerate(windows)
+        )
+    )
+    return await merge_summaries(partials, channel_name)
+
+
+async def summarize(messages, channel_name=None, cache_scope=None):
+    """Summarize a list of (author, content) tuples.
+
+    Args:
+        messages: Messages to summarize, in chronological order
+        channel_name: Channel name given to the model as context
+        cache_scope: Optional (server_id, channel, range_start, range_end) tuple;
+            when set and a cache is configured, a summary already generated for
+            the same messages is returned without calling the model.
+    """
+    logger.info(f"Starting summarize for {len(messages) if messages else 0} messages from channel: {channel_name or 'unknown'}")
+    
+    if not messages:
+        logger.info("No messages to summarize, returning early")
+        return "Aucun message à résumer aujourd'hui."
+
+    use_cached = cache is not None and cache_scope is not None
+    if use_cached:
+        cached = await cache.get(cache_scope, messages)
+        if cached is not None:
+            return cached
+
+    try:
+        summary = await generate_summary(messages, channel_name)
         logger.info(f"Successfully generated summary ({len(summary)} characters)")
+        if use_cached:
+            await cache.put(cache_scope, messages, summary)
         return summary
 
-    except OpenAIError as e:
-        logger.info(f"OpenAI API error during summary generation: {e}")
-        return "⚠️ Impossible de générer le résumé pour l'instant (erreur OpenAI)."
+    except SummarizerError as e:
+        logger.info(f"Summarizer error during summary generation: {e}")
+        return SUMMARY_ERROR
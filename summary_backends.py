@@ -0,0 +1,175 @@
+"""Summarizer backends: the model that turns a prompt into a summary.
+
+A backend is any object with an async `complete(prompt, max_output_tokens)`
+method returning a Completion and raising SummarizerError on failure
+(`retryable` when trying again may succeed). SUMMARY_BACKEND selects the one
+built by `create_backend`; the summarizer calls it through an LLMClient
+(llm_client.py), which adds throttling, retries and a circuit breaker:
+
+- "openai": the OpenAI Responses API (SUMMARY_MODEL)
+- "simulated": an offline stand-in with configurable latency, throughput and
+  error rate, for load tests of the summary pipeline without an API key
+"""
+
+import asyncio
+import logging
+import random
+from collections import namedtuple
+
+from openai import (
+    APIConnectionError,
+    APIStatusError,
+    AsyncOpenAI,
+    InternalServerError,
+    OpenAIError,
+    RateLimitError,
+)
+
+from config import (
+    OPENAI_API_KEY,
+    SUMMARY_BACKEND,
+    SUMMARY_MODEL,
+    SIMULATED_LATENCY_MS,
+    SIMULATED_TOKENS_PER_SECOND,
+    SIMULATED_OUTPUT_TOKENS,
+    SIMULATED_ERROR_RATE,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class SummarizerError(Exception):
+    """A backend failed to generate a summary.
+
+    Args:
+        retryable: True if the same call may succeed later (rate limit, timeout, 5xx)
+        retry_after: Seconds the server asked us to wait, if it said so
+    """
+
+    def __init__(self, message, retryable=False, retry_after=None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.retry_after = retry_after
+
+
+# Generated text and the tokens billed for it
+Completion = namedtuple("Completion", ["text", "input_tokens", "output_tokens"])
+
+
+def _retry_after(error):
+    """Return the delay requested by a rejected OpenAI call, in seconds, or None."""
+    headers = error.response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+class OpenAIBackend:
+    """Generates summaries with the OpenAI Responses API."""
+
+    name = "openai"
+
+    def __init__(self, api_key=OPENAI_API_KEY, model=SUMMARY_MODEL):
+        # One async client for the process: its HTTP connections are reused
+        # across calls. Retries are left to LLMClient.
+        self.client = AsyncOpenAI(api_key=api_key, max_retries=0)
+        self.model = model
+
+    async def complete(self, prompt, max_output_tokens=1000):
+        try:
+            response = await self.client.responses.create(
+                model=self.model,
+                input=prompt,
+                max_output_tokens=max_output_tokens,
+            )
+        except RateLimitError as e:
+            # An exhausted quota won't come back by waiting
+            retryable = e.code != "insufficient_quota"
+            raise SummarizerError(str(e), retryable, _retry_after(e)) from e
+        except (APIConnectionError, InternalServerError) as e:
+            raise SummarizerError(str(e), retryable=True) from e
+        except APIStatusError as e:
+            raise SummarizerError(str(e), e.status_code in (408, 409), _retry_after(e)) from e
+        except OpenAIError as e:
+            raise SummarizerError(str(e)) from e
+        # ⚡ Use the Responses API format
+        usage = response.usage
+        return Completion(
+            response.output_text.strip(),
+            usage.input_tokens if usage else len(prompt) // 4 + 1,
+            usage.output_tokens if usage else 0,
+        )
+
+
+class SimulatedBackend:
+    """Offline stand-in that waits like a model would and returns filler text.
+
+    Each call sleeps for a fixed latency (jittered with a long tail) plus the
+    time needed to read the prompt and write `output_tokens` at
+    `tokens_per_second`, then fails with probability `error_rate` (with a
+    retryable error, like a rate limit or a timeout would).
+
+    Args:
+        latency_ms: Median time to first token, in milliseconds
+        tokens_per_second: Generation throughput
+        output_tokens: Length of the generated summaries
+        error_rate: Fraction of calls failing with SummarizerError
+        seed: Seed for reproducible runs
+    """
+
+    name = "simulated"
+    PROMPT_SPEEDUP = 50  # prompt tokens are read this much faster than generated
+
+    def __init__(
+        self,
+        latency_ms=SIMULATED_LATENCY_MS,
+        tokens_per_second=SIMULATED_TOKENS_PER_SECOND,
+        output_tokens=SIMULATED_OUTPUT_TOKENS,
+        error_rate=SIMULATED_ERROR_RATE,
+        seed=None,
+    ):
+        self.latency = latency_ms / 1000
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.calls = 0
+        self.errors = 0
+
+    def delay(self, prompt_tokens, output_tokens):
+        """Return the simulated duration of a call, in seconds."""
+        jitter = self.rng.lognormvariate(0, 0.5)
+        generation = (
+            prompt_tokens / self.PROMPT_SPEEDUP + output_tokens
+        ) / self.tokens_per_second
+        return self.latency * jitter + generation
+
+    async def complete(self, prompt, max_output_tokens=1000):
+        self.calls += 1
+        prompt_tokens = len(prompt) // 4 + 1
+        output_tokens = min(self.output_tokens, max_output_tokens)
+        await asyncio.sleep(self.delay(prompt_tokens, output_tokens))
+        if self.rng.random() < self.error_rate:
+            self.errors += 1
+            raise SummarizerError("simulated backend error", retryable=True)
+        text = f"Résumé simulé ({prompt_tokens} tokens lus). " + " ".join(["bla"] * output_tokens)
+        return Completion(text, prompt_tokens, output_tokens)
+
+
+BACKENDS = {
+    "openai": OpenAIBackend,
+    "simulated": SimulatedBackend,
+}
+
+
+def create_backend(name=SUMMARY_BACKEND):
+    """Build the backend registered under `name` (see BACKENDS)."""
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown SUMMARY_BACKEND {name!r}, expected one of {list(BACKENDS)}")
+    logger.info(f"Using {name} summarizer backend")
+    return BACKENDS[name]()
@@ -0,0 +1,88 @@
+"""Persistent cache of generated summaries, stored in the summaries table."""
+
+import hashlib
+import logging
+from datetime import timedelta
+
+from config import SUMMARY_CACHE_MAX_ENTRIES, SUMMARY_CACHE_TTL_HOURS
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(messages):
+    """Return a stable hash of a list of (author, content) tuples."""
+    digest = hashlib.sha256()
+    for author, content in messages:
+        digest.update(f"{author}\x00{content or ''}\x1e".encode())
+    return digest.hexdigest()
+
+
+class SummaryCache:
+    """Looks up and stores summaries keyed on channel, range and input hash.
+
+    The key uses the start of the range but not its end: ranges like "today
+    until now" end at a different instant on every request, and the content
+    hash already tells whether the messages in the range changed. Entries
+    expire after `ttl` and the least recently used ones are evicted beyond
+    `max_entries`.
+    """
+
+    def __init__(
+        self,
+        store,
+        max_entries=SUMMARY_CACHE_MAX_ENTRIES,
+        ttl=timedelta(hours=SUMMARY_CACHE_TTL_HOURS),
+    ):
+        self.store = store
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(server_id, channel, range_start, digest):
+        raw = f"{server_id}|{channel}|{range_start.isoformat()}|{digest}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    async def get(self, scope, messages):
+        """Return the cached summary for these messages, or None.
+
+        Args:
+            scope: Tuple (server_id, channel, range_start, range_end)
+            messages: The (author, content) tuples to summarize
+        """
+        server_id, channel, range_start, _ = scope
+        cache_key = self.key(server_id, channel, range_start, content_hash(messages))
+        summary = await self.store.get_cached_summary(cache_key, self.ttl)
+        if summary is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            logger.info(
+                f"Summary cache hit for #{channel} ({self.hits} hits, {self.misses} misses)"
+            )
+        return summary
+
+    async def put(self, scope, messages, summary):
+        """Store a freshly generated summary."""
+        server_id, channel, range_start, range_end = scope
+        digest = content_hash(messages)
+        await self.store.put_cached_summary(
+            self.key(server_id, channel, range_start, digest),
+            summary,
+            server_id,
+            channel,
+            range_start,
+            range_end,
+            digest,
+            self.max_entries,
+            self.ttl,
+        )
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
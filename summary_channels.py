@@ -0,0 +1,129 @@
+"""Where each guild's daily report is posted.
+
+SummaryChannels keeps a map from guild ID to summary channel, built when the
+bot is ready and updated by the guild and channel events, so the scheduler
+finds a guild's channel in constant time instead of walking every channel
+the bot can see. A guild posts to its override channel when one is stored
+in summary_channel_overrides (set with /summary_channel), and otherwise to
+the channel named SUMMARY_CHANNEL.
+"""
+
+import asyncio
+import logging
+
+import discord
+
+from config import SUMMARY_CHANNEL
+
+logger = logging.getLogger(__name__)
+
+
+class SummaryChannels:
+    """Index of the summary channel of every guild the bot is connected to."""
+
+    def __init__(self, bot, store):
+        self.bot = bot
+        self.store = store
+        self._channels = {}  # guild ID -> summary channel
+        self._overrides = {}  # guild ID -> channel ID
+        self._loaded = asyncio.Event()
+
+    async def load(self):
+        """Read the overrides and index every guild. Call on ready."""
+        self._overrides = await self.store.get_summary_channel_overrides()
+        self._channels = {}
+        for guild in self.bot.guilds:
+            self.index_guild(guild)
+        logger.info(
+            f"Indexed summary channels of {len(self._channels)}/{len(self.bot.guilds)} servers"
+        )
+        self._loaded.set()
+
+    async def load_overrides(self):
+        """Read the overrides again, e.g. when another process may have changed them."""
+        overrides = await self.store.get_summary_channel_overrides()
+        changed = {
+            guild_id
+            for guild_id in overrides.keys() | self._overrides.keys()
+            if overrides.get(guild_id) != self._overrides.get(guild_id)
+        }
+        self._overrides = overrides
+        for guild_id in changed:
+            guild = self.bot.get_guild(int(guild_id))
+            if guild:
+                self.index_guild(guild)
+
+    def get(self, guild_id):
+        """Return the summary channel of a guild of this process, or None."""
+        return self._channels.get(str(guild_id))
+
+    async def resolve(self, guild_id):
+        """Return the summary channel of any guild, or None.
+
+        Guilds on the shards of another process are not indexed here: their
+        channels are looked up over REST, which any process can use.
+        """
+        await self._loaded.wait()
+        guild_id = str(guild_id)
+        if guild_id in self._channels or self.bot.get_guild(int(guild_id)):
+            return self._channels.get(guild_id)
+        try:
+            guild = await self.bot.fetch_guild(int(guild_id))
+            channels = await guild.fetch_channels()
+        except discord.HTTPException as e:
+            logger.warning(f"Could not fetch the channels of server {guild_id}: {e}")
+            return None
+        return self._pick(guild_id, channels)
+
+    async def set_override(self, guild, channel):
+        """Post the reports of `guild` to `channel`, or back to SUMMARY_CHANNEL if None."""
+        guild_id = str(guild.id)
+        await self.store.set_summary_channel_override(
+            guild_id, channel.id if channel else None
+        )
+        if channel:
+            self._overrides[guild_id] = channel.id
+        else:
+            self._overrides.pop(guild_id, None)
+        self.index_guild(guild)
+
+    def _pick(self, guild_id, channels):
+        override = self._overrides.get(guild_id)
+        if override:
+            channel = discord.utils.get(channels, id=override)
+            if channel:
+                return channel
+            logger.warning(
+                f"Summary channel override {override} of server {guild_id} no longer exists"
+            )
+        return discord.utils.get(channels, name=SUMMARY_CHANNEL)
+
+    # ----------------------
+    # Event handlers
+    # ----------------------
+    def index_guild(self, guild):
+        """(Re)compute the summary channel of one guild."""
+        channel = self._pick(str(guild.id), guild.channels)
+        if channel:
+            self._channels[str(guild.id)] = channel
+        else:
+            self._channels.pop(str(guild.id), None)
+
+    def forget_guild(self, guild):
+        self._channels.pop(str(guild.id), None)
+
+    def channel_changed(self, channel, before=None):
+        """Handle a created, updated or deleted channel.
+
+        Only channels that are, were or could become the summary channel
+        re-index their guild.
+        """
+        guild_id = str(channel.guild.id)
+        current = self._channels.get(guild_id)
+        names = {channel.name, before.name if before else channel.name}
+        if (
+            SUMMARY_CHANNEL in names
+            or (current and current.id == channel.id)
+            or self._overrides.get(guild_id) == channel.id
+        ):
+            self.index_guild(channel.guild)
@@ -0,0 +1,298 @@
+"""Summary jobs: reports built in the bot or by worker processes.
+
+A report (a server's daily report or a /resume request) is described by a
+JSON payload and built by one of the JOB_KINDS functions, which read the
+store, call the summarizer and return the text to post.
+
+With SUMMARY_QUEUE=0 the bot builds reports itself. With SUMMARY_QUEUE=1
+the bot writes them as jobs to the summary_jobs table instead: worker
+processes (summary_worker.py) claim and build them, and the bot's
+SummaryQueue posts the results. Workers heartbeat the jobs they run, so a
+job interrupted by a crash or a restart is picked up again by another
+worker, and summary throughput scales with the number of workers.
+"""
+
+import asyncio
+import logging
+from contextlib import nullcontext
+from datetime import timedelta
+
+from discord.ext import tasks
+
+import summarizer
+from config import (
+    SUMMARY_BATCH,
+    JOB_POLL_INTERVAL,
+    JOB_HEARTBEAT_SECONDS,
+    JOB_MAX_ATTEMPTS,
+)
+from db import from_ms
+from rolling import summarize_channel
+from summarizer import MAX_INPUT_CHARS, SUMMARY_ERROR, read_within_budget
+from utils import describe_count
+
+logger = logging.getLogger(__name__)
+
+STALE_AFTER = timedelta(seconds=3 * JOB_HEARTBEAT_SECONDS)
+MAX_DELIVERY_FAILURES = 3
+
+
+# ----------------------
+# Reports
+# ----------------------
+async def _summarize_channels(store, server_id, active_channels, start_time, end_time, progress=None):
+    """Summarize the channels of get_messages_grouped concurrently.
+
+    Returns:
+        Sections of the report ("**#channel** (count):\\nsummary"), in channel order
+    """
+    channel_jobs = [
+        (
+            channel["name"],
+            f" [{channel['category']}]" if channel["category"] else "",
+            channel["messages"],
+            describe_count(channel["count"], len(channel["messages"]), channel["truncated"]),
+        )
+        for channel in active_channels
+    ]
+    done = 0
+
+    async def summarize_with_progress(channel_name, messages):
+        nonlocal done
+        summary = await summarize_channel(
+            store, messages, server_id, channel_name, start_time, end_time
+        )
+        done += 1
+        if progress:
+            await progress(done, len(channel_jobs), channel_name)
+        return summary
+
+    channel_summaries = await asyncio.gather(
+        *(
+            summarize_with_progress(channel_name, messages)
+            for channel_name, _, messages, _ in channel_jobs
+        )
+    )
+    return [
+        f"**#{channel_name}**{category_display} ({count_display}):\n{summary}"
+        for (channel_name, category_display, _, count_display), summary in zip(
+            channel_jobs, channel_summaries
+        )
+    ]
+
+
+async def daily_report(store, payload, progress=None):
+    """Build the daily report of a server.
+
+    Returns:
+        The report text, or None if the server had no activity (nothing is
+        posted then)
+
+    Args:
+        payload: Dict with "server_id", "server_name", "start_ms", "end_ms"
+            and "period" (text describing the range)
+        progress: Optional coroutine function called with (done, total,
+            channel_name) before (done=0) and as the channels are summarized
+    """
+    server_id = payload["server_id"]
+    start_time, end_time = from_ms(payload["start_ms"]), from_ms(payload["end_ms"])
+    period = payload["period"]
+
+    # One query returns every message of the range, grouped by channel
+    # and joined with the channel categories
+    servers = await store.get_messages_grouped(
+        start_time, end_time, server_id=server_id, max_chars_per_channel=MAX_INPUT_CHARS
+    )
+    server_data = servers.get(server_id) or {"name": payload["server_name"], "channels": []}
+    server_name = server_data["name"]
+    active_channels = server_data["channels"]
+    if not active_channels:
+        logger.info(f"No activity {period} on {server_name}, no daily report")
+        return None
+
+    if progress:
+        await progress(0, len(active_channels), None)
+    # Daily reports can wait for the batch API (see batch_summaries)
+    with summarizer.batched_calls() if SUMMARY_BATCH else nullcontext():
+        summaries = await _summarize_channels(
+            store, server_id, active_channels, start_time, end_time, progress
+        )
+    total_messages = sum(channel["count"] for channel in active_channels)
+    header = f"📋 Résumé {period} sur **{server_name}** ({total_messages} messages sur {len(active_channels)} canaux) :\n\n"
+    return header + "\n\n---\n\n".join(summaries)
+
+
+async def resume_report(store, payload, progress=None):
+    """Build the answer to a /resume request.
+
+    Args:
+        payload: Dict with "server_id", "server_name", "channel" (a channel
+            name or "all"), "start_ms", "end_ms", "period_type" ("range", or
+            "since" to read up to now) and "time_desc" (text describing the range)
+        progress: Optional coroutine function called with (0, total,
+            channel_name) once the messages are read
+    """
+    server_id = payload["server_id"]
+    server_name = payload["server_name"]
+    channel = payload["channel"]
+    time_desc = payload["time_desc"]
+    start_time, end_time = from_ms(payload["start_ms"]), from_ms(payload["end_ms"])
+    read_until = end_time if payload["period_type"] == "range" else None
+
+    if channel == "all":
+        # Generate summaries for all active channels in current server,
+        # fetched in one grouped query joined with the channel categories
+        servers = await store.get_messages_grouped(
+            start_time, read_until, server_id=server_id, max_chars_per_channel=MAX_INPUT_CHARS
+        )
+        active_channels = servers[server_id]["channels"] if server_id in servers else []
+        if not active_channels:
+            server_desc = f" sur {server_name}" if server_name else ""
+            return f"📋 Aucun message trouvé {time_desc} dans aucun canal{server_desc}."
+
+        if progress:
+            await progress(0, len(active_channels), None)
+        summaries = await _summarize_channels(
+            store, server_id, active_channels, start_time, end_time
+        )
+        if all(summary.endswith(SUMMARY_ERROR) for summary in summaries):
+            return SUMMARY_ERROR
+        total_messages = sum(active_channel["count"] for active_channel in active_channels)
+        server_desc = f" sur **{server_name}**" if server_name else ""
+        header = f"📋 Résumés de tous les canaux {time_desc}{server_desc} ({total_messages} messages sur {len(active_channels)} canaux) :\n\n"
+        return header + "\n\n---\n\n".join(summaries)
+
+    # Stream the newest messages first and stop reading at the budget
+    messages, truncated = await read_within_budget(
+        store.iter_messages(
+            start_time,
+            read_until,
+            channel_name=channel,
+            server_id=server_id,
+            newest_first=True,
+        )
+    )
+    if not messages:
+        server_desc = f" sur {server_name}" if server_name else ""
+        return f"📋 Aucun message trouvé {time_desc} dans #{channel}{server_desc}."
+
+    if progress:
+        await progress(0, 1, channel)
+    summary = await summarize_channel(store, messages, server_id, channel, start_time, end_time)
+    if summary == SUMMARY_ERROR:
+        # The model failed: answer with the error rather than as a summary
+        return SUMMARY_ERROR
+    server_desc = f" sur **{server_name}**" if server_name else ""
+    count_display = describe_count(len(messages), truncated=truncated)
+    return f"📋 Résumé de #{channel} {time_desc}{server_desc} ({count_display}) :\n\n{summary}"
+
+
+JOB_KINDS = {
+    "daily": daily_report,
+    "resume": resume_report,
+}
+
+
+# ----------------------
+# Queue (bot side)
+# ----------------------
+class SummaryQueue:
+    """Queues summary jobs and delivers their results.
+
+    Handlers registered with `on_result` post the result of each finished
+    job (done or failed); the job is deleted once its handler succeeded.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.handlers = {}
+        self._delivery_failures = {}
+        self.deliver.change_interval(seconds=JOB_POLL_INTERVAL)
+
+    def on_result(self, kind, handler):
+        """Deliver the finished jobs of `kind` with the coroutine function `handler(job)`."""
+        self.handlers[kind] = handler
+
+    async def submit(self, kind, payload, dedupe_key=None):
+        """Queue a job and return its ID."""
+        job_id = await self.store.enqueue_summary_job(kind, payload, dedupe_key)
+        logger.info(f"Queued {kind} summary job {job_id}")
+        return job_id
+
+    @tasks.loop(seconds=5)
+    async def deliver(self):
+        try:
+            jobs = await self.store.get_finished_summary_jobs()
+        except Exception:
+            logger.exception("Could not read finished summary jobs")
+            return
+
+        for job in jobs:
+            try:
+                await self.handlers[job["kind"]](job)
+            except Exception:
+                failures = self._delivery_failures.get(job["id"], 0) + 1
+                self._delivery_failures[job["id"]] = failures
+                logger.exception(f"Could not deliver summary job {job['id']} ({failures})")
+                if failures < MAX_DELIVERY_FAILURES:
+                    continue
+            self._delivery_failures.pop(job["id"], None)
+            await self.store.delete_summary_job(job["id"])
+
+
+# ----------------------
+# Worker
+# ----------------------
+class Worker:
+    """Claims queued jobs and builds their reports.
+
+    Args:
+        store: Store shared with the bot
+        owner: Identifies this worker in the queue
+    """
+
+    def __init__(self, store, owner):
+        self.store = store
+        self.owner = owner
+
+    async def run(self, concurrency=1):
+        logger.info(f"Summary worker {self.owner} running {concurrency} job(s) at a time")
+        await asyncio.gather(*(self._work() for _ in range(concurrency)))
+
+    async def _work(self):
+        while True:
+            try:
+                job = await self.store.claim_summary_job(self.owner, STALE_AFTER, JOB_MAX_ATTEMPTS)
+            except Exception:
+                logger.exception("Could not claim a summary job")
+                job = None
+            if job is None:
+                await asyncio.sleep(JOB_POLL_INTERVAL)
+                continue
+            await self.run_job(job)
+
+    async def run_job(self, job):
+        if job["attempts"] > 1:
+            logger.info(f"Resuming {job['kind']} job {job['id']} (attempt {job['attempts']})")
+        heartbeat = asyncio.create_task(self._heartbeat(job["id"]))
+        try:
+            result = await JOB_KINDS[job["kind"]](self.store, job["payload"])
+        except Exception as e:
+            retry = job["attempts"] < JOB_MAX_ATTEMPTS
+            logger.exception(f"Summary job {job['id']} failed (attempt {job['attempts']})")
+            await self.store.finish_summary_job(job["id"], self.owner, error=str(e), retry=retry)
+            return
+        finally:
+            heartbeat.cancel()
+        await self.store.finish_summary_job(job["id"], self.owner, result=result)
+        logger.info(f"Finished {job['kind']} job {job['id']}")
+
+    async def _heartbeat(self, job_id):
+        while True:
+            await asyncio.sleep(JOB_HEARTBEAT_SECONDS)
+            try:
+                if not await self.store.heartbeat_summary_job(job_id, self.owner):
+                    logger.warning(f"Summary job {job_id} was taken over by another worker")
+                    return
+            except Exception:
+                logger.exception(f"Could not heartbeat summary job {job_id}")
@@ -0,0 +1,71 @@
+"""Run summary workers building the jobs queued by the bot (SUMMARY_QUEUE=1).
+
+Starts SUMMARY_WORKER_PROCESSES processes, each running up to
+SUMMARY_WORKER_JOBS jobs at a time against the bot's database, which must
+be on the same host. Workers can be started, stopped and added at any
+time: jobs left running by a stopped worker are resumed by the others.
+
+Usage:
+    python summary_worker.py
+    python summary_worker.py --processes 4 --jobs 2
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+
+from config import SUMMARY_WORKER_PROCESSES, SUMMARY_WORKER_JOBS
+
+logger = logging.getLogger(__name__)
+
+
+def run_process(jobs):
+    # Imported here so that each process opens its own database connections
+    import summarizer
+    from coordination import PROCESS_ID
+    from db import AsyncMessageStore, MessageStore
+    from summary_cache import SummaryCache
+    from summary_jobs import Worker
+
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s %(levelname)s %(processName)s %(name)s: %(message)s"
+    )
+    message_store = MessageStore()
+    store = AsyncMessageStore(message_store)
+    summarizer.use_cache(SummaryCache(store))
+    try:
+        asyncio.run(Worker(store, PROCESS_ID).run(jobs))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        message_store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=SUMMARY_WORKER_PROCESSES)
+    parser.add_argument("--jobs", type=int, default=SUMMARY_WORKER_JOBS, help="jobs at a time per process")
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        run_process(args.jobs)
+        return
+
+    processes = [
+        multiprocessing.Process(target=run_process, args=(args.jobs,), name=f"worker-{index}")
+        for index in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        # Children got the signal too; wait for them to close the store
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()
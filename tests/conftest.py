@@ -0,0 +1,16 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db import MessageStore  # noqa: E402
+
+
+@pytest.fixture
+def message_store(tmp_path):
+    store = MessageStore(str(tmp_path / "messages.db"), flush_interval=0.05)
+    yield store
+    store.close()
@@ -0,0 +1,145 @@
+import asyncio
+
+import pytest
+
+import summarizer
+from batch_summaries import BatchClient, LocalBatchTransport, build_batch_file, parse_batch_output
+from summary_backends import Completion, SummarizerError
+
+
+class DirectClient:
+    """Stands in for the LLMClient of the direct path."""
+
+    name = "direct"
+
+    def __init__(self, error=None):
+        self.error = error
+        self.prompts = []
+
+    async def complete(self, prompt, max_output_tokens=1000, channel_name=None):
+        self.prompts.append(prompt)
+        if self.error:
+            raise self.error
+        return Completion(f"direct: {prompt}", 1, 1)
+
+
+class BrokenTransport(LocalBatchTransport):
+    """Fails polling with an error the client doesn't expect."""
+
+    async def poll(self, batch_id):
+        raise KeyError(batch_id)
+
+
+class SlowClient(DirectClient):
+    """Records how many calls are in flight at once."""
+
+    def __init__(self):
+        super().__init__()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def complete(self, prompt, max_output_tokens=1000, channel_name=None):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return await super().complete(prompt, max_output_tokens, channel_name)
+
+
+def make_client(transport, fallback, deadline_minutes=1, slots=None):
+    return BatchClient(
+        transport,
+        fallback,
+        collect_seconds=0.01,
+        poll_seconds=0.01,
+        deadline_minutes=deadline_minutes,
+        slots=slots,
+    )
+
+
+async def complete_all(client, count=5):
+    return await asyncio.gather(
+        *(client.complete(f"prompt {index}", 100, "general") for index in range(count))
+    )
+
+
+def test_batch_file_round_trip():
+    batch_file = build_batch_file([("request-1", "Résume ceci", 100)], model="test-model")
+    assert b'"url": "/v1/responses"' in batch_file
+    output = (
+        '{"custom_id": "request-1", "response": {"status_code": 200, "body": {"output": '
+        '[{"type": "message", "content": [{"type": "output_text", "text": "Résumé"}]}], '
+        '"usage": {"input_tokens": 3, "output_tokens": 2}}}, "error": null}\n'
+        '{"custom_id": "request-2", "response": null, "error": {"message": "invalid"}}\n'
+    )
+    results = parse_batch_output(output)
+    assert results["request-1"] == Completion("Résumé", 3, 2)
+    assert isinstance(results["request-2"], SummarizerError)
+
+
+def test_completed_batch_answers_every_request(tmp_path):
+    async def run():
+        transport = LocalBatchTransport(delay=0.01, directory=tmp_path)
+        direct = DirectClient()
+        completions = await complete_all(make_client(transport, direct))
+        assert all(completion.text.startswith("Résumé simulé") for completion in completions)
+        assert direct.prompts == []
+        # One batch file for all the requests collected together
+        assert len(list(tmp_path.glob("*_input.jsonl"))) == 1
+
+    asyncio.run(run())
+
+
+def test_missed_deadline_falls_back_to_direct_calls(tmp_path):
+    async def run():
+        transport = LocalBatchTransport(directory=tmp_path, never_complete=True)
+        direct = DirectClient()
+        completions = await complete_all(make_client(transport, direct, deadline_minutes=0.001))
+        assert [completion.text for completion in completions] == [
+            f"direct: prompt {index}" for index in range(5)
+        ]
+        assert list(transport._batches.values()) == ["cancelled"]
+
+    asyncio.run(run())
+
+
+def test_unexpected_transport_error_falls_back_to_direct_calls(tmp_path):
+    async def run():
+        direct = DirectClient()
+        client = make_client(BrokenTransport(directory=tmp_path), direct)
+        completions = await asyncio.wait_for(complete_all(client), timeout=5)
+        assert len(completions) == len(direct.prompts) == 5
+
+    asyncio.run(run())
+
+
+def test_fallback_calls_share_the_concurrency_limit(tmp_path):
+    async def run():
+        direct = SlowClient()
+        client = make_client(BrokenTransport(directory=tmp_path), direct, slots=asyncio.Semaphore(2))
+        completions = await asyncio.wait_for(complete_all(client, count=10), timeout=5)
+        assert len(completions) == 10
+        assert direct.max_in_flight == 2
+
+    asyncio.run(run())
+
+
+def test_direct_path_errors_reach_the_caller(tmp_path):
+    async def run():
+        client = make_client(BrokenTransport(directory=tmp_path), DirectClient(SummarizerError("down")))
+        with pytest.raises(SummarizerError):
+            await asyncio.wait_for(client.complete("prompt"), timeout=5)
+
+    asyncio.run(run())
+
+
+def test_batched_calls_route_summarizer_calls_through_the_batch(tmp_path, monkeypatch):
+    async def run():
+        transport = LocalBatchTransport(delay=0.01, directory=tmp_path)
+        monkeypatch.setattr(summarizer, "batch_client", make_client(transport, DirectClient()))
+        with summarizer.batched_calls():
+            text = await summarizer._complete("prompt", "general")
+        assert text.startswith("Résumé simulé")
+        assert len(list(tmp_path.glob("*_output.jsonl"))) == 1
+
+    asyncio.run(run())
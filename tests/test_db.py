@@ -0,0 +1,65 @@
+from datetime import datetime, timezone
+
+import db
+
+
+def count_messages(store):
+    with store._reader() as conn:
+        return conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+
+def add(store, message_id, content="hello"):
+    store.add_message(
+        "alice",
+        content,
+        "general",
+        timestamp=datetime(2024, 1, 1, tzinfo=timezone.utc),
+        server_id="1",
+        channel_id="2",
+        message_id=str(message_id),
+    )
+
+
+def test_bad_message_is_dropped_without_blocking_later_writes(message_store, monkeypatch):
+    monkeypatch.setattr(db, "FLUSH_RETRY_BASE_SECONDS", 0)
+    add(message_store, 1)
+    add(message_store, 2, content=object())  # can't be bound as a parameter
+    add(message_store, 3)
+    message_store.flush()
+    assert count_messages(message_store) == 2
+
+    add(message_store, 4)
+    message_store.flush()
+    assert count_messages(message_store) == 3
+    assert message_store.queue_depth == 0
+
+
+def test_malformed_payload_does_not_kill_the_writer(message_store, monkeypatch):
+    monkeypatch.setattr(db, "FLUSH_RETRY_BASE_SECONDS", 0)
+    message_store._submit("message", ("not", "a", "message"))
+    add(message_store, 1)
+    message_store.flush()
+    assert count_messages(message_store) == 1
+
+    # Write calls still get an answer
+    assert message_store._write(lambda conn: conn.execute("SELECT 42").fetchone()[0]) == 42
+
+
+def test_transient_failure_keeps_the_batch(message_store, monkeypatch):
+    monkeypatch.setattr(db, "FLUSH_RETRY_BASE_SECONDS", 0)
+    insert = message_store._insert_messages
+    failures = []
+
+    def locked_once(conn, batch):
+        if not failures:
+            failures.append(batch)
+            raise db.sqlite3.OperationalError("database is locked")
+        return insert(conn, batch)
+
+    monkeypatch.setattr(message_store, "_insert_messages", locked_once)
+    add(message_store, 1)
+    add(message_store, 2)
+    message_store.flush()
+    message_store.flush()
+    assert len(failures) == 1
+    assert count_messages(message_store) == 2
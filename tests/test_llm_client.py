@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+
+from llm_client import CircuitBreaker, CircuitOpenError, LLMClient
+from summary_backends import Completion, SummarizerError
+
+
+class FlakyBackend:
+    """Fails the first `failures` calls, hangs while `hang` is set, then succeeds."""
+
+    name = "flaky"
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.hang = False
+        self.calls = 0
+
+    async def complete(self, prompt, max_output_tokens):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise SummarizerError("down")
+        if self.hang:
+            await asyncio.sleep(3600)
+        return Completion("ok", 10, 5)
+
+
+def make_client(backend):
+    return LLMClient(backend, rpm=0, tpm=0, max_retries=0, breaker=CircuitBreaker(threshold=1, cooldown=0))
+
+
+def test_breaker_opens_and_closes_after_a_successful_trial():
+    async def run():
+        client = make_client(FlakyBackend(failures=1))
+        client.breaker.cooldown = 3600
+        with pytest.raises(SummarizerError):
+            await client.complete("prompt")
+        with pytest.raises(CircuitOpenError):
+            await client.complete("prompt")
+        client.breaker.cooldown = 0
+        assert (await client.complete("prompt")).text == "ok"
+        assert client.breaker.opened_at is None
+
+    asyncio.run(run())
+
+
+def test_cancelled_trial_does_not_keep_the_circuit_open():
+    async def run():
+        backend = FlakyBackend(failures=1)
+        client = make_client(backend)
+        with pytest.raises(SummarizerError):
+            await client.complete("prompt")
+
+        # The half-open trial is cancelled mid-call
+        backend.hang = True
+        trial = asyncio.create_task(client.complete("prompt"))
+        await asyncio.sleep(0.01)
+        trial.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await trial
+
+        backend.hang = False
+        assert (await client.complete("prompt")).text == "ok"
+
+    asyncio.run(run())
+
+
+def test_unexpected_error_in_trial_does_not_keep_the_circuit_open():
+    async def run():
+        backend = FlakyBackend(failures=1)
+        client = make_client(backend)
+        with pytest.raises(SummarizerError):
+            await client.complete("prompt")
+
+        async def broken(prompt, max_output_tokens):
+            raise RuntimeError("bug")
+
+        backend.complete, working = broken, backend.complete
+        with pytest.raises(RuntimeError):
+            await client.complete("prompt")
+        backend.complete = working
+        assert (await client.complete("prompt")).text == "ok"
+
+    asyncio.run(run())
@@ -0,0 +1,67 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import rolling
+import summarizer
+from summary_backends import SummarizerError
+
+
+class FakeStore:
+    """Two channels active in every segment, with one message each."""
+
+    def __init__(self):
+        self.saved = set()
+
+    async def get_active_channels_in_range(self, start, end):
+        return [("1", "server", "10", "general"), ("1", "server", "11", "broken")]
+
+    async def get_summarized_channels(self, start):
+        return {(server_id, channel) for segment, server_id, channel in self.saved if segment == start}
+
+    async def get_messages_in_range(self, start, end, channel_name=None, server_id=None):
+        return [("alice", f"message in #{channel_name}")]
+
+    async def save_segment_summary(self, server_id, channel_name, start, end, count, digest, summary):
+        self.saved.add((start, server_id, channel_name))
+
+
+async def generate_summary(messages, channel_name=None):
+    if "broken" in messages[0][1]:
+        raise SummarizerError("prompt rejected")
+    return "summary"
+
+
+def test_failing_channel_does_not_hold_back_later_segments(monkeypatch):
+    monkeypatch.setattr(summarizer, "generate_summary", generate_summary)
+    store = FakeStore()
+    job = rolling.RollingSummaries(store)
+    now = datetime.now(timezone.utc)
+    first = rolling.segment_start(now - rolling.SEGMENT_GRACE) - 3 * rolling.SEGMENT
+    job.done_until = first
+
+    asyncio.run(job.run.coro(job))
+    segments = {segment for segment, _, channel in store.saved if channel == "general"}
+    assert segments == {first + index * rolling.SEGMENT for index in range(3)}
+    assert job.done_until == first + 3 * rolling.SEGMENT
+
+    # The failing channel is retried by the next runs, then given up on
+    for _ in range(rolling.MAX_SEGMENT_ATTEMPTS + 2):
+        asyncio.run(job.run.coro(job))
+    assert set(job.failures.values()) == {rolling.MAX_SEGMENT_ATTEMPTS}
+    assert not any(channel == "broken" for _, _, channel in store.saved)
+
+
+def test_failing_channel_is_given_up_after_max_attempts(monkeypatch):
+    monkeypatch.setattr(summarizer, "generate_summary", generate_summary)
+    store = FakeStore()
+    job = rolling.RollingSummaries(store)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    async def run():
+        results = []
+        for _ in range(rolling.MAX_SEGMENT_ATTEMPTS + 1):
+            results.append(await job.summarize_segment(start, start + timedelta(hours=1)))
+        return results
+
+    assert asyncio.run(run()) == [False] * rolling.MAX_SEGMENT_ATTEMPTS + [True]
+    assert job.failures == {(start, "1", "broken"): rolling.MAX_SEGMENT_ATTEMPTS}
@@ -0,0 +1,65 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from config import SEARCH_PAGE_SIZE
+from db import AsyncMessageStore
+from search import MAX_PAGE_CHARS, SearchResults
+
+LONG_TEXT = "Le dragon " + "raconte une très longue histoire " * 40
+
+
+def add(store, message_id, content, timestamp, author="alice" * 10):
+    store.add_message(
+        author,
+        content,
+        "general-" + "x" * 80,
+        timestamp=timestamp,
+        server_id="1",
+        server_name="Serveur",
+        channel_id="2",
+        message_id=str(message_id),
+    )
+
+
+def test_pages_of_long_results_fit_in_a_discord_message(message_store):
+    now = datetime.now(timezone.utc)
+    total = 3 * SEARCH_PAGE_SIZE
+    for index in range(total):
+        add(message_store, 1000 + index, LONG_TEXT, now - timedelta(minutes=index))
+    message_store.flush()
+
+    async def run():
+        view = SearchResults(
+            AsyncMessageStore(message_store),
+            "1",
+            42,
+            "dragon",
+            {"channel_ids": ["2"]},
+            " dans #" + "y" * 90 + " de @" + "z" * 30,
+        )
+        pages = []
+        while True:
+            pages.append(await view.render())
+            if view.next_page.disabled:
+                return pages
+            view.page += 1
+
+    pages = asyncio.run(run())
+    assert len(pages) == 3
+    for page in pages:
+        assert len(page) <= MAX_PAGE_CHARS
+        assert page.count("discord.com/channels/1/2/") == SEARCH_PAGE_SIZE
+
+
+def test_archived_messages_are_found(message_store):
+    old = datetime.now(timezone.utc) - timedelta(days=400)
+    add(message_store, 1, "Une licorne est passée par ici", old)
+    add(message_store, 2, "Rien à voir", datetime.now(timezone.utc))
+    message_store.flush()
+    assert message_store.archive_messages(datetime.now(timezone.utc) - timedelta(days=90)) == 1
+
+    with message_store._reader() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM main.messages").fetchone()[0] == 1
+    rows = message_store.search_messages("licorne", "1", channel_ids=["2"])
+    assert [row[5] for row in rows] == [1]
+    assert "**licorne**" in rows[0][4]
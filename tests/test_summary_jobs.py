@@ -0,0 +1,76 @@
+import asyncio
+from datetime import timedelta
+
+import summary_jobs
+from db import AsyncMessageStore
+
+HOUR = timedelta(hours=1)
+ABANDONED = timedelta(seconds=-1)  # every running job counts as abandoned
+
+
+def test_claim_and_finish(message_store):
+    job_id = message_store.enqueue_summary_job("daily", {"server_id": "1"}, dedupe_key="daily:1")
+    # Queued once per key while pending
+    assert message_store.enqueue_summary_job("daily", {"server_id": "1"}, dedupe_key="daily:1") == job_id
+
+    job = message_store.claim_summary_job("worker-a", HOUR, 3)
+    assert job == {"id": job_id, "kind": "daily", "payload": {"server_id": "1"}, "attempts": 1}
+    assert message_store.claim_summary_job("worker-b", HOUR, 3) is None
+    assert message_store.heartbeat_summary_job(job_id, "worker-a")
+
+    message_store.finish_summary_job(job_id, "worker-a", result="résumé")
+    [finished] = message_store.get_finished_summary_jobs()
+    assert (finished["id"], finished["status"], finished["result"]) == (job_id, "done", "résumé")
+
+
+def test_stale_job_is_taken_over(message_store):
+    job_id = message_store.enqueue_summary_job("daily", {})
+    message_store.claim_summary_job("worker-a", HOUR, 3)
+
+    job = message_store.claim_summary_job("worker-b", ABANDONED, 3)
+    assert (job["id"], job["attempts"]) == (job_id, 2)
+    # The first worker lost the job: its heartbeat and result are ignored
+    assert not message_store.heartbeat_summary_job(job_id, "worker-a")
+    message_store.finish_summary_job(job_id, "worker-a", result="périmé")
+    assert message_store.get_finished_summary_jobs() == []
+    assert message_store.heartbeat_summary_job(job_id, "worker-b")
+
+
+def test_job_abandoned_too_often_fails(message_store):
+    job_id = message_store.enqueue_summary_job("daily", {}, dedupe_key="daily:1")
+    for _ in range(2):
+        assert message_store.claim_summary_job("worker", ABANDONED, 2)["id"] == job_id
+
+    assert message_store.claim_summary_job("worker", ABANDONED, 2) is None
+    [failed] = message_store.get_finished_summary_jobs()
+    assert (failed["status"], failed["error"]) == ("failed", "le traitement a été interrompu 2 fois")
+
+    # A failed job is queued again from scratch
+    assert message_store.enqueue_summary_job("daily", {}, dedupe_key="daily:1") == job_id
+    assert message_store.claim_summary_job("worker", HOUR, 2)["attempts"] == 1
+
+
+def test_failed_job_is_retried_then_failed(message_store, monkeypatch):
+    calls = []
+
+    async def broken(store, payload):
+        calls.append(payload)
+        raise RuntimeError("model unavailable")
+
+    monkeypatch.setitem(summary_jobs.JOB_KINDS, "broken", broken)
+    monkeypatch.setattr(summary_jobs, "JOB_MAX_ATTEMPTS", 2)
+    store = AsyncMessageStore(message_store)
+    worker = summary_jobs.Worker(store, "worker")
+    job_id = message_store.enqueue_summary_job("broken", {})
+
+    async def run_once():
+        job = await store.claim_summary_job("worker", HOUR, 2)
+        await worker.run_job(job)
+
+    asyncio.run(run_once())
+    assert message_store.get_finished_summary_jobs() == []  # pending again
+
+    asyncio.run(run_once())
+    [failed] = message_store.get_finished_summary_jobs()
+    assert (failed["id"], failed["status"], failed["error"]) == (job_id, "failed", "model unavailable")
+    assert len(calls) == 2
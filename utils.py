@@ -1,48 +1,31 @@
 """Shared utility functions for the Discord bot."""
 
-import discord
-from discord.ext import commands
+from delivery import delivery
+
+
+def describe_count(count, kept=None, truncated=False):
+    """Describe how many messages a summary is based on.
+
+    Args:
+        count: Number of messages in the range (a lower bound when truncated and `kept` is None)
+        kept: Number of messages actually summarized, when known to differ from `count`
+        truncated: True if the input budget left the oldest messages out
+    """
+    if not truncated:
+        return f"{count} messages"
+    if kept is None:
+        return f"plus de {count} messages, seuls les {count} plus récents sont résumés"
+    return f"{count} messages, seuls les {kept} plus récents sont résumés"
 
 
 async def safe_send(destination, content, max_length=1900):
     """Safely send a message, splitting if too long for Discord's 2000 char limit.
-    
+
+    Sends go through the shared rate-limited Delivery (see delivery.py).
+
     Args:
         destination: Can be a channel, context, or interaction
         content: The message content to send
         max_length: Maximum length per message chunk
     """
-    async def _send_message(msg):
-        """Send a message using the appropriate method."""
-        if isinstance(destination, discord.Interaction):
-            await destination.followup.send(msg)
-        elif isinstance(destination, commands.Context):
-            await destination.send(msg)
-        else:
-            # Assume it's a channel or similar
-            await destination.send(msg)
-    
-    if len(content) <= max_length:
-        await _send_message(content)
-        return
-
-    # Split the content intelligently
-    lines = content.split("\n")
-    current_chunk = ""
-
-    for line in lines:
-        # If adding this line would exceed limit, send current chunk
-        if len(current_chunk) + len(line) + 1 > max_length:
-            if current_chunk:
-                await _send_message(current_chunk.strip())
-                current_chunk = line + "\n"
-            else:
-                # Single line is too long, truncate it
-                truncated_line = line[: max_length - 20] + "... [tronqué]"
-                await _send_message(truncated_line)
-        else:
-            current_chunk += line + "\n"
-
-    # Send remaining chunk
-    if current_chunk:
-        await _send_message(current_chunk.strip())
+    return await delivery.send(destination, content, max_length)